@@ -1,12 +1,159 @@
+import argparse
+import os
 import sys
 from PyQt5.QtWidgets import QApplication
 from src.main import SeismicPlotter
 def main():
-    app = QApplication(sys.argv)
-    window = SeismicPlotter()
+    parser = argparse.ArgumentParser(description="Seismic manual picker")
+    parser.add_argument("--serve", metavar="FOLDER", help="Run the headless HTTP/JSON service on FOLDER instead of the GUI")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --serve (localhost only)")
+    parser.add_argument("--workers", type=int, default=4, help="Worker threads for --serve")
+    parser.add_argument("--fresh", action="store_true", help="Start without restoring the last session")
+    parser.add_argument("--triggers", metavar="SAC_FILE", help="Stream STA/LTA trigger onsets of a (long) SAC file and exit")
+    parser.add_argument("--sta", type=float, default=1.0, help="STA window (s) for --triggers")
+    parser.add_argument("--lta", type=float, default=10.0, help="LTA window (s) for --triggers")
+    parser.add_argument("--threshold", type=float, default=3.0, help="Trigger threshold for --triggers")
+    parser.add_argument("--check-triggers", action="store_true", help="Check that streamed STA/LTA triggers match the one-shot ones and exit")
+    parser.add_argument("--list-backups", metavar="FOLDER", help="List the data.csv backups of FOLDER and exit")
+    parser.add_argument("--restore-backup", metavar="FOLDER", help="Restore data.csv of FOLDER from a backup and exit")
+    parser.add_argument("--backup", metavar="NAME", help="Backup file for --restore-backup (newest by default)")
+    parser.add_argument("--match-templates", metavar="FOLDER", help="Write template-matching candidate picks for FOLDER and exit")
+    parser.add_argument("--chain", metavar="JSON", help="Preprocessing chain file applied before --match-templates")
+    parser.add_argument("--cc-threshold", type=float, default=0.7, help="Minimum correlation for --match-templates")
+    parser.add_argument("--benchmark-templates", action="store_true", help="Benchmark the template correlation and exit")
+    parser.add_argument("--benchmark-gui", action="store_true", help="Measure GUI action latencies offscreen on a synthetic dataset and exit")
+    parser.add_argument("--bench-events", type=int, default=10, help="Synthetic events for --benchmark-gui")
+    parser.add_argument("--bench-stations", type=int, default=10, help="Stations per event for --benchmark-gui")
+    parser.add_argument("--bench-steps", type=int, default=20, help="Rounds of scripted actions for --benchmark-gui")
+    parser.add_argument("--bench-output", metavar="JSON", help="Also write the --benchmark-gui results to this file")
+    parser.add_argument("--export", metavar="FOLDER", help="Export the picks of FOLDER to phase files and exit")
+    parser.add_argument("--export-dir", metavar="DIR", help="Output directory for --export (FOLDER/export by default)")
+    parser.add_argument("--formats", default="quakeml,nlloc,hypo71,csv", help="Comma-separated formats for --export")
+    parser.add_argument("--skip-tagged", action="store_true", help="Leave picks tagged for review out of --export")
+    parser.add_argument("--pre-pick", metavar="FOLDER", help="Run the picker over the unpicked groups of FOLDER, write ml_picks.csv and exit")
+    parser.add_argument("--picker", default="src.picker_backend:StaLtaPicker", help="Picker for --pre-pick: module:callable or a .onnx model")
+    parser.add_argument("--picker-workers", type=int, help="Picker worker processes for --pre-pick")
+    parser.add_argument("--min-probability", type=float, default=0.5, help="Minimum onset probability for --pre-pick")
+    args, qt_args = parser.parse_known_args()
+
+    if args.pre_pick:
+        from src.csv_operations import CSVHandler
+        from src.picker_backend import PickerPool, PickerJob, save_ml_picks
+        from src.utils import group_sac_files
+        file_groups = group_sac_files(args.pre_pick)
+        csv_handler = CSVHandler()
+        csv_handler.set_data_file(args.pre_pick)
+        df = csv_handler.add_groups(list(file_groups.keys()))
+        unpicked = df.index[df["p_wave_frame"].isna() & ~df["deleted"].astype(bool)]
+        pool = PickerPool(args.picker, args.picker_workers)
+        job = PickerJob(pool, file_groups, list(unpicked), args.min_probability)
+        results = {}
+        errors = []
+        job.finished.connect(results.update)
+        job.failed.connect(errors.append)
+        try:
+            job.run()
+        finally:
+            pool.close()
+        if errors:
+            print(f"Picker failed: {errors[0]}")
+            return
+        save_ml_picks(args.pre_pick, results)
+        found = sum(1 for picks in results.values() if picks)
+        print(f"Pre-picked {found} of {len(unpicked)} groups, written to ml_picks.csv")
+        return
+
+    if args.export:
+        from src.exporter import EXPORT_FORMATS, export_picks
+        out_dir = args.export_dir or os.path.join(args.export, "export")
+        formats = [name.strip() for name in args.formats.split(",") if name.strip()]
+        unknown = sorted(set(formats) - set(EXPORT_FORMATS))
+        if unknown:
+            parser.error(f"unknown --formats {', '.join(unknown)} (choose from {', '.join(EXPORT_FORMATS)})")
+        result = export_picks(args.export, out_dir, formats, include_review=not args.skip_tagged)
+        print(f"Exported {result['picks']} picks of {result['events']} events to {out_dir} in {result['seconds']:.1f} s")
+        return
+
+    if args.benchmark_gui:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from src.gui_benchmark import run_gui_benchmark, format_report, save_report
+        results = run_gui_benchmark(args.bench_events, args.bench_stations, args.bench_steps)
+        print(format_report(results))
+        if args.bench_output:
+            save_report(results, args.bench_output)
+        return
+
+    if args.benchmark_templates:
+        from src.template_matching import benchmark
+        for n_templates in (100, 1000):
+            result = benchmark(n_templates=n_templates)
+            print(
+                f"{result['templates']} templates x {result['traces']} traces of {result['npts']} samples: "
+                f"FFT {result['fft_seconds']:.2f} s, direct {result['direct_seconds']:.2f} s, "
+                f"{result['correlations_per_second']:.0f} correlations/s"
+            )
+        return
+
+    if args.match_templates:
+        from src.csv_operations import CSVHandler
+        from src.template_matching import TemplateMatchJob, confirmed_picks, save_candidates
+        from src.utils import group_sac_files
+        file_groups = group_sac_files(args.match_templates)
+        csv_handler = CSVHandler()
+        csv_handler.set_data_file(args.match_templates)
+        df = csv_handler.add_groups(list(file_groups.keys()))
+        unpicked = df.index[df["p_wave_frame"].isna() & ~df["deleted"].astype(bool)]
+        filter_params = None
+        if args.chain:
+            from src.preprocessing import load_chain
+            try:
+                filter_params = load_chain(args.chain)
+            except (OSError, ValueError) as e:
+                parser.error(f"--chain {args.chain}: {e}")
+        job = TemplateMatchJob(file_groups, confirmed_picks(df), list(unpicked), args.cc_threshold, filter_params)
+        results = {}
+        job.finished.connect(results.update)
+        job.run()
+        candidates = save_candidates(args.match_templates, results)
+        found = sum(1 for detections in results.values() if detections)
+        print(f"{len(candidates)} detections in {found} groups, written to candidates.csv")
+        return
+
+    if args.list_backups or args.restore_backup:
+        from src.backups import BackupManager
+        folder = args.list_backups or args.restore_backup
+        manager = BackupManager(os.path.join(folder, "data.csv"))
+        if args.list_backups:
+            for path in manager.list_backups():
+                print(os.path.basename(path))
+        else:
+            restored = manager.restore(args.backup)
+            print(f"Restored {manager.data_file} from {os.path.basename(restored)}")
+        return
+
+    if args.check_triggers:
+        from src.trigger_operations import check_stream_triggers
+        matches, triggers = check_stream_triggers()
+        for chunk_size, match in matches.items():
+            print(f"chunks of {chunk_size}: {'match' if match else 'MISMATCH'} ({triggers} triggers)")
+        sys.exit(0 if all(matches.values()) else 1)
+
+    if args.triggers:
+        from src.trigger_operations import stream_file_triggers
+        for onset in stream_file_triggers(args.triggers, args.sta, args.lta, args.threshold):
+            print(f"{onset:.3f}")
+        return
+
+    if args.serve:
+        from src.server import serve
+        serve(args.serve, port=args.port, workers=args.workers)
+        return
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = SeismicPlotter(restore=not args.fresh)
     window.show()
     sys.exit(app.exec_())
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
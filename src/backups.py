@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BACKUP_DIR = "backups"  # Next to data.csv
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+KEEP_LAST = 10  # Most recent snapshots always kept
+KEEP_DAILY = 30  # Plus the newest snapshot of each of this many days
+
+# One worker so snapshots and pruning never race each other
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+
+
+class BackupManager:
+    """
+    Compressed, rotating snapshots of a data file.
+
+    Snapshots are gzip files named <data file>.<timestamp>.gz in a backups
+    folder next to the data file. A snapshot is skipped when the data file is
+    unchanged since the last one, and after each snapshot only the last
+    KEEP_LAST snapshots plus the newest one of each of the last KEEP_DAILY
+    days are kept.
+    """
+
+    def __init__(self, data_file, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY):
+        self.data_file = data_file
+        self.backup_dir = os.path.join(os.path.dirname(data_file), BACKUP_DIR)
+        self.base_name = os.path.basename(data_file)
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+
+    def snapshot_async(self, content=None):
+        """
+        Snapshots the data file as it is now: the bytes are read (or passed
+        in) before returning, and only compressing, the checksum and pruning
+        run in the background thread. Returns a Future.
+        """
+        if content is None:
+            if not os.path.exists(self.data_file):
+                return _executor.submit(lambda: None)
+            with open(self.data_file, "rb") as f:
+                content = f.read()
+        return _executor.submit(self.snapshot, content)
+
+    def snapshot(self, content=None):
+        """Takes a snapshot now. Returns its path, or None if nothing changed."""
+        if content is None:
+            if not os.path.exists(self.data_file):
+                return None
+            with open(self.data_file, "rb") as f:
+                content = f.read()
+        os.makedirs(self.backup_dir, exist_ok=True)
+        digest = hashlib.sha1(content).hexdigest()
+        backups = self.list_backups()
+        if backups and self._digest(backups[-1]) == digest:
+            return None
+
+        timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+        path = os.path.join(self.backup_dir, f"{self.base_name}.{timestamp}.gz")
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        with open(f"{path}.sha1", "w") as f:
+            f.write(digest)
+        print(f"Backup written: {path}")
+        self.prune()
+        return path
+
+    def _digest(self, path):
+        try:
+            with open(f"{path}.sha1") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _timestamp(self, path):
+        name = os.path.basename(path)
+        stamp = name[len(self.base_name) + 1:-len(".gz")]
+        return datetime.strptime(stamp, TIMESTAMP_FORMAT)
+
+    def list_backups(self):
+        """Snapshot paths, oldest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        backups = []
+        for name in os.listdir(self.backup_dir):
+            if name.startswith(f"{self.base_name}.") and name.endswith(".gz"):
+                path = os.path.join(self.backup_dir, name)
+                try:
+                    self._timestamp(path)
+                except ValueError:
+                    continue
+                backups.append(path)
+        return sorted(backups, key=self._timestamp)
+
+    def prune(self):
+        """Applies the retention policy. Returns the removed snapshot paths."""
+        backups = self.list_backups()
+        keep = set(backups[-self.keep_last:]) if self.keep_last > 0 else set()
+        days = {}
+        for path in backups:
+            days[self._timestamp(path).date()] = path  # newest of each day wins
+        for day in sorted(days)[-self.keep_daily:] if self.keep_daily > 0 else []:
+            keep.add(days[day])
+
+        removed = [path for path in backups if path not in keep]
+        for path in removed:
+            os.remove(path)
+            if os.path.exists(f"{path}.sha1"):
+                os.remove(f"{path}.sha1")
+        return removed
+
+    def restore(self, backup=None):
+        """
+        Replaces the data file with a snapshot (the newest by default). The
+        current file is snapshotted first, so a restore can be undone.
+        Returns the restored snapshot path.
+        """
+        backups = self.list_backups()
+        if backup is None:
+            if not backups:
+                raise FileNotFoundError(f"No backups in {self.backup_dir}")
+            backup = backups[-1]
+        elif not os.path.isabs(backup):
+            backup = os.path.join(self.backup_dir, backup)
+        if not os.path.exists(backup):
+            raise FileNotFoundError(backup)
+
+        with gzip.open(backup, "rb") as f:
+            content = f.read()
+        # Read before snapshotting: the retention policy may prune an old backup
+        _executor.submit(self.snapshot).result()
+        tmp_path = f"{self.data_file}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, self.data_file)
+        return backup
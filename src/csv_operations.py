@@ -1,22 +1,41 @@
+import numpy as np
 import pandas as pd
+import io
 import os
 import json
 
+from src.backups import BackupManager
+
+# (column, value) set by a flag change -> action reported for it
+FLAG_ACTIONS = {
+    ("needs_review", True): "tag",
+    ("needs_review", False): "untag",
+    ("deleted", True): "discard",
+    ("deleted", False): "restore",
+}
+
 class CSVHandler:
     def __init__(self):
         self.data_file = None
         self.data_df = None
+        # Called with (group_keys, action) after picks, flags or rows change;
+        # action is "pick", one of FLAG_ACTIONS or None (no labelling action)
+        self.listener = None
+
+    def notify(self, group_keys, action=None):
+        if self.listener is not None and len(group_keys) > 0:
+            self.listener(list(group_keys), action)
 
     def load_data_from_csv(self):
         
         if self.data_file and os.path.exists(self.data_file):
-            # Create backup with date
-            from datetime import datetime
-            backup_file = f"{self.data_file}.{datetime.now().strftime('%Y%m%d_%H%M%S')}.bak"
-            import shutil
-            shutil.copy2(self.data_file, backup_file)
-            
-            self.data_df = pd.read_csv(self.data_file, index_col="trace_path")
+            # The bytes are read here, so the snapshot is the file before any
+            # later save; compressing and pruning happen in the background
+            with open(self.data_file, "rb") as f:
+                content = f.read()
+            BackupManager(self.data_file).snapshot_async(content)
+
+            self.data_df = pd.read_csv(io.BytesIO(content), index_col="trace_path")
             if "deleted" not in self.data_df.columns:
                 self.data_df['deleted'] = False
 
@@ -26,6 +45,8 @@ class CSVHandler:
                 self.data_df["p_wave_frame"] = self.data_df["p_wave_frame"].apply(
                     lambda x: json.dumps([x]) if pd.notnull(x) else x
                 )
+            # An empty list is no pick, older saves without markers wrote one
+            self.data_df["p_wave_frame"] = self.data_df["p_wave_frame"].astype(object).replace("[]", np.nan)
         else:
             self.data_df = pd.DataFrame(
                 columns=["trace_path", "p_wave_frame", "needs_review", "deleted"]
@@ -35,7 +56,10 @@ class CSVHandler:
 
     def save_data_to_csv(self):
         if self.data_file:
-            self.data_df.to_csv(self.data_file)
+            # Write then rename, so a backup being taken never reads half a file
+            tmp_file = f"{self.data_file}.tmp"
+            self.data_df.to_csv(tmp_file)
+            os.replace(tmp_file, self.data_file)
             print("saving csv")
             print(self.data_df)
         else:
@@ -45,19 +69,52 @@ class CSVHandler:
         self.data_file = os.path.join(folder, "data.csv")
         return self.load_data_from_csv()
 
+    def add_groups(self, group_keys):
+        """Adds empty rows for group keys not yet in the table, in one step."""
+        new_keys = pd.Index(group_keys).difference(self.data_df.index)
+        if len(new_keys) > 0:
+            new_rows = pd.DataFrame(
+                {"p_wave_frame": None, "needs_review": False, "deleted": False},
+                index=pd.Index(new_keys, name=self.data_df.index.name),
+            )
+            if self.data_df.empty:
+                self.data_df = new_rows
+            else:
+                self.data_df = pd.concat([self.data_df, new_rows])
+            self.notify(new_keys)
+        return self.data_df
+
+    def set_flag(self, group_keys, column, value):
+        """
+        Sets needs_review or deleted on many groups in one step and saves
+        once. Returns the group keys whose value changed.
+        """
+        keys = pd.Index(list(group_keys)).intersection(self.data_df.index)
+        keys = keys[self.data_df.loc[keys, column].ne(value)]
+        if len(keys) > 0:
+            self.data_df.loc[keys, column] = value
+            self.save_data_to_csv()
+            self.notify(keys, FLAG_ACTIONS[(column, value)])
+        return list(keys)
+
     def update_p_wave_time(self, group_key, p_wave_frame):
-        p_json = json.dumps(p_wave_frame) 
-        self.data_df.loc[group_key, "p_wave_frame"] = p_json 
+        # An all-empty column is read back as float64, which takes no strings
+        self.data_df["p_wave_frame"] = self.data_df["p_wave_frame"].astype(object)
+        # Saving without markers clears the pick
+        self.data_df.loc[group_key, "p_wave_frame"] = json.dumps(p_wave_frame) if p_wave_frame else np.nan
         self.save_data_to_csv()
+        self.notify([group_key], "pick" if p_wave_frame else None)
 
     def toggle_review_status(self, group_key):
         current_status = self.data_df.loc[group_key, "needs_review"]
         self.data_df.loc[group_key, "needs_review"] = not current_status
         self.save_data_to_csv()
+        self.notify([group_key], FLAG_ACTIONS[("needs_review", not current_status)])
         return not current_status
 
     def toggle_discarded(self, group_key):
         current = self.data_df.loc[group_key, "deleted"] 
         self.data_df.loc[group_key, "deleted"] = not current 
         self.save_data_to_csv() 
+        self.notify([group_key], FLAG_ACTIONS[("deleted", not current)])
         return not current
@@ -0,0 +1,108 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from src.csv_operations import CSVHandler
+from src.pick_propagation import station_index
+from src.quality_metrics import QualityIndex
+from src.utils import group_sac_files
+
+
+class LoadJob(QObject):
+    """
+    Scans a data folder and prepares its pick table off the GUI thread.
+    Meant to be moved to a QThread.
+
+    Emits finished with a dict holding the folder, file_groups, a CSVHandler
+    whose table already has a row for every group, the QualityIndex, the
+    station coordinates of every group and the groups still missing quality
+    metrics. Emits cancelled instead if cancel()
+    was called, leaving the current dataset untouched.
+    """
+
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = folder
+        self.is_cancelled = False
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def run(self):
+        try:
+            file_groups = group_sac_files(
+                self.folder,
+                progress=self.progress.emit,
+                is_cancelled=lambda: self.is_cancelled,
+            )
+            if file_groups is None or self.is_cancelled:
+                self.cancelled.emit()
+                return
+
+            csv_handler = CSVHandler()
+            csv_handler.set_data_file(self.folder)
+            known_rows = len(csv_handler.data_df)
+            # Rows for all new groups in a single concat instead of one .loc per group
+            csv_handler.add_groups(list(file_groups.keys()))
+            if len(csv_handler.data_df) != known_rows:
+                csv_handler.save_data_to_csv()
+
+            quality_index = QualityIndex()
+            quality_index.load(self.folder)
+            missing_quality = quality_index.missing(file_groups)
+            station_coords = station_index(file_groups, is_cancelled=lambda: self.is_cancelled)
+
+            if station_coords is None or self.is_cancelled:
+                self.cancelled.emit()
+                return
+            self.finished.emit({
+                "folder": self.folder,
+                "file_groups": file_groups,
+                "csv_handler": csv_handler,
+                "quality_index": quality_index,
+                "station_coords": station_coords,
+                "missing_quality": missing_quality,
+            })
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class ScanJob(QObject):
+    """
+    Rescans a folder in the background to reconcile a resumed session with
+    the filesystem. Emits finished with the fresh file_groups, their station
+    coordinates and the groups still missing quality metrics.
+    """
+
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, folder, quality_index):
+        super().__init__()
+        self.folder = folder
+        self.quality_index = quality_index
+        self.is_cancelled = False
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def run(self):
+        try:
+            file_groups = group_sac_files(self.folder, is_cancelled=lambda: self.is_cancelled)
+            if file_groups is None:
+                return
+            station_coords = station_index(file_groups, is_cancelled=lambda: self.is_cancelled)
+            if station_coords is None:
+                return
+            self.finished.emit({
+                "folder": self.folder,
+                "file_groups": file_groups,
+                "station_coords": station_coords,
+                "missing_quality": self.quality_index.missing(file_groups),
+            })
+        except Exception as e:
+            self.failed.emit(str(e))
+
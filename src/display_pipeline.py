@@ -0,0 +1,90 @@
+import numpy as np
+from obspy import Stream, Trace
+from scipy.signal import decimate
+
+from src.pick_refinement import DEFAULT_HALF_WINDOW
+from src.preprocessing import chain_stages
+from src.utils import filter_stream
+
+DEFAULT_DISPLAY_RATE = 50.0  # Hz, plenty for display and STA/LTA
+REFINE_MARGIN = 1.0  # seconds read around the refinement window
+# Display rate kept per Hz of the filter's top frequency, which puts that
+# frequency at 0.8 of the copy's Nyquist, below the anti-alias roll-off
+BAND_RATE_FACTOR = 2.5
+
+
+def decimation_factor(sampling_rate, target_rate):
+    """Largest integer factor that keeps the rate at or above target_rate (1 if none)."""
+    if not target_rate or target_rate <= 0:
+        return 1
+    return max(1, int(np.floor(sampling_rate / target_rate + 1e-9)))
+
+
+def filter_top_frequency(filter_params):
+    """Highest frequency a filter configuration lets through, or None if it does not cut the top."""
+    tops = []
+    for stage in chain_stages(filter_params):
+        if stage["type"] == "bandpass":
+            tops.append(stage["freqmax"])
+        elif stage["type"] == "lowpass":
+            tops.append(stage["freq"])
+        elif stage["type"] == "multiband":
+            tops.append(max(freqmax for _, freqmax in stage["bands"]))
+        elif stage["type"] == "resample":
+            tops.append(stage["sampling_rate"] / 2)
+    return float(min(tops)) if tops else None
+
+
+def display_target_rate(display_rate, filter_params=None):
+    """
+    Display rate raised where needed so the pass band of the active filter
+    survives the decimation; a 1-20 Hz band at 25 Hz would otherwise lose its
+    top to the anti-alias filter.
+    """
+    top = filter_top_frequency(filter_params) if filter_params else None
+    if not display_rate or top is None:
+        return display_rate
+    return max(display_rate, BAND_RATE_FACTOR * top)
+
+
+def as_float32(st):
+    """Casts the traces of a stream to float32 in place; ObsPy filters return float64."""
+    for tr in st:
+        tr.data = np.asarray(tr.data, dtype=np.float32)
+    return st
+
+
+def decimate_trace(tr, factor):
+    """
+    Anti-aliased float32 copy of a trace at 1/factor of its rate. Sample k of
+    the copy sits at sample k * factor of the original, so both share the
+    start time and plot times stay on the original clock.
+    """
+    copy = Trace(header=tr.stats.copy())
+    if factor == 1:
+        copy.data = np.asarray(tr.data, dtype=np.float32)
+        return copy
+    # Zero-phase FIR decimation keeps the onsets where they were
+    data = decimate(np.asarray(tr.data, dtype=np.float64), factor, ftype="fir", zero_phase=True)
+    copy.data = data.astype(np.float32)
+    copy.stats.sampling_rate = tr.stats.sampling_rate / factor
+    return copy
+
+
+def display_stream(st, target_rate=DEFAULT_DISPLAY_RATE):
+    """Working copy of a full-rate stream for plotting, spectrograms and triggers."""
+    return Stream([decimate_trace(tr, decimation_factor(tr.stats.sampling_rate, target_rate)) for tr in st])
+
+
+def refinement_segment(tr, time, filter_params=None, half_window=DEFAULT_HALF_WINDOW):
+    """
+    Full-rate piece of a trace around `time` for onset refinement, filtered
+    like the display when filter_params is given. The filter offset is read in
+    front and trimmed again, as for the whole trace.
+    """
+    offset = filter_params["offset"] if filter_params else 0
+    span = half_window + REFINE_MARGIN
+    segment = tr.slice(time - span - offset, time + span)
+    if filter_params:
+        segment = filter_stream(Stream([segment]), filter_params)[0]
+    return segment
@@ -0,0 +1,375 @@
+import csv
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+from src.sac_reader import read_sac_header
+from src.session import load_group_index
+from src.utils import group_sac_files
+
+EXPORT_FORMATS = ("quakeml", "nlloc", "hypo71", "csv")
+EXPORT_CHUNK_SIZE = 100_000  # data.csv rows read at a time
+DEFAULT_PICK_ERROR = 0.1  # seconds, NonLinLoc Gaussian pick error
+HYPO71_STATION_WIDTH = 4
+ALIAS_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+EVENT_CSV_COLUMNS = [
+    "station", "network", "channel", "latitude", "longitude", "elevation",
+    "pick_time", "phase", "needs_review",
+]
+
+
+class StationMetadata:
+    """
+    Network, channel and coordinates of each station, read from the header
+    of one Z file per station code and reused for every event.
+    """
+
+    def __init__(self, file_groups):
+        self.file_groups = file_groups
+        self.stations = {}  # station directory -> metadata
+
+    def get(self, group_key):
+        station = group_key.split("/")[-1]
+        if station not in self.stations:
+            self.stations[station] = self._read(group_key, station)
+        return self.stations[station]
+
+    def _read(self, group_key, station):
+        metadata = {"station": station, "network": "", "channel": "",
+                    "latitude": np.nan, "longitude": np.nan, "elevation": np.nan}
+        files = self.file_groups.get(group_key)
+        if not files:
+            return metadata
+        try:
+            headers = [read_sac_header(file) for file in files]
+        except Exception as e:
+            print(f"No station metadata for {group_key}: {e}")
+            return metadata
+        z_headers = [h for h in headers if (h.kcmpnm or "").endswith("Z")]
+        header = z_headers[0] if z_headers else headers[0]
+        metadata.update({
+            "station": header.kstnm or station,
+            "network": header.knetwk or "",
+            "channel": header.kcmpnm or "",
+            # Headers store float32, round away the representation noise
+            "latitude": round(float(header.stla), 6) if header.stla is not None else np.nan,
+            "longitude": round(float(header.stlo), 6) if header.stlo is not None else np.nan,
+            "elevation": round(float(header.stel), 3) if header.stel is not None else np.nan,
+        })
+        return metadata
+
+
+def iter_pick_chunks(data_file, chunksize=EXPORT_CHUNK_SIZE, include_review=True):
+    """
+    Reads data.csv chunksize rows at a time. Yields (rows, picks): the number
+    of rows per event in the chunk, in file order, and a DataFrame with one
+    row per pick (event, group_key, time, needs_review). Discarded groups are
+    skipped, and tagged ones too unless include_review.
+    """
+    dtype = {"trace_path": object, "p_wave_frame": object}
+    for chunk in pd.read_csv(data_file, chunksize=chunksize, dtype=dtype):
+        events = pd.Series(event_names(chunk["trace_path"]), index=chunk.index, dtype=object)
+        rows = events.groupby(events, sort=False).size()
+
+        keep = chunk["p_wave_frame"].notna() & ~chunk["deleted"].eq(True)
+        if not include_review:
+            keep &= ~chunk["needs_review"].eq(True)
+        picks = pd.DataFrame({
+            "event": events[keep].to_numpy(),
+            "group_key": chunk.loc[keep, "trace_path"].to_numpy(),
+            "needs_review": chunk.loc[keep, "needs_review"].eq(True).to_numpy(),
+            "time": parse_pick_lists(chunk.loc[keep, "p_wave_frame"].to_numpy()),
+        }).explode("time").dropna(subset=["time"])
+        picks["time"] = pd.to_datetime(picks["time"], utc=True, format="ISO8601")
+        yield rows, picks
+
+
+def event_names(trace_paths):
+    return [path.partition("/")[0] for path in trace_paths.to_numpy(dtype=object)]
+
+
+def parse_pick_lists(values):
+    """
+    Decodes p_wave_frame JSON lists. Almost all hold a single pick, written as
+    ["<time>"], which is cut out directly instead of going through json.
+    """
+    return [
+        [value[2:-2]] if value.count('"') == 2 and value.startswith('["') else json.loads(value)
+        for value in values
+    ]
+
+
+def count_event_rows(data_file, chunksize=EXPORT_CHUNK_SIZE):
+    """Rows per event directory, from the trace_path column only."""
+    counts = Counter()
+    for chunk in pd.read_csv(data_file, chunksize=chunksize, usecols=["trace_path"], dtype=object):
+        counts.update(event_names(chunk["trace_path"]))
+    return counts
+
+
+def join_station_metadata(picks, metadata):
+    """
+    Adds station/network/channel/latitude/longitude/elevation columns to
+    picks, looking up one group per station directory.
+    """
+    directories = pd.Series([key.rpartition("/")[2] for key in picks["group_key"].to_numpy(dtype=object)], index=picks.index)
+    first_groups = picks["group_key"].groupby(directories, sort=False).first()
+    stations = pd.DataFrame([metadata.get(key) for key in first_groups], index=first_groups.index)
+    text_columns = ["station", "network", "channel"]
+    stations[text_columns] = stations[text_columns].astype(object)
+    return picks.join(stations, on=directories)
+
+
+def time_fields(iso, positions):
+    """
+    Characters at `positions` of each YYYY-MM-DDTHH:MM:SS.ffffff string, cut
+    from the fixed-width code points instead of one strftime per field.
+    """
+    codes = iso.view(np.uint32).reshape(len(iso), -1)
+    fields = np.ascontiguousarray(codes[:, positions]).view(f"<U{len(positions)}").ravel()
+    return fields.astype(object)
+
+
+def rounded_times(times, decimals):
+    """
+    ISO strings and seconds of the minute of datetime64[us] times rounded to
+    `decimals` first, so 59.99996 s carries into the minute instead of being
+    printed as 60.0000.
+    """
+    step = 10 ** (6 - decimals)
+    rounded = (times.astype(np.int64) + step // 2) // step * step
+    return np.datetime_as_string(rounded.astype("datetime64[us]"), unit="us"), (rounded % 60_000_000) / 1e6
+
+
+def add_time_columns(picks):
+    """Text forms of the pick times used by the writers, for a whole chunk at once."""
+    times = picks["time"].dt.tz_localize(None).to_numpy().astype("datetime64[us]")
+    iso = np.datetime_as_string(times, unit="us")
+    # NonLinLoc writes seconds with 4 decimals, HYPO71 with 2
+    nll_iso, nll_seconds = rounded_times(times, 4)
+    hypo_iso, hypo_seconds = rounded_times(times, 2)
+    return picks.assign(
+        iso=np.char.add(iso, "Z").astype(object),
+        date=time_fields(nll_iso, [0, 1, 2, 3, 5, 6, 8, 9]),
+        hour_minute=time_fields(nll_iso, [11, 12, 14, 15]),
+        seconds=nll_seconds,
+        yymmddhhmm=time_fields(hypo_iso, [2, 3, 5, 6, 8, 9, 11, 12, 14, 15]),
+        hypo_seconds=hypo_seconds,
+        number=picks.groupby("event", sort=False).cumcount(),
+    )
+
+
+def per_value(values, function):
+    """function applied to each distinct value of a column once, as an object array."""
+    unique = values.unique()
+    return values.map(dict(zip(unique, (function(value) for value in unique)))).to_numpy(dtype=object)
+
+
+def text(values):
+    """
+    Values as an object array of Python strings. The writers concatenate
+    these, which is much faster than with pandas string arrays.
+    """
+    return np.asarray(values).astype(str).astype(object)
+
+
+class QuakeMLWriter:
+    """QuakeML 1.2 with one event per event directory, holding its P picks."""
+
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.file.write(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<q:quakeml xmlns:q="http://quakeml.org/xmlns/quakeml/1.2" '
+            'xmlns="http://quakeml.org/xmlns/bed/1.2">\n'
+            '  <eventParameters publicID="smi:local/eventParameters">\n'
+        )
+
+    def format(self, picks):
+        station = per_value(picks["station"], escape)
+        status = text(np.where(picks["needs_review"], "preliminary", "reviewed"))
+        return (
+            '      <pick publicID="smi:local/pick/' + per_value(picks["event"], escape) + "/" + station + "/"
+            + text(picks["number"]) + '"><time><value>' + text(picks["iso"]) + "</value></time>"
+            + '<waveformID networkCode="' + per_value(picks["network"], escape) + '" stationCode="' + station
+            + '" channelCode="' + per_value(picks["channel"], escape) + '"/>'
+            + "<phaseHint>P</phaseHint><evaluationMode>manual</evaluationMode><evaluationStatus>"
+            + status + "</evaluationStatus></pick>\n"
+        )
+
+    def write_event(self, event, lines):
+        self.file.write(f'    <event publicID={quoteattr(f"smi:local/event/{event}")}>\n')
+        self.file.write("".join(lines))
+        self.file.write(f"      <description><text>{escape(event)}</text></description>\n    </event>\n")
+
+    def close(self):
+        self.file.write("  </eventParameters>\n</q:quakeml>\n")
+        self.file.close()
+
+
+class NonLinLocWriter:
+    """NonLinLoc phase (NLLOC_OBS) file, events separated by a blank line."""
+
+    def __init__(self, path, pick_error=DEFAULT_PICK_ERROR):
+        self.file = open(path, "w")
+        self.pick_error = pick_error
+
+    def format(self, picks):
+        return (
+            per_value(picks["station"], lambda station: station.ljust(6)) + " ?    "
+            + per_value(picks["channel"], lambda channel: (channel or "?").ljust(4)) + " ? P      ? "
+            + text(picks["date"]) + " " + text(picks["hour_minute"]) + " "
+            + text(picks["seconds"].map("{:7.4f}".format))
+            + f" GAU {self.pick_error:9.2e} -1.00e+00 -1.00e+00 -1.00e+00 1.0000\n"
+        )
+
+    def write_event(self, event, lines):
+        self.file.write("".join(lines) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def alias_candidates(station, width=HYPO71_STATION_WIDTH):
+    """
+    Codes of at most `width` characters for a station: its own truncation
+    first, then the truncation with its last 1, 2, ... characters counting
+    through ALIAS_CHARACTERS.
+    """
+    yield station[:width]
+    for tail in range(1, width):
+        for chars in itertools.product(ALIAS_CHARACTERS, repeat=tail):
+            yield station[:width - tail] + "".join(chars)
+
+
+class Hypo71Writer:
+    """
+    HYPO71 phase cards (station in columns 1-4, IP + weight, yymmddhhmm,
+    seconds), each event ended by a blank instruction card. Tagged picks get
+    weight 2.
+
+    Station codes longer than four characters get a unique four-character
+    alias, in order of first appearance, and the alias table is written next
+    to the phase file (picks_stations.csv) so no two stations share a code.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.alias_path = os.path.splitext(path)[0] + "_stations.csv"
+        self.aliases = {}  # station -> code written
+        self.taken = set()
+
+    def alias(self, station):
+        if station not in self.aliases:
+            code = next(code for code in alias_candidates(station) if code not in self.taken)
+            self.aliases[station] = code
+            self.taken.add(code)
+        return self.aliases[station]
+
+    def format(self, picks):
+        weight = text(np.where(picks["needs_review"], "2", "0"))
+        return (
+            per_value(picks["station"], lambda station: self.alias(station).ljust(HYPO71_STATION_WIDTH))
+            + "IP " + weight + " "
+            + text(picks["yymmddhhmm"]) + text(picks["hypo_seconds"].map("{:5.2f}".format)) + "\n"
+        )
+
+    def write_event(self, event, lines):
+        self.file.write("".join(lines) + " " * 18 + "\n")
+
+    def close(self):
+        self.file.close()
+        renamed = {station: code for station, code in self.aliases.items() if code != station}
+        if renamed:
+            with open(self.alias_path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["code", "station"])
+                writer.writerows((code, station) for station, code in self.aliases.items())
+            print(f"HYPO71: {len(renamed)} station codes shortened, see {self.alias_path}")
+
+
+class EventCSVWriter:
+    """One CSV per event directory with the picks and their station metadata."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def format(self, picks):
+        table = picks.assign(pick_time=picks["iso"], phase="P")[EVENT_CSV_COLUMNS]
+        # to_csv quotes fields where needed; one line per pick
+        return np.array(table.to_csv(header=False, index=False).splitlines(keepends=True), dtype=object)
+
+    def write_event(self, event, lines):
+        with open(os.path.join(self.folder, f"{event}.csv"), "w") as f:
+            f.write(",".join(EVENT_CSV_COLUMNS) + "\n")
+            f.write("".join(lines))
+
+    def close(self):
+        pass
+
+
+def make_writers(out_dir, formats):
+    os.makedirs(out_dir, exist_ok=True)
+    writers = {
+        "quakeml": lambda: QuakeMLWriter(os.path.join(out_dir, "picks.xml")),
+        "nlloc": lambda: NonLinLocWriter(os.path.join(out_dir, "picks.nll")),
+        "hypo71": lambda: Hypo71Writer(os.path.join(out_dir, "picks.hyp")),
+        "csv": lambda: EventCSVWriter(os.path.join(out_dir, "events")),
+    }
+    unknown = set(formats) - set(writers)
+    if unknown:
+        raise ValueError(f"Unknown export formats: {', '.join(sorted(unknown))}")
+    return [writers[name]() for name in formats]
+
+
+def export_picks(folder, out_dir, formats=EXPORT_FORMATS, include_review=True,
+                 chunksize=EXPORT_CHUNK_SIZE, file_groups=None):
+    """
+    Streams the picks of a dataset folder to the given formats.
+
+    data.csv is read a chunk at a time; each chunk is joined with the station
+    metadata (SAC headers of the groups, found through groups.json or a folder
+    scan) and rendered to text in vectorised steps. An event is written as
+    soon as all its rows have been read, so only the formatted lines of events
+    still open are held: one at a time when data.csv is in folder order.
+
+    Returns a dict with the number of events and picks written and the time taken.
+    """
+    start = time.perf_counter()
+    data_file = os.path.join(folder, "data.csv")
+    if file_groups is None:
+        file_groups = load_group_index(folder) or group_sac_files(folder)
+    metadata = StationMetadata(file_groups)
+    remaining = count_event_rows(data_file, chunksize)
+    writers = make_writers(out_dir, formats)
+    buffered = {}  # event -> formatted lines per writer
+    events = picks_written = 0
+    try:
+        for rows, picks in iter_pick_chunks(data_file, chunksize, include_review):
+            if not picks.empty:
+                picks = add_time_columns(join_station_metadata(picks, metadata))
+                lines = [writer.format(picks) for writer in writers]
+                for event, positions in picks.groupby("event", sort=False).indices.items():
+                    parts = buffered.setdefault(event, [[] for _ in writers])
+                    for part, formatted in zip(parts, lines):
+                        part.extend(formatted[positions])
+            for event, count in rows.items():
+                remaining[event] -= count
+                if remaining[event] > 0 or event not in buffered:
+                    continue
+                parts = buffered.pop(event)
+                for writer, part in zip(writers, parts):
+                    writer.write_event(event, part)
+                events += 1
+                picks_written += len(parts[0]) if parts else 0
+    finally:
+        for writer in writers:
+            writer.close()
+    return {"events": events, "picks": picks_written, "seconds": time.perf_counter() - start}
@@ -7,15 +7,30 @@ from PyQt5.QtWidgets import (
     QLineEdit,
     QPushButton,
     QComboBox,
-    QMessageBox
+    QMessageBox,
+    QPlainTextEdit,
+    QFileDialog,
 )
+import json
+
+from src.preprocessing import STAGE_TYPES, validate_chain, load_chain, save_chain
+
+# Starting values for the required parameters of a stage added from the combo box
+STAGE_EXAMPLES = {
+    "resample": {"sampling_rate": 50.0},
+    "bandpass": {"freqmin": 1.0, "freqmax": 10.0},
+    "highpass": {"freq": 1.0},
+    "lowpass": {"freq": 10.0},
+    "multiband": {"bands": [[1.0, 3.0], [5.0, 10.0]]},
+    "scale": {"factor": 1.0},
+}
 
 class FilterConfigWindow(QMainWindow):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
         self.setWindowTitle("Filter Configuration")
-        self.setGeometry(200, 200, 400, 300)
+        self.setGeometry(200, 200, 500, 550)
 
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -47,6 +62,88 @@ class FilterConfigWindow(QMainWindow):
         apply_filter_btn.clicked.connect(self.apply_filter)
         layout.addWidget(apply_filter_btn)
 
+        # Preprocessing chain, edited as the JSON list of its stages
+        layout.addWidget(QLabel("Preprocessing chain (JSON stages, run in order, then the offset):"))
+        stage_layout = QHBoxLayout()
+        self.stage_type_combo = QComboBox()
+        self.stage_type_combo.addItems(list(STAGE_TYPES))
+        stage_layout.addWidget(self.stage_type_combo)
+        add_stage_btn = QPushButton("Add Stage")
+        add_stage_btn.clicked.connect(self.add_stage)
+        stage_layout.addWidget(add_stage_btn)
+        layout.addLayout(stage_layout)
+
+        self.chain_input = QPlainTextEdit()
+        current = parent.filter_params if parent is not None else None
+        stages = current["stages"] if current and "stages" in current else []
+        self.chain_input.setPlainText(json.dumps(stages, indent=2))
+        if current:
+            self.offset_input.setText(str(current.get("offset", 0)))
+        layout.addWidget(self.chain_input)
+
+        chain_buttons = QHBoxLayout()
+        load_chain_btn = QPushButton("Load...")
+        load_chain_btn.clicked.connect(self.load_chain_file)
+        save_chain_btn = QPushButton("Save...")
+        save_chain_btn.clicked.connect(self.save_chain_file)
+        apply_chain_btn = QPushButton("Apply Chain")
+        apply_chain_btn.clicked.connect(self.apply_chain)
+        chain_buttons.addWidget(load_chain_btn)
+        chain_buttons.addWidget(save_chain_btn)
+        chain_buttons.addWidget(apply_chain_btn)
+        layout.addLayout(chain_buttons)
+
+    def chain_params(self):
+        """Chain configuration from the editor and the offset field. Raises ValueError."""
+        try:
+            stages = json.loads(self.chain_input.toPlainText() or "[]")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Chain is not valid JSON: {e}")
+        offset = float(self.offset_input.text()) if self.offset_input.text() else 0
+        return validate_chain({"type": "chain", "stages": stages, "offset": offset})
+
+    def add_stage(self):
+        try:
+            stages = json.loads(self.chain_input.toPlainText() or "[]")
+        except json.JSONDecodeError as e:
+            QMessageBox.warning(self, "Input Error", f"Chain is not valid JSON: {e}")
+            return
+        stage_type = self.stage_type_combo.currentText()
+        stages.append({"type": stage_type, **STAGE_EXAMPLES.get(stage_type, {}), **STAGE_TYPES[stage_type][1]})
+        self.chain_input.setPlainText(json.dumps(stages, indent=2))
+
+    def load_chain_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load Preprocessing Chain", "", "JSON files (*.json)")
+        if not path:
+            return
+        try:
+            filter_params = load_chain(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Input Error", f"Failed to load {path}.\n{e}")
+            return
+        self.chain_input.setPlainText(json.dumps(filter_params["stages"], indent=2))
+        self.offset_input.setText(str(filter_params["offset"]))
+
+    def save_chain_file(self):
+        try:
+            filter_params = self.chain_params()
+        except ValueError as e:
+            QMessageBox.warning(self, "Input Error", str(e))
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Preprocessing Chain", "chain.json", "JSON files (*.json)")
+        if path:
+            save_chain(path, filter_params)
+
+    def apply_chain(self):
+        try:
+            filter_params = self.chain_params()
+        except ValueError as e:
+            QMessageBox.warning(self, "Input Error", str(e))
+            return
+        # The window stays open for retuning; unchanged leading stages come from the cache
+        if self.parent:
+            self.parent.apply_filter_from_config(filter_params)
+
     def apply_filter(self):
         try:
             filter_type = self.filter_type_combo.currentText().lower()
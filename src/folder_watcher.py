@@ -0,0 +1,166 @@
+import os
+from PyQt5.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+
+from src.utils import is_sac_file, get_group_key
+
+
+class FolderWatcher(QObject):
+    """
+    Watches a loaded data folder for SAC files being added or removed.
+
+    Directory change notifications come from QFileSystemWatcher (inotify on
+    Linux). If the watches cannot be registered (e.g. inotify limits or network
+    filesystems) the watcher falls back to polling directory modification
+    times. Only directories that actually changed are rescanned, and changes
+    are debounced so that a whole event folder being copied in is reported as
+    a single batch.
+
+    Signals carry a dict of group_key -> list of file paths.
+    """
+
+    files_added = pyqtSignal(dict)
+    files_removed = pyqtSignal(dict)
+
+    def __init__(self, folder, file_groups, poll_interval=2000, debounce=500, parent=None):
+        super().__init__(parent)
+        self.folder = os.path.normpath(folder)
+        self.poll_interval = poll_interval
+        self.polling = False
+
+        # Known SAC file names per directory, and directory mtimes for polling.
+        # Seeded from the already grouped files so nothing is rescanned.
+        self.dir_files = {self.folder: set()}
+        for files in file_groups.values():
+            for file in files:
+                directory = os.path.dirname(os.path.normpath(file))
+                self.dir_files.setdefault(directory, set()).add(os.path.basename(file))
+                self._add_parents(directory)
+        self.dir_mtimes = {}
+
+        self.pending_dirs = set()
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce)
+        self.debounce_timer.timeout.connect(self.process_pending)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(poll_interval)
+        self.poll_timer.timeout.connect(self.poll)
+
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.directoryChanged.connect(self.on_directory_changed)
+
+    def _add_parents(self, directory):
+        parent = os.path.dirname(directory)
+        while directory != self.folder and parent != directory:
+            self.dir_files.setdefault(parent, set())
+            directory, parent = parent, os.path.dirname(parent)
+
+    def start(self, force_polling=False):
+        directories = list(self.dir_files.keys())
+        failed = directories if force_polling else self.fs_watcher.addPaths(directories)
+        if failed:
+            print(f"Folder watcher: {len(failed)} directories not watchable, polling instead")
+            if self.fs_watcher.directories():
+                self.fs_watcher.removePaths(self.fs_watcher.directories())
+            self.polling = True
+            self.dir_mtimes = {d: self._mtime(d) for d in directories}
+            self.poll_timer.start()
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.debounce_timer.stop()
+        if self.fs_watcher.directories():
+            self.fs_watcher.removePaths(self.fs_watcher.directories())
+
+    def _mtime(self, directory):
+        try:
+            return os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _watch(self, directory):
+        self.dir_files.setdefault(directory, set())
+        if self.polling:
+            self.dir_mtimes[directory] = self._mtime(directory)
+        else:
+            self.fs_watcher.addPath(directory)
+
+    def _unwatch(self, directory):
+        self.dir_files.pop(directory, None)
+        self.dir_mtimes.pop(directory, None)
+        if not self.polling:
+            self.fs_watcher.removePath(directory)
+
+    def on_directory_changed(self, path):
+        self.pending_dirs.add(os.path.normpath(path))
+        self.debounce_timer.start()
+
+    def poll(self):
+        for directory, mtime in list(self.dir_mtimes.items()):
+            current = self._mtime(directory)
+            if current != mtime:
+                self.dir_mtimes[directory] = current
+                self.pending_dirs.add(directory)
+        if self.pending_dirs:
+            self.process_pending()
+
+    def process_pending(self):
+        added = {}
+        removed = {}
+        pending, self.pending_dirs = self.pending_dirs, set()
+        for directory in sorted(pending):
+            if directory in self.dir_files:
+                self._rescan_dir(directory, added, removed)
+        if removed:
+            self.files_removed.emit(removed)
+        if added:
+            self.files_added.emit(added)
+
+    def _rescan_dir(self, directory, added, removed):
+        """Diffs one directory against its known state, recursing into new subdirectories."""
+        known = self.dir_files.get(directory, set())
+        group_key = get_group_key(self.folder, directory)
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            # Directory disappeared: drop it and everything known below it
+            prefix = directory + os.sep
+            for sub in [d for d in self.dir_files if d == directory or d.startswith(prefix)]:
+                sub_key = get_group_key(self.folder, sub)
+                if sub_key is not None and self.dir_files[sub]:
+                    removed.setdefault(sub_key, []).extend(
+                        os.path.join(sub, name) for name in sorted(self.dir_files[sub])
+                    )
+                self._unwatch(sub)
+            return
+
+        current = set()
+        for entry in entries:
+            if entry.is_dir():
+                sub = os.path.normpath(entry.path)
+                if sub not in self.dir_files:
+                    self._watch(sub)
+                    self._rescan_dir(sub, added, removed)
+            elif is_sac_file(entry.name):
+                current.add(entry.name)
+
+        # SAC files directly under the root or an event folder are not grouped
+        if group_key is not None:
+            new_files = sorted(current - known)
+            gone_files = sorted(known - current)
+            if new_files:
+                added.setdefault(group_key, []).extend(
+                    os.path.join(directory, name) for name in new_files
+                )
+            if gone_files:
+                removed.setdefault(group_key, []).extend(
+                    os.path.join(directory, name) for name in gone_files
+                )
+        self.dir_files[directory] = current
+
+        # Subdirectories removed from this directory
+        prefix = directory + os.sep
+        for sub in [d for d in self.dir_files if d.startswith(prefix)
+                    and os.path.dirname(d) == directory and not os.path.isdir(d)]:
+            self._rescan_dir(sub, added, removed)
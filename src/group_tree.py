@@ -0,0 +1,318 @@
+from bisect import bisect_left, insort
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex
+
+FLAGS = ("picked", "tagged", "discarded")
+EVENT_ROW = 0  # internalId of event rows; station rows store their event row + 1
+
+
+def split_group_key(group_key):
+    event, _, station = group_key.partition("/")
+    return event, station
+
+
+def group_flags(data_df, group_keys):
+    """(n, 3) bool array of picked/tagged/discarded for the given groups, missing rows all False."""
+    df = data_df.reindex(list(group_keys))
+    return np.column_stack([
+        df["p_wave_frame"].notna().to_numpy(),
+        df["needs_review"].eq(True).to_numpy(),
+        df["deleted"].eq(True).to_numpy(),
+    ])
+
+
+def is_remaining(flags):
+    """Groups still to be labelled: neither picked nor discarded."""
+    flags = np.asarray(flags)
+    return ~flags[..., 0] & ~flags[..., 2]
+
+
+class GroupSearchIndex:
+    """
+    Search over group keys and station codes. Prefix matches come from
+    bisection of sorted keys; substring matches from a scan that narrows the
+    previous result while the query keeps growing, as it does when typing.
+    """
+
+    def __init__(self, group_keys=()):
+        group_keys = list(dict.fromkeys(group_keys))
+        self.keys = sorted((key.lower(), key) for key in group_keys)  # (lowercase key, key)
+        self.stations = sorted((split_group_key(key)[1].lower(), key) for key in group_keys)
+        self.last_query = None
+        self.last_matches = None
+
+    def add(self, group_keys):
+        for group_key in group_keys:
+            entry = (group_key.lower(), group_key)
+            position = bisect_left(self.keys, entry)
+            if position < len(self.keys) and self.keys[position] == entry:
+                continue
+            self.keys.insert(position, entry)
+            insort(self.stations, (split_group_key(group_key)[1].lower(), group_key))
+        self.last_query = None
+
+    def remove(self, group_keys):
+        for group_key in group_keys:
+            for entries, entry in (
+                (self.keys, (group_key.lower(), group_key)),
+                (self.stations, (split_group_key(group_key)[1].lower(), group_key)),
+            ):
+                position = bisect_left(entries, entry)
+                if position < len(entries) and entries[position] == entry:
+                    del entries[position]
+        self.last_query = None
+
+    def _prefix(self, entries, query):
+        start = bisect_left(entries, (query, ""))
+        # Every string starting with query sorts before query + U+FFFF
+        end = bisect_left(entries, (query + "\uffff", ""))
+        return [key for _, key in entries[start:end]]
+
+    def search(self, query):
+        """Group keys matching the query: key or station prefix matches first, then substrings."""
+        query = query.strip().lower()
+        if not query:
+            return [key for _, key in self.keys]
+        if self.last_query and query.startswith(self.last_query):
+            candidates = self.last_matches
+        else:
+            candidates = self.keys
+        matches = [entry for entry in candidates if query in entry[0]]
+        self.last_query, self.last_matches = query, matches
+
+        prefix = self._prefix(self.keys, query) + self._prefix(self.stations, query)
+        seen = set(prefix)
+        return list(dict.fromkeys(prefix)) + [key for _, key in matches if key not in seen]
+
+
+class EventCounts:
+    """
+    Per-event totals and picked/tagged/discarded counts, built once and then
+    kept up to date from the changed groups only. remaining counts the groups
+    neither picked nor discarded; overall sums everything over all events.
+    """
+
+    def __init__(self):
+        self.flags = {}  # group_key -> np.array of FLAGS
+        self.counts = {}  # event -> np.array([total, picked, tagged, discarded])
+        self.remaining = {}  # event -> groups neither picked nor discarded
+        self.overall = np.zeros(len(FLAGS) + 2, dtype=int)  # total, picked, tagged, discarded, remaining
+
+    def reset(self, data_df, group_keys):
+        group_keys = list(group_keys)
+        flags = group_flags(data_df, group_keys)
+        self.flags = dict(zip(group_keys, flags))
+        events = [split_group_key(key)[0] for key in group_keys]
+        table = pd.DataFrame(flags.astype(int), columns=FLAGS, index=events)
+        table.insert(0, "total", 1)
+        table["remaining"] = is_remaining(flags).astype(int)
+        sums = table.groupby(level=0, sort=False).sum()
+        self.counts = dict(zip(sums.index, sums[["total", *FLAGS]].to_numpy().copy()))
+        self.remaining = dict(zip(sums.index, sums["remaining"].tolist()))
+        self.overall = sums.to_numpy().sum(axis=0) if len(sums) else np.zeros(len(FLAGS) + 2, dtype=int)
+
+    def update(self, data_df, group_keys):
+        """Applies the current flags of some groups, adding unknown ones. Returns the events changed."""
+        group_keys = list(group_keys)
+        changed = set()
+        for group_key, flags in zip(group_keys, group_flags(data_df, group_keys)):
+            event = split_group_key(group_key)[0]
+            old = self.flags.get(group_key)
+            counts = self.counts.setdefault(event, np.zeros(len(FLAGS) + 1, dtype=int))
+            if old is None:
+                counts[0] += 1
+                self.overall[0] += 1
+                old = np.zeros(len(FLAGS), dtype=bool)
+                was_remaining = 0
+            elif np.array_equal(old, flags):
+                continue
+            else:
+                was_remaining = int(is_remaining(old))
+            delta = flags.astype(int) - old.astype(int)
+            counts[1:] += delta
+            self.overall[1:-1] += delta
+            self._add_remaining(event, int(is_remaining(flags)) - was_remaining)
+            self.flags[group_key] = flags
+            changed.add(event)
+        return changed
+
+    def remove(self, group_keys):
+        changed = set()
+        for group_key in group_keys:
+            flags = self.flags.pop(group_key, None)
+            if flags is None:
+                continue
+            event = split_group_key(group_key)[0]
+            self.counts[event] -= np.concatenate(([1], flags.astype(int)))
+            self.overall[:-1] -= np.concatenate(([1], flags.astype(int)))
+            self._add_remaining(event, -int(is_remaining(flags)))
+            if self.counts[event][0] == 0:
+                del self.counts[event]
+                del self.remaining[event]
+            changed.add(event)
+        return changed
+
+    def _add_remaining(self, event, delta):
+        self.remaining[event] = self.remaining.get(event, 0) + delta
+        self.overall[-1] += delta
+
+
+class GroupTreeModel(QAbstractItemModel):
+    """
+    Events with their stations as children. Station rows of an event are
+    only built when the event is first expanded (canFetchMore/fetchMore).
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.event_groups = {}  # event -> group keys, in folder order
+        self.shown = {}  # event -> group keys matching the search
+        self.events = []
+        self.fetched = {}  # event -> station rows built so far
+        self.query = ""
+        self.search_index = GroupSearchIndex()
+        self.counts = EventCounts()
+
+    def reset(self, group_keys, data_df):
+        self.beginResetModel()
+        self.event_groups = {}
+        for group_key in group_keys:
+            self.event_groups.setdefault(split_group_key(group_key)[0], []).append(group_key)
+        self.search_index = GroupSearchIndex(group_keys)
+        self.counts.reset(data_df, group_keys)
+        self._show()
+        self.endResetModel()
+
+    def _show(self):
+        """Rebuilds the shown events from the search, keeping the folder order."""
+        group_keys = self.search_index.search(self.query) if self.query.strip() else None
+        if group_keys is None or len(group_keys) == len(self.counts.flags):
+            self.shown = dict(self.event_groups)
+        else:
+            matched = set(group_keys)
+            self.shown = {}
+            for event, keys in self.event_groups.items():
+                keys = [key for key in keys if key in matched]
+                if keys:
+                    self.shown[event] = keys
+        self.events = list(self.shown.keys())
+        self.fetched = {}
+
+    def set_search(self, query):
+        """Shows only the groups matching query (all groups when empty)."""
+        self.beginResetModel()
+        self.query = query
+        self._show()
+        self.endResetModel()
+        return len(self.events)
+
+    def add_groups(self, group_keys, data_df):
+        group_keys = [key for key in group_keys if key not in self.counts.flags]
+        if not group_keys:
+            return
+        self.beginResetModel()
+        for group_key in group_keys:
+            self.event_groups.setdefault(split_group_key(group_key)[0], []).append(group_key)
+        self.search_index.add(group_keys)
+        self.counts.update(data_df, group_keys)
+        self._show()
+        self.endResetModel()
+
+    def remove_groups(self, group_keys):
+        group_keys = [key for key in group_keys if key in self.counts.flags]
+        if not group_keys:
+            return
+        self.beginResetModel()
+        for group_key in group_keys:
+            event = split_group_key(group_key)[0]
+            self.event_groups[event].remove(group_key)
+            if not self.event_groups[event]:
+                del self.event_groups[event]
+        self.search_index.remove(group_keys)
+        self.counts.remove(group_keys)
+        self._show()
+        self.endResetModel()
+
+    def update_groups(self, group_keys, data_df):
+        """Refreshes the counts and rows of groups whose picks or tags changed."""
+        for event in self.counts.update(data_df, group_keys):
+            if event not in self.shown:
+                continue
+            row = self.events.index(event)
+            event_index = self.index(row, 0)
+            self.dataChanged.emit(event_index, event_index)
+            stations = self.fetched.get(event)
+            if stations:
+                self.dataChanged.emit(self.index(0, 0, event_index), self.index(len(stations) - 1, 0, event_index))
+
+    def group_key(self, index):
+        """Group key of a station row, or None for event rows."""
+        if not index.isValid() or index.internalId() == EVENT_ROW:
+            return None
+        return self.fetched[self.events[index.internalId() - 1]][index.row()]
+
+    def index_of(self, group_key):
+        """Index of a group's station row, building the rows of its event if needed."""
+        event = split_group_key(group_key)[0]
+        if event not in self.shown or group_key not in self.shown[event]:
+            return QModelIndex()
+        event_index = self.index(self.events.index(event), 0)
+        if self.canFetchMore(event_index):
+            self.fetchMore(event_index)
+        return self.index(self.fetched[event].index(group_key), 0, event_index)
+
+    # QAbstractItemModel interface
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, EVENT_ROW)
+        return self.createIndex(row, column, parent.row() + 1)
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == EVENT_ROW:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, EVENT_ROW)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.events)
+        if parent.internalId() == EVENT_ROW:
+            return len(self.fetched.get(self.events[parent.row()], []))
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        return not parent.isValid() or parent.internalId() == EVENT_ROW
+
+    def canFetchMore(self, parent):
+        return parent.isValid() and parent.internalId() == EVENT_ROW and self.events[parent.row()] not in self.fetched
+
+    def fetchMore(self, parent):
+        event = self.events[parent.row()]
+        stations = self.shown[event]
+        self.beginInsertRows(parent, 0, len(stations) - 1)
+        self.fetched[event] = list(stations)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        if index.internalId() == EVENT_ROW:
+            event = self.events[index.row()]
+            total, picked, tagged, discarded = self.counts.counts.get(event, (0, 0, 0, 0))
+            if role == Qt.ToolTipRole:
+                return f"{total} stations: {picked} picked, {tagged} tagged, {discarded} discarded"
+            return f"{event}  ({picked}/{total} picked, {tagged} T, {discarded} D)"
+        group_key = self.group_key(index)
+        if role == Qt.ToolTipRole:
+            return group_key
+        flags = self.counts.flags.get(group_key)
+        marks = "".join(mark for mark, on in zip("PTD", flags if flags is not None else ()) if on)
+        station = split_group_key(group_key)[1]
+        return f"{station}  [{marks}]" if marks else station
@@ -0,0 +1,201 @@
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from obspy import Trace, UTCDateTime
+from PyQt5.QtCore import Qt
+from PyQt5.QtTest import QTest
+from PyQt5.QtWidgets import QApplication, QMessageBox
+
+import src.session
+
+SAMPLING_RATE = 100.0
+RECORD_SECONDS = 120.0
+
+
+def make_synthetic_dataset(folder, events=10, stations=10, seconds=RECORD_SECONDS,
+                           sampling_rate=SAMPLING_RATE, seed=0):
+    """Writes events x stations Z/N/E SAC groups with a noisy P arrival each."""
+    rng = np.random.default_rng(seed)
+    npts = int(seconds * sampling_rate)
+    starttime = UTCDateTime(2024, 1, 1)
+    for event in range(events):
+        for station in range(stations):
+            station_code = f"ST{station:03d}"
+            group_folder = os.path.join(folder, f"EV{event:04d}", station_code)
+            os.makedirs(group_folder, exist_ok=True)
+            arrival = int(rng.uniform(0.2, 0.6) * npts)
+            decay = np.exp(-np.arange(npts - arrival) / (2 * sampling_rate))
+            for component in "ZNE":
+                data = rng.normal(0, 1, npts)
+                data[arrival:] += 20 * np.sin(np.arange(npts - arrival) / 3) * decay
+                tr = Trace(data.astype(np.float32))
+                tr.stats.sampling_rate = sampling_rate
+                tr.stats.starttime = starttime
+                tr.stats.network = "XX"
+                tr.stats.station = station_code
+                tr.stats.channel = f"HH{component}"
+                tr.stats.sac = {"stla": -23.0 + station * 0.05, "stlo": -68.0, "stel": 0.0}
+                tr.write(os.path.join(group_folder, f"{station_code}_HH{component}.sac"), format="SAC")
+    return folder
+
+
+@contextmanager
+def stubbed_message_boxes():
+    """Replaces the modal QMessageBox helpers with no-ops that count the calls."""
+    calls = {}
+    originals = {}
+    for name in ("information", "warning", "critical", "question"):
+        originals[name] = getattr(QMessageBox, name)
+        def stub(*args, _name=name, **kwargs):
+            calls[_name] = calls.get(_name, 0) + 1
+            return QMessageBox.Yes if _name == "question" else QMessageBox.Ok
+        setattr(QMessageBox, name, staticmethod(stub))
+    try:
+        yield calls
+    finally:
+        for name, original in originals.items():
+            setattr(QMessageBox, name, original)
+
+
+@contextmanager
+def isolated_session(folder):
+    """Keeps the benchmark from overwriting the user's saved session."""
+    original = src.session.SESSION_DIR, src.session.SESSION_FILE
+    src.session.SESSION_DIR = folder
+    src.session.SESSION_FILE = os.path.join(folder, "session.json")
+    try:
+        yield
+    finally:
+        src.session.SESSION_DIR, src.session.SESSION_FILE = original
+
+
+def summarize(samples):
+    """Latency distribution in milliseconds."""
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+class GuiBenchmark:
+    """Runs scripted actions on a window and records how long each one takes."""
+
+    def __init__(self, app, window):
+        self.app = app
+        self.window = window
+        self.latencies = {}
+        self.frames = []
+
+    def wait_for(self, condition, timeout=600):
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Timed out waiting for the window")
+            self.app.processEvents()
+            time.sleep(0.001)
+
+    def measure(self, name, action):
+        """Times the action until its events are processed, then the repaint."""
+        start = time.perf_counter()
+        action()
+        self.app.processEvents()
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        start = time.perf_counter()
+        self.window.grab()  # Renders the whole window, as a repaint would
+        self.frames.append(time.perf_counter() - start)
+
+    def key(self, key):
+        return lambda: QTest.keyClick(self.window, key)
+
+    def cycle_tagged_filter(self):
+        checkbox = self.window.filter_tagged
+        states = [Qt.Unchecked, Qt.Checked, Qt.PartiallyChecked]
+        checkbox.setCheckState(states[(states.index(checkbox.checkState()) + 1) % 3])
+
+    def run(self, steps):
+        window = self.window
+        for step in range(steps):
+            self.measure("next trace [Right]", self.key(Qt.Key_Right))
+            self.measure("previous trace [Left]", self.key(Qt.Key_Left))
+            self.measure("next trace [Right]", self.key(Qt.Key_Right))
+            self.measure("add P mark [P]", self.key(Qt.Key_P))
+            self.measure("save pick [Space]", self.key(Qt.Key_Space))
+            self.measure("toggle tag [T]", self.key(Qt.Key_T))
+            self.measure("toggle tag [T]", self.key(Qt.Key_T))
+            self.measure("toggle filter [F]", self.key(Qt.Key_F))
+            self.measure("toggle filter [F]", self.key(Qt.Key_F))
+            if step % 5 == 0:
+                self.measure("3-component view [C]", self.key(Qt.Key_C))
+                self.measure("3-component view [C]", self.key(Qt.Key_C))
+                self.measure("list filter (tagged)", self.cycle_tagged_filter)
+                self.measure("list filter (tagged)", self.cycle_tagged_filter)
+                self.measure("list filter (tagged)", self.cycle_tagged_filter)
+            if window.trace_list.currentRow() >= window.trace_list.count() - 2:
+                self.measure("first trace", lambda: window.refresh_trace_list())
+
+    def report(self):
+        results = {name: summarize(samples) for name, samples in self.latencies.items()}
+        results["frame"] = summarize(self.frames)
+        return results
+
+
+def run_gui_benchmark(events=10, stations=10, steps=20):
+    """
+    Builds a synthetic dataset in a temporary folder (the actions save picks
+    and tags, so never a real one), loads it in a SeismicPlotter and runs
+    `steps` rounds of scripted actions. Returns the per-action latency
+    distributions in milliseconds.
+    """
+    from src.main import SeismicPlotter
+
+    app = QApplication.instance() or QApplication([])
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = make_synthetic_dataset(os.path.join(tmp, "data"), events, stations)
+        with stubbed_message_boxes() as calls, isolated_session(tmp):
+            window = SeismicPlotter(restore=False)
+            window.show()
+            benchmark = GuiBenchmark(app, window)
+
+            start = time.perf_counter()
+            window.start_load_job(folder)
+            benchmark.wait_for(lambda: window.load_job is None and window.trace_list.count() > 0)
+            load_time = time.perf_counter() - start
+            # Quality metrics run in the background after a load, let them settle
+            benchmark.wait_for(lambda: window.quality_job is None)
+            window.filter_params = {"type": "bandpass", "min_freq": 1.0, "max_freq": 10.0, "offset": 1}
+
+            benchmark.run(steps)
+            results = benchmark.report()
+            results["load"] = {"seconds": load_time, "groups": len(window.file_groups)}
+            results["message_boxes"] = dict(calls)
+            window.close()
+    return results
+
+
+def format_report(results):
+    lines = [
+        f"Loaded {results['load']['groups']} groups in {results['load']['seconds']:.2f} s",
+        f"{'action':<26}{'n':>5}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)",
+    ]
+    for name, stats in results.items():
+        if name in ("load", "message_boxes"):
+            continue
+        lines.append(
+            f"{name:<26}{stats['count']:>5}{stats['mean']:>9.1f}{stats['p50']:>9.1f}"
+            f"{stats['p90']:>9.1f}{stats['p99']:>9.1f}{stats['max']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def save_report(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
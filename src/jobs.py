@@ -0,0 +1,28 @@
+from concurrent.futures import wait, FIRST_COMPLETED
+
+
+def bounded_results(pool, submit, items, is_cancelled, limit, poll=0.1):
+    """
+    Submits items to a process pool with at most `limit` in flight and yields
+    (item, future) as they finish. Stops as soon as is_cancelled() is true,
+    checking at least every `poll` seconds; the caller then shuts the pool
+    down with cancel_futures=True instead of waiting for the rest.
+    """
+    items = iter(items)
+    pending = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < limit:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+            else:
+                pending[submit(pool, item)] = item
+        if not pending or is_cancelled():
+            return
+        done, _ = wait(list(pending), timeout=poll, return_when=FIRST_COMPLETED)
+        for future in done:
+            if is_cancelled():
+                return
+            yield pending.pop(future), future
@@ -10,12 +10,15 @@ from PyQt5.QtWidgets import (
 import uuid
 
 from obspy import UTCDateTime
-from src.plotting import plot_spectrogram
+from src.plotting import plot_spectrogram, compute_spectrograms, spectrogram_image
 from src.filter_window import FilterConfigWindow
 from src.trigger_window import TriggerConfigWindow
+from src.stack_window import StackWindow
+from src.stats_window import StatsWindow
+from src.progress_stats import ProgressStats
 from src.shortcuts import setup_shortcuts
 from src.ui_setup import setup_ui
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, QTimer
 from PyQt5.QtGui import  QIcon
 import pyqtgraph as pg
 from pyqtgraph import LabelItem
@@ -23,11 +26,38 @@ import numpy as np
 import pandas as pd
 
 from src.csv_operations import CSVHandler
-from src.utils import group_sac_files, load_trace_data, calculate_wave_frame
-from src.trigger_operations import  calculate_triggers
+from src.folder_watcher import FolderWatcher
+from src.utils import load_trace_data, load_trace_window, calculate_wave_frame
+from src.trigger_operations import  calculate_triggers, calculate_array_triggers
+from src.three_component import stack_components, filter_stack, vector_norm, polarization_trace
+from src.pick_refinement import refine_onset
+from src.pick_propagation import station_index, predict_picks, closest_trigger
+from src.sac_reader import (
+    read_sac_header,
+    read_sac_overview,
+    LONG_RECORD_NPTS,
+    DEFAULT_WINDOW,
+    MAX_WINDOW,
+    WINDOW_MARGIN,
+    OVERVIEW_POINTS,
+)
+from src.quality_metrics import QualityIndex, QualityJob
+from src.template_matching import TemplateMatchJob, confirmed_picks, save_candidates, load_candidates
+from src.picker_backend import DEFAULT_PICKER, PickerPool, PickerJob, save_ml_picks, load_ml_picks
+from src.stacking import ZHeaderCache, first_pick_epochs
+from src.group_tree import split_group_key
+from src.display_pipeline import display_stream, display_target_rate, as_float32, refinement_segment
+from src.preprocessing import StageCache, process_stream
+from src.dataset_loader import LoadJob, ScanJob
+from src.session import save_session, load_session, save_group_index, load_group_index
+from src.ui_setup import SORT_OPTIONS
+
+# Trigger sources other than Z, as named in the plot title
+TRIGGER_SOURCE_NAMES = {"norm": "Vector-norm", "polarization": "Polarisation"}
+
 
 class SeismicPlotter(QMainWindow):
-    def __init__(self):
+    def __init__(self, restore=True):
         super().__init__()
         self.setWindowTitle("Seismic Trace Plotter")
         self.setGeometry(100, 100, 1200, 800)
@@ -37,19 +67,86 @@ class SeismicPlotter(QMainWindow):
         self.current_p_lines = {}
         self.first_trigger = None
         self.filtered_traces = {}  # List to store filtered traces
+        self.display_rate = 0.0  # Hz of the decimated float32 working copies, 0 works at full rate
+        self.display_traces = {}  # group_key -> (rate, decimated copy of self.traces used for display)
         self.triggers = {}  # List to store trigger times
         self.filter = False
         self.trigger = False
         self.filter_params = None  # Store filter parameters
+        self.stage_cache = StageCache()  # per-stage outputs of the preprocessing chain
         self.marker_line = None  # PyQtGraph line for P Wave marker
         self.dragging = False  # Flag to indicate if marker is being dragged
         self.data_file = None  # Will be set when loading data
         self.active_plot = None  # Track which plot is being zoomed
+        self.file_groups = {}
+        self.folder_watcher = None  # Watches the loaded folder for new SAC files
+        self.refine_picks = True  # Snap placed/released P markers to the best onset
+        self.refine_method = "aic"
+        self.propagate_picks = True  # Pre-position P from the picks at the event's other stations
+        self.station_coords = {}  # group_key -> (lat, lon, elevation) from the SAC headers, or None; read by the load/scan jobs
+        self.stack_headers = ZHeaderCache()  # Raw Z headers read for the pick stack view
+        self.stack_window = None
+        self.stats_window = None
+        self.retired_jobs = []  # (job, thread) of cancelled jobs still winding down
+        self.three_component = False  # Show Z/N/E instead of Z only
+        self.windowed_groups = {}  # Long records read in windows: start time and overview
+        self.trigger_source = "Z"  # Z, norm or polarization
+        self.quality_index = QualityIndex()  # Per-group metrics cached next to data.csv
+        self.quality_job = None
+        self.quality_thread = None
+        self.quality_pending = set()
+        self.template_job = None  # Template matching over the unpicked groups
+        self.template_thread = None
+        self.picker_spec = DEFAULT_PICKER  # Picker plugin: "module:callable" or an .onnx model
+        self.picker_pool = None  # Worker processes with the picker loaded, kept between runs
+        self.ml_prepick = False  # Place the picker's onset on traces without a saved pick
+        self.ml_picks = {}  # group_key -> [(UTC string, probability)] from the picker
+        self.candidate_picks = {}  # group_key -> [(UTC string, cc, template)] from template matching
+        self.picker_job = None  # Dataset-wide picker run
+        self.picker_thread = None
+        self.trace_picker_job = None  # Picker run for the selected trace
+        self.trace_picker_thread = None
+        self.trace_picker_pending = None  # Group selected while the previous trace was being picked
+        self.load_job = None  # Background folder scan
+        self.load_thread = None
+        self.scan_job = None  # Background reconcile of a resumed session
+        self.scan_thread = None
+        self.data_folder = None
+        self.group_index_dirty = False  # file_groups changed since groups.json was written
         self.csv_handler = CSVHandler()
         self.data_df = self.csv_handler.load_data_from_csv()
 
         setup_ui(self)
         setup_shortcuts(self)
+        # Counts are shared with the event tree, which keeps them up to date
+        self.progress_stats = ProgressStats(self.group_tree_model.counts)
+        self.csv_handler.listener = self.on_pick_table_changed
+
+        if restore:
+            # Once the window is up, jump straight back to the last trace
+            QTimer.singleShot(0, self.restore_session)
+
+    def closeEvent(self, event):
+        self.save_session()
+        if self.scan_job is not None:
+            self.scan_job.cancel()
+            self.scan_thread.quit()
+            self.scan_thread.wait()
+        self.cancel_load_job()
+        if self.load_thread is not None:
+            self.load_thread.quit()
+            self.load_thread.wait()
+        self.cancel_quality_job()
+        self.cancel_template_job()
+        self.close_picker_pool()
+        self.wait_retired_jobs()
+        if self.stack_window is not None:
+            self.stack_window.close()
+        if self.stats_window is not None:
+            self.stats_window.close()
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+        super().closeEvent(event)
 
     def handle_escape(self):
         # Clear focus from any widget
@@ -61,6 +158,11 @@ class SeismicPlotter(QMainWindow):
         for action in self.toolbar.actions():
             if action.isCheckable():
                 action.setChecked(False)
+        # Auto-refine and the 3-component view are settings, not modes, keep them
+        self.refine_picks_action.setChecked(self.refine_picks)
+        self.propagate_picks_action.setChecked(self.propagate_picks)
+        self.ml_prepick_action.setChecked(self.ml_prepick)
+        self.three_component_action.setChecked(self.three_component)
 
         # Disable zoom select mode if active
         if self.zoom_select_mode:
@@ -75,32 +177,686 @@ class SeismicPlotter(QMainWindow):
             options=options,
         )
         if folder:
-            self.data_df = self.csv_handler.set_data_file(folder)
-            self.file_groups = group_sac_files(folder)
-            for group_key, files in self.file_groups.items():
-                try:
-                    item = QListWidgetItem(group_key)
-                    self.trace_list.addItem(item)
-                    if group_key not in self.data_df.index:
-                        self.data_df.loc[group_key] = [
-                            None,
-                            False,
-                            False
-                        ]  # p_wave_frame, needs_review
-                except Exception as e:
-                    QMessageBox.critical(
-                        self, "Error", f"Failed to load {group_key}.\nError: {str(e)}"
-                    )
+            self.start_load_job(folder)
+
+    def start_load_job(self, folder):
+        """Scans the folder in the background; the current dataset stays usable until it is done."""
+        self.cancel_load_job()
+        if self.load_thread is not None:
+            self.load_thread.quit()
+            self.load_thread.wait()
+        self.load_job = LoadJob(folder)
+        self.load_thread = QThread(self)
+        self.load_job.moveToThread(self.load_thread)
+        self.load_thread.started.connect(self.load_job.run)
+        self.load_job.progress.connect(self.on_load_progress)
+        self.load_job.finished.connect(self.on_load_finished)
+        self.load_job.failed.connect(self.on_load_failed)
+        self.load_job.cancelled.connect(self.on_load_cancelled)
+        self.load_progress.setRange(0, 0)  # Busy until the first event folder is done
+        self.load_progress.show()
+        self.cancel_load_btn.show()
+        self.load_thread.start()
+
+    def cancel_load_job(self):
+        if self.load_job is not None:
+            self.load_job.cancel()
+
+    def finish_load_job(self):
+        self.load_thread.quit()
+        self.load_thread.wait()
+        self.load_job = None
+        self.load_thread = None
+        self.load_progress.hide()
+        self.cancel_load_btn.hide()
+
+    def on_load_progress(self, done, total):
+        self.load_progress.setRange(0, total)
+        self.load_progress.setValue(done)
+
+    def on_load_cancelled(self):
+        if self.sender() is self.load_job:
+            self.finish_load_job()
+
+    def on_load_failed(self, error):
+        if self.sender() is not self.load_job:
+            return
+        self.finish_load_job()
+        QMessageBox.critical(self, "Error", f"Failed to load data folder.\nError: {error}")
+
+    def on_load_finished(self, result):
+        # A superseded job can still deliver a result, ignore it
+        if self.sender() is not self.load_job:
+            return
+        self.finish_load_job()
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+        self.cancel_quality_job()
+        self.traces = {}
+        self.filtered_traces = {}
+        self.display_traces = {}
+        self.stage_cache.clear()
+        self.windowed_groups = {}
+        self.trace_list.clear()
+
+        folder = result["folder"]
+        self.data_folder = folder
+        self.csv_handler = result["csv_handler"]
+        self.csv_handler.listener = self.on_pick_table_changed
+        self.data_df = self.csv_handler.data_df
+        self.quality_index = result["quality_index"]
+        self.file_groups = result["file_groups"]
+        self.station_coords = result["station_coords"]
+        self.stack_headers = ZHeaderCache()
+        save_group_index(folder, self.file_groups)
+        self.group_index_dirty = False
+
+        self.group_tree_model.reset(list(self.file_groups.keys()), self.data_df)
+        self.update_progress()
+        self.ml_picks = load_ml_picks(folder)
+        self.candidate_picks = load_candidates(folder)
+        self.apply_filters()
+        self.start_folder_watcher(folder)
+        self.start_quality_job(result["missing_quality"])
+
+    def get_session_state(self):
+        current_item = self.trace_list.currentItem()
+        return {
+            "folder": self.data_folder,
+            "filter": self.filter,
+            "filter_params": self.filter_params,
+            "trigger": self.trigger,
+            "trigger_params": {
+                "sta": self.sta,
+                "lta": self.lta,
+                "threshold": self.threshold,
+                "source": self.trigger_source,
+            } if self.trigger else None,
+            "list_filters": {
+                "tagged": int(self.filter_tagged.checkState()),
+                "with_p": int(self.filter_with_p.checkState()),
+                "discarded": int(self.filter_discarded.checkState()),
+                "sort": self.sort_combo.currentText(),
+                "min_snr": self.min_snr_input.value(),
+                "hide_bad": self.filter_bad_data.isChecked(),
+            },
+            "three_component": self.three_component,
+            "refine_picks": self.refine_picks,
+            "propagate_picks": self.propagate_picks,
+            "display_rate": self.display_rate,
+            "picker": self.picker_spec,
+            "ml_prepick": self.ml_prepick,
+            "current_group": current_item.text() if current_item else None,
+            "view_range": list(self.plot_item.viewRange()[0]),
+        }
+
+    def save_session(self):
+        if self.data_folder is None:
+            return
+        try:
+            if self.group_index_dirty:
+                save_group_index(self.data_folder, self.file_groups)
+                self.group_index_dirty = False
+            save_session(self.get_session_state())
+        except OSError as e:
+            print(f"Failed to save session: {e}")
+
+    def restore_session(self):
+        """
+        Restores the last session from its snapshot without rescanning the
+        folder; the filesystem is reconciled afterwards in the background.
+        """
+        state = load_session()
+        if not state or not state.get("folder") or not os.path.isdir(state["folder"]):
+            return
+        folder = state["folder"]
+        file_groups = load_group_index(folder)
+        if file_groups is None:
+            self.start_load_job(folder)
+            return
 
+        self.data_folder = folder
+        self.file_groups = file_groups
+        # Filled in by the scan job, propagation waits for it
+        self.station_coords = {}
+        self.stack_headers = ZHeaderCache()
+        self.data_df = self.csv_handler.set_data_file(folder)
+        # Missing rows count as unlabelled, so the tree can be built before they are added
+        self.group_tree_model.reset(list(file_groups.keys()), self.data_df)
+        self.data_df = self.csv_handler.add_groups(list(file_groups.keys()))
+        self.quality_index.load(folder)
+        self.update_progress()
+        self.ml_picks = load_ml_picks(folder)
+        self.candidate_picks = load_candidates(folder)
+
+        self.filter_params = state.get("filter_params")
+        self.filter = bool(state.get("filter")) and self.filter_params is not None
+        trigger_params = state.get("trigger_params")
+        if state.get("trigger") and trigger_params:
+            self.sta = trigger_params["sta"]
+            self.lta = trigger_params["lta"]
+            self.threshold = trigger_params["threshold"]
+            self.trigger_source = trigger_params.get("source", "Z")
+            self.trigger = True
+        self.refine_picks = state.get("refine_picks", True)
+        self.refine_picks_action.setChecked(self.refine_picks)
+        self.propagate_picks = state.get("propagate_picks", True)
+        self.propagate_picks_action.setChecked(self.propagate_picks)
+        self.display_rate = state.get("display_rate", 0.0)
+        self.display_rate_input.blockSignals(True)
+        self.display_rate_input.setValue(self.display_rate)
+        self.display_rate_input.blockSignals(False)
+        self.picker_spec = state.get("picker", DEFAULT_PICKER)
+        self.picker_label.setText(f"Picker: {self.picker_name()}")
+        self.ml_prepick = state.get("ml_prepick", False)
+        self.ml_prepick_action.setChecked(self.ml_prepick)
+        if state.get("three_component", False) != self.three_component:
+            self.three_component = not self.three_component
+            self.three_component_action.setChecked(self.three_component)
+            for widget in list(self.component_plot_widgets.values()) + list(
+                self.component_spectrogram_widgets.values()
+            ):
+                widget.setVisible(self.three_component)
+
+        # Set the list filters without a rebuild per widget
+        list_filters = state.get("list_filters", {})
+        widgets = [self.filter_tagged, self.filter_with_p, self.filter_discarded,
+                   self.sort_combo, self.min_snr_input, self.filter_bad_data]
+        for widget in widgets:
+            widget.blockSignals(True)
+        self.filter_tagged.setCheckState(list_filters.get("tagged", Qt.Unchecked))
+        self.filter_with_p.setCheckState(list_filters.get("with_p", Qt.Unchecked))
+        self.filter_discarded.setCheckState(list_filters.get("discarded", Qt.PartiallyChecked))
+        self.sort_combo.setCurrentText(list_filters.get("sort", self.sort_combo.currentText()))
+        self.min_snr_input.setValue(list_filters.get("min_snr", 0))
+        self.filter_bad_data.setChecked(list_filters.get("hide_bad", False))
+        for widget in widgets:
+            widget.blockSignals(False)
+
+        self.refresh_trace_list(state.get("current_group"))
+        view_range = state.get("view_range")
+        current_item = self.trace_list.currentItem()
+        if view_range and current_item and current_item.text() == state.get("current_group"):
+            self.plot_item.setXRange(*view_range, padding=0)
+
+        self.start_folder_watcher(folder)
+        self.start_scan_job(folder)
+
+    def start_scan_job(self, folder):
+        self.scan_job = ScanJob(folder, self.quality_index)
+        self.scan_thread = QThread(self)
+        self.scan_job.moveToThread(self.scan_thread)
+        self.scan_thread.started.connect(self.scan_job.run)
+        self.scan_job.finished.connect(self.on_scan_finished)
+        self.scan_job.failed.connect(self.on_scan_failed)
+        self.scan_thread.start()
+
+    def finish_scan_job(self):
+        self.scan_thread.quit()
+        self.scan_thread.wait()
+        self.scan_job = None
+        self.scan_thread = None
+
+    def on_scan_failed(self, error):
+        self.finish_scan_job()
+        print(f"Failed to reconcile {self.data_folder}: {error}")
+
+    def on_scan_finished(self, result):
+        """Applies what changed on disk since the snapshot through the folder watcher paths."""
+        self.finish_scan_job()
+        if result["folder"] != self.data_folder:
+            return
+        scanned = result["file_groups"]
+        removed = {}
+        added = {}
+        for group_key, files in self.file_groups.items():
+            gone = set(files) - set(scanned.get(group_key, []))
+            if gone:
+                removed[group_key] = sorted(gone)
+        for group_key, files in scanned.items():
+            new = set(files) - set(self.file_groups.get(group_key, []))
+            if new:
+                added[group_key] = sorted(new)
+        self.station_coords = result["station_coords"]
+        if removed:
+            self.on_files_removed(removed)
+        if added:
+            self.on_files_added(added)
+        print(f"Session reconciled: {len(added)} groups added/changed, {len(removed)} groups lost files")
+        self.start_quality_job(result["missing_quality"])
+
+    def start_folder_watcher(self, folder):
+        self.folder_watcher = FolderWatcher(folder, self.file_groups, parent=self)
+        self.folder_watcher.files_added.connect(self.on_files_added)
+        self.folder_watcher.files_removed.connect(self.on_files_removed)
+        self.folder_watcher.start()
+
+    def on_files_added(self, added):
+        new_groups = [group_key for group_key in added if group_key not in self.file_groups]
+        for group_key, files in added.items():
+            self.file_groups.setdefault(group_key, []).extend(files)
+            # Force a reload so new components show up
+            self.traces.pop(group_key, None)
+            self.filtered_traces.pop(group_key, None)
+            self.display_traces.pop(group_key, None)
+            self.stage_cache.discard(group_key)
+            self.windowed_groups.pop(group_key, None)
+            self.stack_headers.headers.pop(group_key, None)
+        # A watcher batch is one event folder, small enough to read here
+        self.station_coords.update(station_index({key: self.file_groups[key] for key in added}))
+
+        self.data_df = self.csv_handler.add_groups(new_groups)
+        if new_groups:
             self.csv_handler.save_data_to_csv()
+
+        self.trace_list.addItems(self.get_visible_group_keys(new_groups))
+        self.group_index_dirty = True
+        print(f"Folder watcher: {len(new_groups)} new groups, {len(added)} groups changed")
+        self.update_traces_label()
+        self.start_quality_job(list(added.keys()))
+
+    def on_files_removed(self, removed):
+        gone_groups = []
+        for group_key, files in removed.items():
+            if group_key not in self.file_groups:
+                continue
+            gone = {os.path.normpath(file) for file in files}
+            remaining = [
+                file for file in self.file_groups[group_key]
+                if os.path.normpath(file) not in gone
+            ]
+            self.traces.pop(group_key, None)
+            self.filtered_traces.pop(group_key, None)
+            self.display_traces.pop(group_key, None)
+            self.stage_cache.discard(group_key)
+            self.windowed_groups.pop(group_key, None)
+            self.stack_headers.headers.pop(group_key, None)
+            if remaining:
+                self.file_groups[group_key] = remaining
+                continue
+            # Keep the CSV row so picks survive the folder coming back
+            del self.file_groups[group_key]
+            gone_groups.append(group_key)
+            for item in self.trace_list.findItems(group_key, Qt.MatchExactly):
+                self.trace_list.takeItem(self.trace_list.row(item))
+        self.group_tree_model.remove_groups(gone_groups)
+        self.update_progress()
+        self.group_index_dirty = True
+        print(f"Folder watcher: {len(removed)} groups lost files")
+        self.update_traces_label()
+
+    def retire_job(self, job, thread):
+        """
+        Lets a cancelled job wind down in its thread without blocking the GUI;
+        the references are kept until the thread has finished.
+        """
+        entry = (job, thread)
+        self.retired_jobs.append(entry)
+        thread.finished.connect(lambda: self.retired_jobs.remove(entry) if entry in self.retired_jobs else None)
+        thread.quit()
+
+    def wait_retired_jobs(self):
+        for job, thread in list(self.retired_jobs):
+            thread.wait()
+        self.retired_jobs = []
+
+    def start_quality_job(self, group_keys):
+        """Queues groups for metric computation, starting a background job if idle."""
+        self.quality_pending.update(group_keys)
+        if self.quality_thread is not None or not self.quality_pending:
+            return
+        group_keys = [key for key in self.quality_pending if key in self.file_groups]
+        self.quality_pending = set()
+        if not group_keys:
+            return
+        if getattr(self, "sta", None) is not None:
+            self.quality_job = QualityJob(self.file_groups, group_keys, self.sta, self.lta, self.threshold)
+        else:
+            self.quality_job = QualityJob(self.file_groups, group_keys)
+        self.quality_thread = QThread(self)
+        self.quality_job.moveToThread(self.quality_thread)
+        self.quality_thread.started.connect(self.quality_job.run)
+        self.quality_job.progress.connect(self.on_quality_progress)
+        self.quality_job.finished.connect(self.on_quality_finished)
+        self.quality_thread.start()
+
+    def cancel_quality_job(self):
+        self.quality_pending = set()
+        if self.quality_job is not None:
+            self.quality_job.cancel()
+            self.quality_job.finished.disconnect(self.on_quality_finished)
+            self.retire_job(self.quality_job, self.quality_thread)
+        self.quality_job = None
+        self.quality_thread = None
+
+    def recompute_quality_metrics(self):
+        self.cancel_quality_job()
+        self.start_quality_job(list(self.file_groups.keys()))
+
+    def on_quality_progress(self, done, total):
+        self.quality_label.setText(f"Quality metrics: {done}/{total}")
+
+    def on_quality_finished(self, results):
+        self.quality_thread.quit()
+        self.quality_thread.wait()
+        self.quality_job = None
+        self.quality_thread = None
+        self.quality_index.update(results)
+        self.quality_index.save()
+        self.quality_label.setText(f"Quality metrics: {len(self.quality_index.df)} groups")
+        # Only reorder the list when the metrics are actually in use
+        if self.quality_filters_active():
             self.apply_filters()
+        self.start_quality_job([])
+
+    def toggle_template_job(self):
+        if self.template_job is not None:
+            self.cancel_template_job()
+            self.template_label.setText("Candidates: cancelled")
+        else:
+            self.start_template_job()
+
+    def start_template_job(self):
+        """Scans the unpicked, non-discarded groups with templates cut around the confirmed picks."""
+        if not self.file_groups or self.template_job is not None:
+            return
+        picks = {key: pick for key, pick in confirmed_picks(self.data_df).items() if key in self.file_groups}
+        if not picks:
+            QMessageBox.information(self, "Template matching", "There are no confirmed picks to build templates from.")
+            return
+        df = self.data_df.reindex(list(self.file_groups.keys()))
+        unpicked = df.index[df["p_wave_frame"].isna() & ~df["deleted"].astype(bool)]
+        self.template_job = TemplateMatchJob(
+            self.file_groups, picks, list(unpicked), self.cc_threshold_input.value(),
+            self.filter_params if self.filter else None,
+        )
+        self.template_thread = QThread(self)
+        self.template_job.moveToThread(self.template_thread)
+        self.template_thread.started.connect(self.template_job.run)
+        self.template_job.progress.connect(self.on_template_progress)
+        self.template_job.finished.connect(self.on_template_finished)
+        self.template_btn.setText("Cancel Template Matching")
+        self.template_thread.start()
+
+    def cancel_template_job(self):
+        if self.template_job is not None:
+            self.template_job.cancel()
+            self.template_job.finished.disconnect(self.on_template_finished)
+            self.retire_job(self.template_job, self.template_thread)
+        self.template_job = None
+        self.template_thread = None
+        self.template_btn.setText("Find Candidate Picks")
+
+    def on_template_progress(self, stage, done, total):
+        self.template_label.setText(f"Candidates: {stage} {done}/{total}")
+
+    def on_template_finished(self, results):
+        self.template_thread.quit()
+        self.template_thread.wait()
+        self.template_job = None
+        self.template_thread = None
+        self.template_btn.setText("Find Candidate Picks")
+
+        # Candidates stay out of the pick table until a pick is saved on them
+        save_candidates(self.data_folder, results)
+        self.candidate_picks = {key: detections for key, detections in results.items() if detections}
+        self.template_label.setText(f"Candidates: {len(self.candidate_picks)} groups")
+        current_item = self.trace_list.currentItem()
+        self.refresh_trace_list(current_item.text() if current_item else None)
+
+    def picker_name(self):
+        return os.path.basename(self.picker_spec) if self.picker_spec.endswith(".onnx") else self.picker_spec.split(":")[-1]
+
+    def get_picker_pool(self):
+        if self.picker_pool is None:
+            self.picker_pool = PickerPool(self.picker_spec)
+        return self.picker_pool
+
+    def close_picker_pool(self):
+        self.cancel_picker_job()
+        self.cancel_trace_picker_job()
+        # The pool's shared memory must outlive the cancelled jobs still using it
+        self.wait_retired_jobs()
+        if self.picker_pool is not None:
+            self.picker_pool.close()
+            self.picker_pool = None
+
+    def choose_picker_model(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Choose Picker Model", "", "ONNX models (*.onnx)")
+        if not path:
+            return
+        self.close_picker_pool()
+        self.picker_spec = path
+        self.ml_picks = {}
+        self.picker_label.setText(f"Picker: {self.picker_name()}")
+
+    def toggle_ml_prepick(self):
+        self.ml_prepick = not self.ml_prepick
+        self.ml_prepick_action.setChecked(self.ml_prepick)
+
+    def add_ml_markers(self, group_key):
+        """P marker at the most probable picker onset of a group, through the usual marker path."""
+        picks = self.ml_picks.get(group_key)
+        if not picks:
+            return False
+        tr = self.traces[group_key].select(channel="*Z")[0]
+        wave_offset = int(self.filter_params["offset"]) if self.filter else 0
+        self.add_p_markers(UTCDateTime(picks[0][0]) - tr.stats.starttime - wave_offset, refine=True)
+        return True
+
+    def add_candidate_markers(self, group_key):
+        """P marker at the strongest template-matching detection of a group."""
+        candidates = self.candidate_picks.get(group_key)
+        if not candidates:
+            return False
+        tr = self.traces[group_key].select(channel="*Z")[0]
+        wave_offset = int(self.filter_params["offset"]) if self.filter else 0
+        self.add_p_markers(UTCDateTime(candidates[0][0]) - tr.stats.starttime - wave_offset)
+        return True
+
+    def start_trace_picker_job(self, group_key):
+        """Picks the selected trace in the picker pool; one trace at a time, the latest selection wins."""
+        if self.trace_picker_job is not None:
+            self.trace_picker_pending = group_key
+            return
+        self.trace_picker_pending = None
+        self.trace_picker_job = PickerJob(self.get_picker_pool(), self.file_groups, [group_key])
+        self.trace_picker_thread = QThread(self)
+        self.trace_picker_job.moveToThread(self.trace_picker_thread)
+        self.trace_picker_thread.started.connect(self.trace_picker_job.run)
+        self.trace_picker_job.finished.connect(self.on_trace_picker_finished)
+        self.trace_picker_job.failed.connect(self.on_picker_failed)
+        self.trace_picker_thread.start()
+
+    def finish_trace_picker_job(self):
+        self.trace_picker_thread.quit()
+        self.trace_picker_thread.wait()
+        self.trace_picker_job = None
+        self.trace_picker_thread = None
+
+    def cancel_trace_picker_job(self):
+        if self.trace_picker_job is not None:
+            self.trace_picker_job.cancel()
+            self.trace_picker_job.finished.disconnect(self.on_trace_picker_finished)
+            self.trace_picker_job.failed.disconnect(self.on_picker_failed)
+            self.retire_job(self.trace_picker_job, self.trace_picker_thread)
+            self.trace_picker_job = None
+            self.trace_picker_thread = None
+        self.trace_picker_pending = None
+
+    def on_trace_picker_finished(self, results):
+        self.finish_trace_picker_job()
+        self.ml_picks.update(results)
+        current = self.get_current() if self.trace_list.currentItem() else None
+        for group_key in results:
+            if group_key == current and not self.current_p_lines and pd.isna(
+                self.data_df["p_wave_frame"].get(group_key)
+            ):
+                if not self.add_ml_markers(group_key) and self.first_trigger is not None:
+                    self.add_p_markers(self.first_trigger, refine=True)
+        pending = self.trace_picker_pending
+        if pending is not None and pending == current and pending not in self.ml_picks:
+            self.start_trace_picker_job(pending)
+        self.trace_picker_pending = None
+
+    def toggle_picker_job(self):
+        if self.picker_job is not None:
+            self.cancel_picker_job()
+            self.picker_status_label.setText("Pre-picks: cancelled")
+        else:
+            self.start_picker_job()
+
+    def start_picker_job(self):
+        """Runs the picker over the unpicked, non-discarded groups."""
+        if not self.file_groups or self.picker_job is not None:
+            return
+        df = self.data_df.reindex(list(self.file_groups.keys()))
+        unpicked = list(df.index[df["p_wave_frame"].isna() & ~df["deleted"].astype(bool)])
+        if not unpicked:
+            QMessageBox.information(self, "Picker", "Every group already has a pick.")
+            return
+        self.picker_job = PickerJob(self.get_picker_pool(), self.file_groups, unpicked)
+        self.picker_thread = QThread(self)
+        self.picker_job.moveToThread(self.picker_thread)
+        self.picker_thread.started.connect(self.picker_job.run)
+        self.picker_job.progress.connect(self.on_picker_progress)
+        self.picker_job.finished.connect(self.on_picker_finished)
+        self.picker_job.failed.connect(self.on_picker_failed)
+        self.picker_btn.setText("Cancel Pre-picking")
+        self.picker_status_label.setText("Pre-picks: starting workers")
+        self.picker_thread.start()
+
+    def finish_picker_job(self):
+        self.picker_thread.quit()
+        self.picker_thread.wait()
+        self.picker_job = None
+        self.picker_thread = None
+        self.picker_btn.setText("Pre-pick Dataset")
+
+    def cancel_picker_job(self):
+        if self.picker_job is not None:
+            self.picker_job.cancel()
+            self.picker_job.finished.disconnect(self.on_picker_finished)
+            self.picker_job.failed.disconnect(self.on_picker_failed)
+            self.retire_job(self.picker_job, self.picker_thread)
+            self.picker_job = None
+            self.picker_thread = None
+            self.picker_btn.setText("Pre-pick Dataset")
+
+    def on_picker_progress(self, done, total):
+        self.picker_status_label.setText(f"Pre-picks: {done}/{total}")
+
+    def on_picker_finished(self, results):
+        self.finish_picker_job()
+        self.ml_picks.update(results)
+        save_ml_picks(self.data_folder, results)
+        found = sum(1 for picks in results.values() if picks)
+        self.picker_status_label.setText(f"Pre-picks: {found}/{len(results)} groups")
+        current_item = self.trace_list.currentItem()
+        if self.ml_prepick and current_item and not self.current_p_lines and current_item.text() in results:
+            self.add_ml_markers(current_item.text())
+
+    def on_picker_failed(self, error):
+        if self.sender() is self.picker_job:
+            self.finish_picker_job()
+            self.picker_status_label.setText("Pre-picks: failed")
+        elif self.sender() is self.trace_picker_job:
+            self.finish_trace_picker_job()
+        # A picker that cannot load would fail every run, start over on the next one
+        if self.picker_pool is not None:
+            self.close_picker_pool()
+        self.ml_prepick = False
+        self.ml_prepick_action.setChecked(False)
+        QMessageBox.critical(self, "Picker", f"The picker failed.\nError: {error}")
+
+    def quality_filters_active(self):
+        return (
+            SORT_OPTIONS[self.sort_combo.currentText()] is not None
+            or self.min_snr_input.value() > 0
+            or self.filter_bad_data.isChecked()
+        )
+
+    def get_sorted_group_keys(self):
+        sort_option = SORT_OPTIONS[self.sort_combo.currentText()]
+        if sort_option is None:
+            return list(self.file_groups.keys())
+        column, ascending = sort_option
+        values = pd.to_numeric(
+            self.quality_index.df[column].reindex(pd.Index(list(self.file_groups.keys()))),
+            errors="coerce",
+        )
+        return list(values.sort_values(ascending=ascending, na_position="last", kind="stable").index)
+
+    def update_traces_label(self):
+        visible_traces = self.trace_list.count()
+        total_traces = len(self.file_groups)
+        self.traces_label.setText(f"Loaded Traces: {visible_traces}/{total_traces}")
 
     def load_data(self, group_key):
         files = self.file_groups[group_key]
+        header = read_sac_header(files[0])
+        if header.npts > LONG_RECORD_NPTS:
+            self.load_long_record(group_key, header)
+            return
         st = load_trace_data(files, group_key)  # Using utility function
         if st:
             self.traces[group_key] = st
 
+    def load_long_record(self, group_key, header):
+        """
+        Long records are not read whole: keep a cheap overview of the full
+        record and load only a window at full rate, starting around the
+        first saved pick if there is one.
+        """
+        files = self.file_groups[group_key]
+        if group_key not in self.windowed_groups:
+            z_files = [f for f in files if (read_sac_header(f).kcmpnm or "").strip().endswith("Z")]
+            overview_file = z_files[0] if z_files else files[0]
+            record_start = read_sac_header(overview_file).to_obspy_trace().stats.starttime
+            self.windowed_groups[group_key] = {
+                "record_start": record_start,
+                "overview": read_sac_overview(overview_file, OVERVIEW_POINTS),
+            }
+        record_start = self.windowed_groups[group_key]["record_start"]
+        center = record_start + DEFAULT_WINDOW / 2
+        if group_key in self.data_df.index and pd.notna(self.data_df.loc[group_key, "p_wave_frame"]):
+            times = json.loads(self.data_df.loc[group_key, "p_wave_frame"])
+            if times:
+                center = UTCDateTime(times[0])
+        st = load_trace_window(files, group_key, center - DEFAULT_WINDOW / 2, center + DEFAULT_WINDOW / 2)
+        if st:
+            self.traces[group_key] = st
+
+    def load_window_around(self, left, right):
+        """Reloads the window of a long record so that [left, right] (plot time) is at full rate."""
+        group_key = self.get_current()
+        tr = self.get_display_trace()
+        origin = tr.stats.starttime
+        marker_times = [origin + lines["plot"].value() for lines in self.current_p_lines.values()]
+        span = max(right - left, 1.0)
+        margin = max(span * WINDOW_MARGIN, (DEFAULT_WINDOW - span) / 2)
+        st = load_trace_window(
+            self.file_groups[group_key], group_key,
+            origin + left - margin, origin + right + margin,
+        )
+        if not st:
+            return left, right
+        self.traces[group_key] = st
+        self.filtered_traces.pop(group_key, None)
+        self.display_traces.pop(group_key, None)
+        self.stage_cache.discard(group_key)
+        self.plot_selected_trace(self.trace_list.currentItem())
+
+        # Keep unsaved markers where they were
+        new_origin = self.get_display_trace().stats.starttime
+        for lines in self.current_p_lines.values():
+            self.plot_item.removeItem(lines["plot"])
+            self.spectrogram_item.removeItem(lines["spec"])
+        self.clear_p_marker()
+        for marker_time in marker_times:
+            self.add_p_markers(marker_time - new_origin)
+        return left + (origin - new_origin), right + (origin - new_origin)
+
 
     def plot_traces(self, selected_group_key=None):
 
@@ -112,19 +868,29 @@ class SeismicPlotter(QMainWindow):
         if self.filter and selected_group_key in self.filtered_traces:
             st = self.filtered_traces[selected_group_key]
         else:
-            st = self.traces[selected_group_key]
+            st = self.get_source_stream(selected_group_key)
 
         tr = st.select(channel="*Z")[0]
+        if selected_group_key in self.windowed_groups:
+            # Whole-record overview behind the window loaded at full rate
+            overview_times, overview_values = self.windowed_groups[selected_group_key]["overview"]
+            shift = self.windowed_groups[selected_group_key]["record_start"] - tr.stats.starttime
+            self.plot_item.plot(
+                x=overview_times + shift, y=overview_values,
+                pen=pg.mkPen(color=(170, 170, 170), width=1),
+            )
 
-        img = plot_spectrogram(tr)
-        self.spectrogram_item.addItem(img)
+        three_component = self.three_component and self.plot_three_components(selected_group_key)
+        if not three_component:
+            img = plot_spectrogram(tr)
+            self.spectrogram_item.addItem(img)
 
-        times = np.linspace(0, tr.stats.endtime - tr.stats.starttime, num=len(tr.data))
+            times = np.linspace(0, tr.stats.endtime - tr.stats.starttime, num=len(tr.data))
 
-        # Plot the trace data with increased width
-        self.plot_item.plot(
-            x=times, y=tr.data, pen=pg.mkPen(color=(0, 0, 0), width=1), name=tr.id
-        )
+            # Plot the trace data with increased width
+            self.plot_item.plot(
+                x=times, y=tr.data, pen=pg.mkPen(color=(0, 0, 0), width=1), name=tr.id
+            )
 
         self.spectrogram_item.getViewBox().setXLink(self.plot_item)
 
@@ -145,17 +911,70 @@ class SeismicPlotter(QMainWindow):
             label.setParentItem(self.plot_item.getViewBox())
             label.anchor(itemPos=(0, 0), parentPos=(0.45, 0.065))
 
-        self.plot_item.setTitle(
-            "Filtered Seismic Traces (Z Channel)"
-            if self.filter
-            else "Seismic Traces (Z Channel)"
-        )
+        self.plot_item.setTitle(self.plot_title(three_component))
 
         # Set labels and ranges
         self.plot_item.setLabel("left", "Amplitude")
         self.plot_item.setLabel("bottom", "Time (s)")
         self.plot_item.enableAutoRange()
 
+    def plot_title(self, three_component):
+        """Title of the top plot: the channels on screen and the trigger source when it is not Z."""
+        details = ["Z/N/E Channels" if three_component else "Z Channel"]
+        if self.trigger and self.trigger_source in TRIGGER_SOURCE_NAMES:
+            details.append(f"{TRIGGER_SOURCE_NAMES[self.trigger_source]} trigger")
+        prefix = "Filtered " if self.filter else ""
+        return f"{prefix}Seismic Traces ({', '.join(details)})"
+
+    def get_component_stack(self, group_key):
+        """
+        Z/N/E of a group as one (3, npts) array, filtered in a single pass when
+        the filter is on. t0 is the stack start in plot time (seconds from the
+        start of the displayed Z trace).
+        """
+        data, sampling_rate, ids, t0 = stack_components(self.get_source_stream(group_key))
+        if self.filter and self.filter_params:
+            data, dropped = filter_stack(data, sampling_rate, self.filter_params)
+            t0 += dropped - self.filter_params["offset"]
+        return data, sampling_rate, ids, t0
+
+    def plot_three_components(self, group_key):
+        """Draws Z/N/E waveforms and spectrograms. Returns False if the group has no full 3-C set."""
+        try:
+            data, sampling_rate, ids, t0 = self.get_component_stack(group_key)
+        except ValueError as e:
+            print(f"3-component view unavailable for {group_key}: {e}")
+            return False
+
+        # One STFT call for all three components
+        Sxx, freqs, spec_times = compute_spectrograms(data, sampling_rate)
+        times = t0 + np.arange(data.shape[1]) / sampling_rate
+        spectrogram_items = [self.spectrogram_item] + [
+            self.component_spectrogram_items[c] for c in ("N", "E")
+        ]
+        plot_items = [self.plot_item] + [self.component_plot_items[c] for c in ("N", "E")]
+        for row, (spec_item, plot_item) in enumerate(zip(spectrogram_items, plot_items)):
+            spec_item.addItem(spectrogram_image(Sxx[row], freqs, spec_times, t0))
+            plot_item.plot(
+                x=times, y=data[row], pen=pg.mkPen(color=(0, 0, 0), width=1), name=ids[row]
+            )
+            if plot_item is not self.plot_item:
+                plot_item.setTitle(ids[row])
+                plot_item.enableAutoRange()
+        return True
+
+    def toggle_three_component(self):
+        self.three_component = not self.three_component
+        self.three_component_action.setChecked(self.three_component)
+        widgets = list(self.component_plot_widgets.values()) + list(
+            self.component_spectrogram_widgets.values()
+        )
+        for widget in widgets:
+            widget.setVisible(self.three_component)
+        current_item = self.trace_list.currentItem()
+        if current_item:
+            self.plot_selected_trace(current_item)
+
     def get_current(self):
         current_item = self.trace_list.currentItem()
         return current_item.text()
@@ -189,11 +1008,13 @@ class SeismicPlotter(QMainWindow):
             self.calculate_trigger_for_selected()
         else:
             self.first_trigger = None
+        has_pick = group_key in self.data_df.index and pd.notna(self.data_df.loc[group_key, "p_wave_frame"])
+        if self.propagate_picks and not has_pick:
+            # A saved pick takes the marker anyway, no need to locate the event
+            self.apply_pick_propagation(group_key)
 
         # Load P-wave arrival time from CSV
-        if group_key in self.data_df.index and pd.notna(
-            self.data_df.loc[group_key, "p_wave_frame"]
-        ):
+        if has_pick:
             p_wave_time_utc = json.loads(self.data_df.loc[group_key, "p_wave_frame"])
             st = self.traces[group_key]
             tr = st.select(channel="*Z")[0]
@@ -203,8 +1024,18 @@ class SeismicPlotter(QMainWindow):
             for wave_time_utc in p_wave_time_utc:
                 wave_time = UTCDateTime(wave_time_utc) - tr.stats.starttime - wave_offset
                 self.add_p_markers(wave_time)
+        elif group_key in self.candidate_picks:
+            # Saving the pick accepts the candidate
+            self.add_candidate_markers(group_key)
+        elif self.ml_prepick and group_key in self.ml_picks:
+            # The picker may have found nothing, the trigger is the fallback then
+            if not self.add_ml_markers(group_key) and self.first_trigger is not None:
+                self.add_p_markers(self.first_trigger, refine=True)
+        elif self.ml_prepick:
+            # The trigger marker waits for the picker, it is the fallback if it finds nothing
+            self.start_trace_picker_job(group_key)
         elif self.first_trigger is not None:
-            self.add_p_markers(self.first_trigger)
+            self.add_p_markers(self.first_trigger, refine=True)
 
         selected_trace = group_key
         self.plot_traces(selected_group_key=selected_trace)
@@ -220,7 +1051,7 @@ class SeismicPlotter(QMainWindow):
             plot_marker.setValue(time)
             spec_marker.setValue(time)
     
-    def add_p_markers(self, pos=5):
+    def add_p_markers(self, pos=5, refine=False):
         id = uuid.uuid4() 
         plot_marker= pg.InfiniteLine(
             pos=pos,
@@ -238,6 +1069,8 @@ class SeismicPlotter(QMainWindow):
         plot_marker.sigClicked.connect(lambda ev: self.select_p_marker(id))
         spec_marker.sigPositionChanged.connect(lambda ev: self.update_p_wave_marker(ev, id))
         spec_marker.sigClicked.connect(lambda ev: self.select_p_marker(id))
+        plot_marker.sigPositionChangeFinished.connect(lambda ev: self.refine_p_marker(id))
+        spec_marker.sigPositionChangeFinished.connect(lambda ev: self.refine_p_marker(id))
         self.current_p_lines[id] = {
             "plot": plot_marker,
             "spec": spec_marker 
@@ -245,7 +1078,122 @@ class SeismicPlotter(QMainWindow):
 
         self.plot_item.addItem(plot_marker)
         self.spectrogram_item.addItem(spec_marker)
+        if refine:
+            self.refine_p_marker(id)
+        return id
+
+    def get_display_trace(self):
+        """Returns the Z trace currently shown, filtered if the filter is on."""
+        current_item = self.trace_list.currentItem()
+        if current_item is None:
+            return None
+        group_key = current_item.text()
+        if self.filter and group_key in self.filtered_traces:
+            st = self.filtered_traces[group_key]
+        elif group_key in self.traces:
+            st = self.get_source_stream(group_key)
+        else:
+            st = None
+        if not st:
+            return None
+        return st.select(channel="*Z")[0]
+
+    def get_source_stream(self, group_key):
+        """
+        Unfiltered stream that display, spectrogram and triggers work on: the
+        full-rate traces, or their decimated float32 copy when a display rate
+        is set. Pick times always come from the full-rate traces.
+        """
+        st = self.traces[group_key]
+        if not self.display_rate:
+            return st
+        rate = display_target_rate(self.display_rate, self.filter_params if self.filter else None)
+        cached = self.display_traces.get(group_key)
+        if cached is None or cached[0] != rate:
+            if rate != self.display_rate:
+                print(f"Display rate raised to {rate:g} Hz to keep the pass band of the filter")
+            self.display_traces[group_key] = (rate, display_stream(st, rate))
+        return self.display_traces[group_key][1]
+
+    def set_display_rate(self, rate):
+        self.display_rate = rate
+        self.display_traces = {}
+        self.filtered_traces = {}
+        self.stage_cache.clear()
+        if self.trace_list.currentItem():
+            self.plot_selected_trace(self.trace_list.currentItem())
+
+    def refine_p_marker(self, id):
+        """Snaps a P marker to the best onset near its current position."""
+        if not self.refine_picks or id not in self.current_p_lines:
+            return
+        tr = self.get_display_trace()
+        if tr is None:
+            return
+        lines = self.current_p_lines[id]
+        position = lines["plot"].value()
+        origin = tr.stats.starttime
+        if self.display_rate:
+            # Refine on the full-rate samples around the marker, not the decimated copy
+            full_rate = self.traces[self.get_current()].select(channel="*Z")[0]
+            tr = refinement_segment(full_rate, origin + position, self.filter_params if self.filter else None)
+        refined = refine_onset(
+            tr.data, tr.stats.sampling_rate, origin + position - tr.stats.starttime, method=self.refine_method
+        )
+        if refined is not None:
+            refined += tr.stats.starttime - origin
+            lines["plot"].setValue(refined)
+            lines["spec"].setValue(refined)
+
+    def toggle_pick_refinement(self):
+        self.refine_picks = not self.refine_picks
+        self.refine_picks_action.setChecked(self.refine_picks)
         
+    def predict_p_time(self, group_key):
+        """
+        Predicted P time of a group (plot seconds) from the picks at the other
+        stations of its event, and the half width of the window to search.
+        Returns (None, None) when there are not enough picked stations.
+        Groups tagged for review or discarded are not used as anchors.
+        """
+        if self.station_coords.get(group_key) is None:
+            return None, None
+        event = split_group_key(group_key)[0]
+        group_keys = [
+            key for key in self.group_tree_model.event_groups.get(event, [])
+            if self.station_coords.get(key) is not None
+        ]
+        df = self.data_df.reindex(group_keys)
+        anchors = df["p_wave_frame"].notna() & ~df["needs_review"].eq(True) & ~df["deleted"].eq(True)
+        anchors[group_key] = False
+        times = pd.Series(np.nan, index=df.index)
+        if anchors.any():
+            times[anchors] = first_pick_epochs(df.loc[anchors, "p_wave_frame"])
+
+        coords = [self.station_coords[key] for key in group_keys]
+        predicted, half_window = predict_picks(coords, times.to_numpy())
+        if predicted is None:
+            return None, None
+        tr = self.traces[group_key].select(channel="*Z")[0]
+        wave_offset = int(self.filter_params["offset"]) if self.filter else 0
+        predicted = predicted[group_keys.index(group_key)]
+        return predicted - tr.stats.starttime.timestamp - wave_offset, half_window
+
+    def apply_pick_propagation(self, group_key):
+        """Starts the P marker at the propagated time, or the trigger closest to it."""
+        predicted, half_window = self.predict_p_time(group_key)
+        if predicted is None:
+            return
+        if self.trigger:
+            onset = closest_trigger(self.triggers.get(group_key, []), predicted, half_window)
+            self.first_trigger = onset if onset is not None else predicted
+        else:
+            self.first_trigger = predicted
+
+    def toggle_pick_propagation(self):
+        self.propagate_picks = not self.propagate_picks
+        self.propagate_picks_action.setChecked(self.propagate_picks)
+
     def select_p_marker(self, id):
         for c_id, lines in self.current_p_lines.items():
             lines.get("plot").setPen(pg.mkPen(color=(255,0,0), width=2.5))
@@ -260,7 +1208,9 @@ class SeismicPlotter(QMainWindow):
         lines.get("spec").setHoverPen(pg.mkPen(color=(0, 0, 255), width=2.5))
 
     def manually_mark_p(self):
-        self.add_p_markers()
+        # Start from the STA/LTA onset when there is one, the refinement does the rest
+        pos = self.first_trigger if self.first_trigger is not None else 5
+        self.add_p_markers(pos, refine=True)
 
     def save_p_wave_time_to_csv(self):
         current_item = self.trace_list.currentItem()
@@ -277,6 +1227,8 @@ class SeismicPlotter(QMainWindow):
                 wave_offset = 0
                 if self.filter:
                     wave_offset = int(self.filter_params["offset"])
+                # The decimated copy shares the start time of the full-rate
+                # trace, so the marker time is stored as it is in both modes
                 real_p_wave_utc = starttime + p_wave_time + wave_offset
                 # p_wave_frame = calculate_wave_frame(  # Using utility function
                 #     p_wave_time, 
@@ -291,6 +1243,7 @@ class SeismicPlotter(QMainWindow):
         self.save_p_wave_time_to_csv()
         self.navigate_to_next_trace()
         self.apply_filters()
+        self.save_session()
 
     def navigate_to_next_trace(self):
         current_index = self.trace_list.currentRow()
@@ -332,34 +1285,14 @@ class SeismicPlotter(QMainWindow):
             return
 
         group_key = current_item.text()
-        st = self.traces[group_key]
+        st = self.get_source_stream(group_key)
 
         try:
-            filtered_st = st.copy()
-            filter_type = self.filter_params["type"]
-
-            if filter_type == "bandpass":
-                filtered_st.filter(
-                    "bandpass",
-                    freqmin=self.filter_params["min_freq"],
-                    freqmax=self.filter_params["max_freq"],
-                )
-            elif filter_type == "highpass":
-                filtered_st.filter(
-                    "highpass",
-                    freq=self.filter_params["min_freq"],
-                )
-            elif filter_type == "lowpass":
-                filtered_st.filter(
-                    "lowpass",
-                    freq=self.filter_params["max_freq"],
-                )
-
-            # Apply offset
-            for tr in filtered_st:
-                start_time = tr.stats.starttime + self.filter_params["offset"]
-                tr.trim(starttime=start_time)
-
+            # Only the stages after the last unchanged one are recomputed
+            filtered_st = process_stream(st, self.filter_params, self.stage_cache, group_key)
+            if self.display_rate:
+                # The working copy stays float32 after filtering too
+                as_float32(filtered_st)
             self.filtered_traces[group_key] = filtered_st
 
         except Exception as e:
@@ -371,9 +1304,30 @@ class SeismicPlotter(QMainWindow):
         self.sta = trigger_params["sta"]
         self.lta = trigger_params["lta"]
         self.threshold = trigger_params["threshold"]
+        self.trigger_source = trigger_params.get("source", "Z")
         self.trigger = True
         self.reload_plot()
 
+    def open_stack_window(self):
+        if self.stack_window is None:
+            self.stack_window = StackWindow(self)
+        self.stack_window.show()
+        self.stack_window.raise_()
+
+    def open_stats_window(self):
+        if self.stats_window is None:
+            self.stats_window = StatsWindow(self)
+        self.stats_window.refresh()
+        self.stats_window.show()
+        self.stats_window.raise_()
+
+    def update_progress(self):
+        """Shows the maintained counts; no rows of data_df are scanned."""
+        total, picked, tagged, discarded, remaining = self.group_tree_model.counts.overall
+        self.progress_label.setText(f"Progress: {picked}/{total} picked, {discarded} discarded, {remaining} remaining")
+        if self.stats_window is not None and self.stats_window.isVisible():
+            self.stats_window.refresh()
+
     def open_trigger_config(self):
         self.trigger_config_window = TriggerConfigWindow(self)
         self.trigger_config_window.show()
@@ -384,9 +1338,27 @@ class SeismicPlotter(QMainWindow):
         st = (
             self.filtered_traces.get(group_key)
             if self.filter
-            else self.traces.get(group_key)
+            else self.get_source_stream(group_key)
         )
         tr = st.select(channel="*Z")[0]
+
+        if self.trigger_source in ("norm", "polarization"):
+            try:
+                data, sampling_rate, _, t0 = self.get_component_stack(group_key)
+            except ValueError as e:
+                print(f"Falling back to Z trigger for {group_key}: {e}")
+            else:
+                if self.trigger_source == "norm":
+                    cf = vector_norm(data)
+                else:
+                    cf = polarization_trace(data, sampling_rate)
+                triggers, first_trigger_time = calculate_array_triggers(
+                    cf, sampling_rate, self.sta, self.lta, self.threshold
+                )
+                self.triggers[group_key] = [t0 + t_arr/sampling_rate for t_arr in triggers]
+                if first_trigger_time is not None:
+                    self.first_trigger = t0 + first_trigger_time
+                return
         
         triggers, first_trigger_time = calculate_triggers(
             tr, 
@@ -422,6 +1394,10 @@ class SeismicPlotter(QMainWindow):
     def clear_plot(self):
         self.plot_item.clear()
         self.spectrogram_item.clear()
+        for item in self.component_plot_items.values():
+            item.clear()
+        for item in self.component_spectrogram_items.values():
+            item.clear()
 
     def navigate_traces(self, direction):
         current_index = self.trace_list.currentRow()
@@ -472,18 +1448,142 @@ class SeismicPlotter(QMainWindow):
                 self, "No Selection", "Please select a trace to toggle review status."
             )
 
+    def selected_group_keys(self):
+        """Group keys selected in the list, or the current one if none is."""
+        keys = [item.text() for item in self.trace_list.selectedItems()]
+        current_item = self.trace_list.currentItem()
+        if not keys and current_item:
+            keys = [current_item.text()]
+        return keys
+
+    def event_group_keys(self, without_picks=False):
+        """All groups of the current group's event, optionally only those without a pick."""
+        current_item = self.trace_list.currentItem()
+        if not current_item:
+            return []
+        event, _ = split_group_key(current_item.text())
+        keys = pd.Index(self.group_tree_model.event_groups.get(event, []))
+        if without_picks:
+            keys = keys[self.data_df["p_wave_frame"].reindex(keys).isna().to_numpy()]
+        return list(keys)
+
+    def bulk_set_flag(self, group_keys, column, value, description):
+        """
+        Sets needs_review or deleted on many groups as one DataFrame update and
+        one CSV write, then updates the list in place; the counts follow through
+        the CSVHandler listener.
+        """
+        if not group_keys:
+            QMessageBox.warning(self, "No Traces", f"No traces to be {description}.")
+            return
+        updated = self.csv_handler.set_flag(group_keys, column, value)
+        self.update_trace_list(updated)
+        QMessageBox.information(
+            self, "Bulk Update", f"{len(updated)} of {len(group_keys)} traces {description}."
+        )
+
+    def on_pick_table_changed(self, group_keys, action):
+        """
+        Listener of the CSVHandler: every change to picks, flags or rows
+        updates the tree counts, the progress line and the throughput here.
+        """
+        self.data_df = self.csv_handler.data_df
+        counts = self.group_tree_model.counts
+        new_groups = [key for key in group_keys if key in self.file_groups and key not in counts.flags]
+        if new_groups:
+            self.group_tree_model.add_groups(new_groups, self.data_df)
+        self.group_tree_model.update_groups([key for key in group_keys if key in counts.flags], self.data_df)
+        if action is not None:
+            self.progress_stats.record(action, len(group_keys))
+        self.update_progress()
+
+    def update_trace_list(self, group_keys):
+        """
+        Drops the changed groups that the list filters now hide, without
+        rebuilding the list. Rebuilds it only if some of them became visible.
+        """
+        if not group_keys:
+            return
+        visible = set(self.get_visible_group_keys(group_keys))
+        listed = {}
+        for row in range(self.trace_list.count()):
+            listed[self.trace_list.item(row).text()] = row
+        if any(key not in listed for key in visible):
+            current_item = self.trace_list.currentItem()
+            self.refresh_trace_list(current_item.text() if current_item else None)
+            return
+        hidden = sorted((listed[key] for key in group_keys if key in listed and key not in visible), reverse=True)
+        if not hidden:
+            return
+        current_row = self.trace_list.currentRow()
+        current_hidden = current_row in hidden
+        for row in hidden:
+            self.trace_list.takeItem(row)
+        if current_hidden:
+            # Continue with the first remaining group after the old position
+            self.clear_p_marker()
+            next_row = current_row - sum(1 for row in hidden if row < current_row)
+            if next_row < self.trace_list.count():
+                item = self.trace_list.item(next_row)
+                self.trace_list.setCurrentItem(item)
+                self.plot_selected_trace(item)
+            else:
+                self.clear_plot()
+        self.update_traces_label()
+
+    def tag_selected(self):
+        self.bulk_set_flag(self.selected_group_keys(), "needs_review", True, "tagged for review")
+
+    def untag_selected(self):
+        self.bulk_set_flag(self.selected_group_keys(), "needs_review", False, "untagged from review")
+
+    def discard_selected(self):
+        self.bulk_set_flag(self.selected_group_keys(), "deleted", True, "discarded")
+
+    def restore_selected(self):
+        self.bulk_set_flag(self.selected_group_keys(), "deleted", False, "restored")
+
+    def discard_event(self):
+        self.bulk_set_flag(self.event_group_keys(), "deleted", True, "discarded")
+
+    def tag_event_unpicked(self):
+        self.bulk_set_flag(self.event_group_keys(without_picks=True), "needs_review", True, "tagged for review")
+
+    def search_groups(self, text):
+        events = self.group_tree_model.set_search(text)
+        # Few matching events: show their stations right away
+        if text.strip() and events <= 20:
+            self.group_tree.expandAll()
+
+    def select_group_from_tree(self, index):
+        group_key = self.group_tree_model.group_key(index)
+        if group_key is not None:
+            self.jump_to_group(group_key)
+
+    def jump_to_group(self, group_key):
+        """Selects and plots a group, unless the list filters hide it. The tree follows when it shows the group."""
+        items = self.trace_list.findItems(group_key, Qt.MatchExactly)
+        if not items:
+            QMessageBox.information(self, "Hidden", f"{group_key} is hidden by the list filters.")
+            return
+        self.trace_list.setCurrentItem(items[0])
+        self.plot_selected_trace(items[0])
+        index = self.group_tree_model.index_of(group_key)
+        if index.isValid():
+            self.group_tree.setCurrentIndex(index)
+            self.group_tree.scrollTo(index)
+
     def apply_filters(self):
-        self.clear_p_marker()
         # Store the currently selected item
         current_item = self.trace_list.currentItem()
         current_group_key = current_item.text() if current_item else None
-        
+        self.refresh_trace_list(current_group_key)
+
+    def refresh_trace_list(self, current_group_key=None):
+        """Rebuilds the list and selects current_group_key, or the first item if it is hidden."""
+        self.clear_p_marker()
         self.trace_list.clear()
-        total_traces = len(self.file_groups)
-        for group_key in self.file_groups.keys():
-            show_item = self.get_show_item_by_filter(self.filter_tagged.checkState(), self.filter_with_p.checkState(), self.filter_discarded.checkState(), group_key) 
-            if show_item:
-                self.trace_list.addItem(QListWidgetItem(group_key))
+        self.trace_list.addItems(self.get_visible_group_keys(self.get_sorted_group_keys()))
 
         # Try to select the previously selected item, or select the first item if not found
         if self.trace_list.count() > 0:
@@ -504,32 +1604,37 @@ class SeismicPlotter(QMainWindow):
             self.clear_plot()
                 
         # Update the traces label with the count
-        visible_traces = self.trace_list.count()
-        self.traces_label.setText(f"Loaded Traces: {visible_traces}/{total_traces}")
-
-    def get_show_item_by_filter(self, review_tagged, p_marked, deleted, group_key):
-        show_item = True
-            
-        tagged_state = review_tagged 
-        p_wave_state = p_marked 
-        deleted_state = deleted
-        
-        if tagged_state == Qt.Checked:
-            show_item = show_item and self.data_df.loc[group_key, "needs_review"]
-        elif tagged_state == Qt.PartiallyChecked:
-            show_item = show_item and not self.data_df.loc[group_key, "needs_review"]
-        
-        if p_wave_state == Qt.Checked:
-            show_item = show_item and pd.notnull(self.data_df.loc[group_key, "p_wave_frame"])
-        elif p_wave_state == Qt.PartiallyChecked:
-            show_item = show_item and pd.isnull(self.data_df.loc[group_key, "p_wave_frame"])
+        self.update_traces_label()
+
+    def get_visible_group_keys(self, group_keys):
+        """Applies the list filters to many groups at once, keeping their order."""
+        if len(group_keys) == 0:
+            return []
+        df = self.data_df.reindex(pd.Index(group_keys))
+        show = pd.Series(True, index=df.index)
+
+        tagged = df["needs_review"].eq(True)
+        picked = df["p_wave_frame"].notna()
+        deleted = df["deleted"].eq(True)
+        for state, column in (
+            (self.filter_tagged.checkState(), tagged),
+            (self.filter_with_p.checkState(), picked),
+            (self.filter_discarded.checkState(), deleted),
+        ):
+            if state == Qt.Checked:
+                show &= column
+            elif state == Qt.PartiallyChecked:
+                show &= ~column
 
-        if deleted_state == Qt.Checked:
-            show_item = show_item and self.data_df.loc[group_key, "deleted"]
-        elif deleted_state == Qt.PartiallyChecked:
-            show_item = show_item and not self.data_df.loc[group_key, "deleted"]
+        # Groups without quality metrics yet are always shown
+        min_snr = self.min_snr_input.value()
+        if min_snr > 0:
+            snr = pd.to_numeric(self.quality_index.df["snr"].reindex(df.index), errors="coerce")
+            show &= ~(snr < min_snr)
+        if self.filter_bad_data.isChecked():
+            show &= ~self.quality_index.bad_mask(df.index)
 
-        return show_item
+        return list(df.index[show.to_numpy()])
 
     def reset_view(self):
         self.spectrogram_widget.getViewBox().autoRange()
@@ -584,6 +1689,13 @@ class SeismicPlotter(QMainWindow):
 
     def apply_zoom(self, start, end):
         left, right = min(start, end), max(start, end)
+        current_item = self.trace_list.currentItem()
+        if current_item and current_item.text() in self.windowed_groups:
+            tr = self.get_display_trace()
+            loaded_end = tr.stats.endtime - tr.stats.starttime
+            # Very wide spans stay on the overview instead of loading hours at full rate
+            if (left < 0 or right > loaded_end) and right - left <= MAX_WINDOW:
+                left, right = self.load_window_around(left, right)
         self.spectrogram_item.setXRange(left, right, padding=0)
         self.plot_item.setXRange(left, right, padding=0)
 
@@ -0,0 +1,148 @@
+import numpy as np
+
+from src.sac_reader import read_sac_header
+
+KM_PER_DEGREE = 111.19
+DEFAULT_VELOCITY = 6.0  # km/s, used when there are too few picks to fit it
+MIN_VELOCITY = 2.0
+MAX_VELOCITY = 10.0
+TRIAL_DEPTH = 10.0  # km, depth of the trial hypocentre
+MIN_PICKS = 3  # picked stations needed for a trial hypocentre
+FIT_VELOCITY_PICKS = 5  # picked stations needed to also fit the velocity
+GRID_SIZE = 41  # nodes per side of each grid search pass
+GRID_PASSES = 3  # each pass zooms in around the best node of the previous one
+GRID_MARGIN = 100.0  # km searched beyond the station extent
+MIN_SEARCH_WINDOW = 1.0  # seconds on each side of a predicted pick
+RESIDUAL_FACTOR = 3.0  # search window in multiples of the fit RMS residual
+
+
+def station_coordinates(files):
+    """
+    (latitude, longitude, elevation in m) of a group from the header of its
+    Z file (or its first file), or None if the header has no coordinates.
+    """
+    headers = [read_sac_header(f) for f in files]
+    z_headers = [h for h in headers if (h.kcmpnm or "").endswith("Z")]
+    header = z_headers[0] if z_headers else headers[0]
+    if header.stla is None or header.stlo is None:
+        return None
+    return float(header.stla), float(header.stlo), float(header.stel or 0.0)
+
+
+def station_index(file_groups, is_cancelled=None):
+    """
+    group_key -> station_coordinates of every group, None for groups whose
+    headers have no coordinates or cannot be read. Returns None if cancelled.
+    """
+    coords = {}
+    for group_key, files in file_groups.items():
+        if is_cancelled is not None and is_cancelled():
+            return None
+        try:
+            coords[group_key] = station_coordinates(files)
+        except Exception as e:
+            print(f"No station coordinates for {group_key}: {e}")
+            coords[group_key] = None
+    return coords
+
+
+def project_stations(coords):
+    """
+    Projects (n, 3) lat/lon/elevation rows onto a local flat grid centred on
+    the stations. Returns (n, 2) x/y in km and (n,) elevations in km.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    lat0 = coords[:, 0].mean()
+    lon0 = coords[:, 1].mean()
+    x = (coords[:, 1] - lon0) * KM_PER_DEGREE * np.cos(np.radians(lat0))
+    y = (coords[:, 0] - lat0) * KM_PER_DEGREE
+    return np.column_stack([x, y]), coords[:, 2] / 1000.0
+
+
+def hypocentral_distances(nodes, xy, elevation, depth=TRIAL_DEPTH):
+    """(nodes, stations) distances in km from trial epicentres at `depth` to the stations."""
+    dx = nodes[:, None, 0] - xy[None, :, 0]
+    dy = nodes[:, None, 1] - xy[None, :, 1]
+    dz = depth + elevation[None, :]
+    return np.sqrt(dx * dx + dy * dy + dz * dz)
+
+
+def fit_moveout(distances, times, fit_velocity):
+    """
+    Least-squares fit of t = origin + slowness * distance for every row of a
+    (nodes, picks) distance matrix at once.
+
+    Returns (origin, slowness, rms) arrays with one value per node.
+    """
+    if fit_velocity:
+        d_mean = distances.mean(axis=1, keepdims=True)
+        t_mean = times.mean()
+        d_centered = distances - d_mean
+        denom = np.sum(d_centered ** 2, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slowness = np.where(denom > 0, d_centered @ (times - t_mean) / denom, 1 / DEFAULT_VELOCITY)
+        slowness = np.clip(slowness, 1 / MAX_VELOCITY, 1 / MIN_VELOCITY)
+    else:
+        slowness = np.full(len(distances), 1 / DEFAULT_VELOCITY)
+    origin = np.mean(times[None, :] - slowness[:, None] * distances, axis=1)
+    residuals = times[None, :] - origin[:, None] - slowness[:, None] * distances
+    rms = np.sqrt(np.mean(residuals ** 2, axis=1))
+    return origin, slowness, rms
+
+
+def locate(xy, elevation, times):
+    """
+    Grid searches the trial epicentre that best explains the pick times,
+    zooming in around the best node a few times.
+
+    Returns (epicentre, origin, slowness, rms).
+    """
+    fit_velocity = len(times) >= FIT_VELOCITY_PICKS
+    center = xy.mean(axis=0)
+    half_width = np.ptp(xy, axis=0).max() / 2 + GRID_MARGIN
+    for _ in range(GRID_PASSES):
+        axis = np.linspace(-half_width, half_width, GRID_SIZE)
+        gx, gy = np.meshgrid(center[0] + axis, center[1] + axis)
+        nodes = np.column_stack([gx.ravel(), gy.ravel()])
+        origin, slowness, rms = fit_moveout(
+            hypocentral_distances(nodes, xy, elevation), times, fit_velocity
+        )
+        best = int(np.argmin(rms))
+        center = nodes[best]
+        half_width = 2 * half_width / (GRID_SIZE - 1)
+    return center, origin[best], slowness[best], rms[best]
+
+
+def predict_picks(coords, times):
+    """
+    Predicts P times at every station of an event from the picked ones.
+
+    coords: (n, 3) latitude/longitude/elevation of all stations
+    times: (n,) pick times in seconds (any common reference), NaN if unpicked
+
+    Returns (predicted, half_window): predicted times for all stations, or
+    None if fewer than MIN_PICKS stations are picked, and the half width of the
+    search window to use around them.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    picked = np.isfinite(times)
+    if np.count_nonzero(picked) < MIN_PICKS:
+        return None, None
+    xy, elevation = project_stations(coords)
+    epicentre, origin, slowness, rms = locate(xy[picked], elevation[picked], times[picked])
+    distances = hypocentral_distances(epicentre[None, :], xy, elevation)[0]
+    predicted = origin + slowness * distances
+    return predicted, max(MIN_SEARCH_WINDOW, RESIDUAL_FACTOR * rms)
+
+
+def closest_trigger(triggers, predicted, half_window):
+    """
+    Onset (s) of the trigger closest to a predicted time, restricted to
+    [predicted - half_window, predicted + half_window]; None if there is none.
+    """
+    onsets = np.array([on_off[0] for on_off in triggers], dtype=np.float64)
+    if len(onsets) == 0:
+        return None
+    distance = np.abs(onsets - predicted)
+    best = int(np.argmin(distance))
+    return float(onsets[best]) if distance[best] <= half_window else None
@@ -0,0 +1,96 @@
+import numpy as np
+
+DEFAULT_HALF_WINDOW = 2.0  # seconds searched on each side of the coarse pick
+KURTOSIS_WINDOW = 0.5  # seconds for the sliding kurtosis characteristic function
+
+
+def aic_cf(x):
+    """
+    Maeda (1985) AIC characteristic function computed directly from the
+    samples, vectorised with cumulative sums:
+
+        AIC(k) = k log(var(x[:k])) + (N - k - 1) log(var(x[k:]))
+
+    The onset is the global minimum. Split points leaving fewer than two
+    samples on either side have no variance and are left as inf.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    x = x - x.mean()
+    n = len(x)
+    aic = np.full(n, np.inf)
+    if n < 5:
+        return aic
+    csum = np.cumsum(x)
+    csum2 = np.cumsum(x * x)
+    k = np.arange(2, n - 2)
+    head_mean = csum[k - 1] / k
+    head_var = csum2[k - 1] / k - head_mean ** 2
+    tail_n = n - k
+    tail_mean = (csum[-1] - csum[k - 1]) / tail_n
+    tail_var = (csum2[-1] - csum2[k - 1]) / tail_n - tail_mean ** 2
+    eps = np.finfo(np.float64).tiny
+    aic[2:-2] = k * np.log(np.maximum(head_var, eps)) + (tail_n - 1) * np.log(np.maximum(tail_var, eps))
+    return aic
+
+
+def kurtosis_cf(x, window):
+    """
+    Sliding-window kurtosis of the samples ending at each index, computed with
+    cumulative sums of the first four powers. The first `window` samples are 0.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    cf = np.zeros(n)
+    if window < 4 or n <= window:
+        return cf
+    x = x - x.mean()
+    sums = [np.concatenate(([0.0], np.cumsum(x ** p))) for p in (1, 2, 3, 4)]
+    s1, s2, s3, s4 = [(s[window:] - s[:-window]) / window for s in sums]
+    m2 = s2 - s1 ** 2
+    m4 = s4 - 4 * s1 * s3 + 6 * s1 ** 2 * s2 - 3 * s1 ** 4
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kurt = np.where(m2 > 0, m4 / m2 ** 2, 0.0)
+    cf[window - 1:] = kurt
+    return cf
+
+
+def parabolic_offset(y_prev, y_mid, y_next):
+    """Sub-sample offset of the vertex of the parabola through three points, in [-0.5, 0.5]."""
+    denom = y_prev - 2 * y_mid + y_next
+    if not np.isfinite(denom) or denom == 0:
+        return 0.0
+    return float(np.clip(0.5 * (y_prev - y_next) / denom, -0.5, 0.5))
+
+
+def refine_onset(data, sampling_rate, time, half_window=DEFAULT_HALF_WINDOW, method="aic"):
+    """
+    Refines a coarse onset time (seconds from the first sample) to the best
+    onset inside [time - half_window, time + half_window].
+
+    method "aic" takes the AIC minimum, "kurtosis" the steepest rise of the
+    sliding kurtosis. Both are interpolated to sub-sample precision.
+
+    Returns the refined time in seconds, or None if the window is too short.
+    """
+    n = len(data)
+    start = max(int(round((time - half_window) * sampling_rate)), 0)
+    end = min(int(round((time + half_window) * sampling_rate)) + 1, n)
+    if end - start < 8:
+        return None
+    segment = data[start:end]
+
+    if method == "aic":
+        cf = aic_cf(segment)
+        idx = int(np.argmin(cf))
+        # AIC is minimised, the parabola vertex formula works on either extremum
+        offset = parabolic_offset(cf[idx - 1], cf[idx], cf[idx + 1]) if 2 < idx < len(cf) - 3 else 0.0
+    elif method == "kurtosis":
+        window = max(int(KURTOSIS_WINDOW * sampling_rate), 4)
+        rise = np.gradient(kurtosis_cf(segment, window))
+        rise[:window] = -np.inf
+        idx = int(np.argmax(rise))
+        offset = parabolic_offset(rise[idx - 1], rise[idx], rise[idx + 1]) if window < idx < len(rise) - 1 else 0.0
+    else:
+        raise ValueError(f"Unknown refinement method: {method}")
+
+    return (start + idx + offset) / sampling_rate
@@ -0,0 +1,415 @@
+import importlib
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from fractions import Fraction
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from obspy.signal.trigger import classic_sta_lta
+from PyQt5.QtCore import QObject, pyqtSignal
+from scipy.signal import resample_poly
+
+from src.three_component import stack_components
+from src.utils import read_trace_files
+
+DEFAULT_PICKER = "src.picker_backend:StaLtaPicker"
+PICKER_WINDOW = 3001  # samples per window when the picker does not say
+PICKER_SAMPLING_RATE = 100.0
+DEFAULT_PROBABILITY = 0.5  # minimum onset probability for a pick
+MAX_BATCH = 64  # windows per batch
+MAX_PICKS = 3  # per group, most probable first
+ML_PICKS_FILE = "ml_picks.csv"
+
+# Picker loaded once per worker process by _init_worker, or why it could not be
+_worker_picker = None
+_worker_error = None
+_worker_buffers = {}  # shared memory name -> SharedMemory attached in this worker
+
+
+class StaLtaPicker:
+    """
+    Reference picker without a model: the classic STA/LTA ratio of the Z
+    channel, mapped to [0, 1) so that the usual trigger threshold of 3 gives
+    0.5. It shows what a picker provides: `window` and `sampling_rate`
+    attributes and a call mapping a (n, 3, window) float32 batch of Z/N/E
+    windows to (n, window) P onset probabilities.
+    """
+
+    window = PICKER_WINDOW
+    sampling_rate = PICKER_SAMPLING_RATE
+
+    def __init__(self, sta=1.0, lta=10.0, threshold=3.0):
+        self.nsta = int(sta * self.sampling_rate)
+        self.nlta = int(lta * self.sampling_rate)
+        self.threshold = threshold
+
+    def __call__(self, batch):
+        ratio = np.array([classic_sta_lta(window[0].astype(np.float64), self.nsta, self.nlta) for window in batch])
+        return (ratio / (ratio + self.threshold)).astype(np.float32)
+
+
+class OnnxPicker:
+    """
+    ONNX model run on CPU with ONNX Runtime, one thread per worker process.
+    Takes (n, 3, window) float32 input; the P probability is channel `phase`
+    of a (n, phases, window) or (n, window, phases) output, or the output itself
+    if it is (n, window).
+    """
+
+    sampling_rate = PICKER_SAMPLING_RATE
+
+    def __init__(self, path, phase=1):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("ONNX pickers need onnxruntime (pip install onnxruntime)")
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        window = model_input.shape[-1]
+        self.window = window if isinstance(window, int) else PICKER_WINDOW
+        self.phase = phase
+
+    def __call__(self, batch):
+        output = self.session.run(None, {self.input_name: batch})[0]
+        if output.ndim == 3:
+            output = output[:, self.phase, :] if output.shape[-1] == self.window else output[:, :, self.phase]
+        return output
+
+
+def load_picker(spec):
+    """
+    Picker from a spec: a path to an .onnx model, or "module:name" of a
+    callable. A class named that way is instantiated without arguments.
+    """
+    if spec.endswith(".onnx"):
+        return OnnxPicker(spec)
+    module, _, name = spec.partition(":")
+    picker = getattr(importlib.import_module(module), name)
+    return picker() if isinstance(picker, type) else picker
+
+
+def picker_shape(picker):
+    return int(getattr(picker, "window", PICKER_WINDOW)), float(getattr(picker, "sampling_rate", PICKER_SAMPLING_RATE))
+
+
+def _init_worker(spec):
+    # An initializer exception would only break the pool, keep it for describe_picker
+    global _worker_picker, _worker_error
+    try:
+        _worker_picker = load_picker(spec)
+    except Exception as e:
+        _worker_error = f"Cannot load picker {spec}: {e}"
+
+
+def describe_picker():
+    """Process pool entry point: (window, sampling_rate) of the worker's picker."""
+    if _worker_error:
+        raise RuntimeError(_worker_error)
+    return picker_shape(_worker_picker)
+
+
+def _attach(name, shape):
+    if name not in _worker_buffers:
+        _worker_buffers[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=np.float32, buffer=_worker_buffers[name].buf)
+
+
+def run_batch(inputs_name, outputs_name, slots, max_batch, window, slot, count):
+    """
+    Process pool entry point: runs the picker on the first `count` windows of
+    a shared memory slot and writes the probabilities to the same slot of the
+    output buffer. Only names and numbers are pickled, never the samples.
+    """
+    inputs = _attach(inputs_name, (slots, max_batch, 3, window))
+    outputs = _attach(outputs_name, (slots, max_batch, window))
+    outputs[slot, :count] = _worker_picker(inputs[slot, :count])
+    return slot, count
+
+
+class PickerPool:
+    """
+    Worker processes that each load the picker once and then run it on
+    batches of windows for as long as the pool lives.
+
+    Windows travel through shared memory: the pool owns `2 * workers` slots
+    of `max_batch` windows, a batch is copied into a free slot and only the
+    slot number goes through the executor. Several callers (the selected
+    trace and a dataset-wide run) can share the pool.
+    """
+
+    def __init__(self, spec=DEFAULT_PICKER, workers=None, max_batch=MAX_BATCH):
+        self.spec = spec
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.max_batch = max_batch
+        self.slots = 2 * self.workers
+        # Spawned workers start on the first submit, so this does not block
+        self.executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(spec,),
+        )
+        self.window = None
+        self.sampling_rate = None
+        self.lock = threading.Lock()
+        self.free = queue.Queue()
+        self.buffers = []
+
+    def start(self):
+        """Waits for the picker to load in a worker and allocates the shared buffers."""
+        with self.lock:
+            if self.window is not None:
+                return
+            window, sampling_rate = self.executor.submit(describe_picker).result()
+            inputs = shared_memory.SharedMemory(create=True, size=self.slots * self.max_batch * 3 * window * 4)
+            outputs = shared_memory.SharedMemory(create=True, size=self.slots * self.max_batch * window * 4)
+            self.buffers = [inputs, outputs]
+            self.inputs = np.ndarray((self.slots, self.max_batch, 3, window), dtype=np.float32, buffer=inputs.buf)
+            self.outputs = np.ndarray((self.slots, self.max_batch, window), dtype=np.float32, buffer=outputs.buf)
+            for slot in range(self.slots):
+                self.free.put(slot)
+            self.window, self.sampling_rate = window, sampling_rate
+
+    def _submit(self, slot, count):
+        inputs, outputs = self.buffers
+        return self.executor.submit(
+            run_batch, inputs.name, outputs.name, self.slots, self.max_batch, self.window, slot, count
+        )
+
+    def predict(self, items, is_cancelled=None):
+        """
+        Runs the picker on items of (tag, windows), windows being a (k, 3,
+        window) float32 array, and yields (tag, probabilities) with a (k, window)
+        array once all windows of an item are done.
+
+        Batching is dynamic: windows of successive items accumulate in a slot
+        while every worker is busy, and the slot goes out when it is full or as
+        soon as a worker is idle. A lone trace is sent at once; a dataset-wide
+        run settles on full batches.
+        """
+        self.start()
+        items = iter(items)
+        pending = {}  # future -> [(tag, first window of the item in the slot, windows in the slot, item offset)]
+        results = {}  # tag -> [probabilities, windows still missing]
+        slot, count, contents = None, 0, []
+        exhausted = False
+        try:
+            while not exhausted or count or pending:
+                if is_cancelled and is_cancelled():
+                    return
+                if not exhausted:
+                    try:
+                        tag, windows = next(items)
+                    except StopIteration:
+                        exhausted = True
+                    else:
+                        results[tag] = [np.zeros((len(windows), self.window), dtype=np.float32), len(windows)]
+                        done = 0
+                        while done < len(windows):
+                            if slot is None:
+                                slot = self._take_slot(pending, results)
+                                yield from self._drain(pending, results, block=False)
+                            take = min(self.max_batch - count, len(windows) - done)
+                            self.inputs[slot, count:count + take] = windows[done:done + take]
+                            contents.append((tag, count, take, done))
+                            count += take
+                            done += take
+                            if count == self.max_batch:
+                                pending[self._submit(slot, count)] = contents
+                                slot, count, contents = None, 0, []
+                        if len(windows) == 0:
+                            yield tag, results.pop(tag)[0]
+                idle = len(pending) < self.workers
+                if count and (idle or exhausted):
+                    pending[self._submit(slot, count)] = contents
+                    slot, count, contents = None, 0, []
+                if pending:
+                    # Keep reading while the workers are busy, wait only at the end
+                    yield from self._drain(pending, results, block=exhausted)
+        finally:
+            # Slots still in flight go back to the pool once their batch is done
+            for future in pending:
+                future.add_done_callback(lambda f: self.free.put(f.result()[0]) if not f.exception() else None)
+            if slot is not None:
+                self.free.put(slot)
+
+    def _take_slot(self, pending, results):
+        while True:
+            try:
+                return self.free.get(timeout=0.05)
+            except queue.Empty:
+                if pending:
+                    wait(list(pending), timeout=0.05, return_when=FIRST_COMPLETED)
+                    for future in [f for f in pending if f.done()]:
+                        # Keep the results, _drain yields them once the slot is free
+                        self._collect(future, pending.pop(future), results)
+
+    def _collect(self, future, contents, results):
+        slot, count = future.result()
+        for tag, start, take, offset in contents:
+            entry = results[tag]
+            entry[0][offset:offset + take] = self.outputs[slot, start:start + take]
+            entry[1] -= take
+        self.free.put(slot)
+
+    def _drain(self, pending, results, block):
+        if block:
+            wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in [f for f in pending if f.done()]:
+            self._collect(future, pending.pop(future), results)
+        for tag in [tag for tag, (_, missing) in results.items() if missing == 0]:
+            yield tag, results.pop(tag)[0]
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for buffer in self.buffers:
+            buffer.close()
+            buffer.unlink()
+        self.buffers = []
+
+
+def picker_input(files, sampling_rate):
+    """
+    Z/N/E of a group as a (3, npts) float32 array at the picker's sampling
+    rate, with missing horizontals left as zeros. Returns (data, starttime)
+    where starttime is the UTC time of the first sample.
+    """
+    st = read_trace_files(files)
+    try:
+        data, fs, _, t0 = stack_components(st)
+    except ValueError:
+        z = st.select(channel="*Z")
+        tr = z[0] if len(z) else st[0]
+        data = np.zeros((3, tr.stats.npts))
+        data[0] = tr.data
+        fs, t0 = tr.stats.sampling_rate, 0.0
+        starttime = tr.stats.starttime
+    else:
+        z = st.select(channel="*Z")
+        starttime = (z[0] if len(z) else st[0]).stats.starttime + t0
+    if fs != sampling_rate:
+        ratio = Fraction(sampling_rate / fs).limit_denominator(1000)
+        data = resample_poly(data, ratio.numerator, ratio.denominator, axis=1)
+    return data.astype(np.float32), starttime
+
+
+def make_windows(data, window):
+    """
+    Cuts (3, npts) data into windows overlapping by half, the last one ending
+    at the last sample, each demeaned and scaled by its peak amplitude.
+    Returns (windows, starts).
+    """
+    npts = data.shape[1]
+    if npts < window:
+        data = np.pad(data, ((0, 0), (0, window - npts)))
+        npts = window
+    step = max(1, window // 2)
+    starts = list(range(0, npts - window + 1, step))
+    if starts[-1] != npts - window:
+        starts.append(npts - window)
+    windows = np.stack([data[:, start:start + window] for start in starts])
+    windows -= windows.mean(axis=2, keepdims=True)
+    peaks = np.abs(windows).max(axis=(1, 2), keepdims=True)
+    windows /= np.where(peaks > 0, peaks, 1)
+    return windows, np.array(starts)
+
+
+def merge_windows(probabilities, starts, npts):
+    """Probability per sample of the whole record, the highest of the windows covering it."""
+    merged = np.zeros(max(npts, starts[-1] + probabilities.shape[1]), dtype=np.float32)
+    for start, values in zip(starts, probabilities):
+        np.maximum(merged[start:start + len(values)], values, out=merged[start:start + len(values)])
+    return merged[:npts]
+
+
+def extract_picks(probabilities, threshold=DEFAULT_PROBABILITY, limit=MAX_PICKS):
+    """Sample index and probability of the peak of each run above threshold, most probable first."""
+    above = np.concatenate(([False], probabilities >= threshold, [False]))
+    edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+    peaks = [start + int(np.argmax(probabilities[start:end])) for start, end in zip(edges[::2], edges[1::2])]
+    peaks.sort(key=lambda index: -probabilities[index])
+    return [(index, float(probabilities[index])) for index in peaks[:limit]]
+
+
+def save_ml_picks(folder, picks):
+    """Writes group_key -> [(pick UTC string, probability)] to ml_picks.csv, merged with the file."""
+    path = os.path.join(folder, ML_PICKS_FILE)
+    merged = load_ml_picks(folder)
+    merged.update(picks)
+    rows = [(key, pick, probability) for key, group_picks in merged.items() for pick, probability in group_picks]
+    pd.DataFrame(rows, columns=["trace_path", "pick_time", "probability"]).to_csv(path, index=False)
+
+
+def load_ml_picks(folder):
+    path = os.path.join(folder, ML_PICKS_FILE) if folder else None
+    if not path or not os.path.exists(path):
+        return {}
+    picks = {}
+    for row in pd.read_csv(path).itertuples(index=False):
+        picks.setdefault(row.trace_path, []).append((row.pick_time, float(row.probability)))
+    return picks
+
+
+class PickerJob(QObject):
+    """
+    Runs the picker pool over some groups. Reading and windowing happen in
+    this object's thread, the model in the pool's processes. Meant to be
+    moved to a QThread.
+    """
+
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, pool, file_groups, group_keys, threshold=DEFAULT_PROBABILITY):
+        super().__init__()
+        self.pool = pool
+        self.file_groups = {key: list(file_groups[key]) for key in group_keys}
+        self.group_keys = list(group_keys)
+        self.threshold = threshold
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def items(self, records):
+        for group_key in self.group_keys:
+            if self.cancelled:
+                return
+            try:
+                data, starttime = picker_input(self.file_groups[group_key], self.pool.sampling_rate)
+            except Exception as e:
+                print(f"Picker could not read {group_key}: {e}")
+                continue
+            windows, starts = make_windows(data, self.pool.window)
+            records[group_key] = (starttime, starts, data.shape[1])
+            yield group_key, windows
+
+    def run(self):
+        try:
+            self.pool.start()
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        records = {}
+        results = {}
+        try:
+            for done, (group_key, probabilities) in enumerate(
+                self.pool.predict(self.items(records), lambda: self.cancelled), start=1
+            ):
+                starttime, starts, npts = records.pop(group_key)
+                merged = merge_windows(probabilities, starts, npts)
+                results[group_key] = [
+                    (str(starttime + index / self.pool.sampling_rate), probability)
+                    for index, probability in extract_picks(merged, self.threshold)
+                ]
+                self.progress.emit(done, len(self.group_keys))
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(results)
@@ -1,22 +1,48 @@
-
-from matplotlib import mlab
+from scipy import signal
 import numpy as np
 import pyqtgraph as pg
 
-def plot_spectrogram( tr):
-    Sxx, freqs, times = mlab.specgram(tr.data - tr.data.mean(), Fs=tr.stats.sampling_rate, NFFT=128,pad_to=8*128, noverlap=int(128 * 0.9))
-    Sxx = np.sqrt(Sxx[1:, :])
-    freqs = freqs[1:]
+# Colour ticks of the spectrogram gradient, shared with the headless renderer
+SPECTROGRAM_TICKS = [(0.5, (33, 145, 140, 255)),
+                     (1.0, (250, 230, 0, 255)),
+                     (0.0, (0, 0, 0, 255))]
+NFFT = 128
+
+def compute_spectrograms(data, sampling_rate):
+    """
+    Amplitude spectrograms along the last axis of a 1-D or stacked array, so
+    all components go through a single STFT. Same result as
+    mlab.specgram(NFFT=128, pad_to=1024, noverlap=115). Drops the DC row.
+
+    Returns (Sxx, freqs, times) with Sxx shaped (..., freq, time).
+    """
+    data = np.asarray(data, dtype=np.float64)
+    data = data - data.mean(axis=-1, keepdims=True)
+    freqs, times, Sxx = signal.spectrogram(
+        data, fs=sampling_rate, window=np.hanning(NFFT), nperseg=NFFT,
+        noverlap=int(NFFT * 0.9), nfft=8 * NFFT, detrend=False,
+        scaling="density", mode="psd",
+    )
+    return np.sqrt(Sxx[..., 1:, :]), freqs[1:], times
+
+def compute_spectrogram(tr):
+    """Returns the amplitude spectrogram (freq x time) of a trace, without the DC row."""
+    return compute_spectrograms(tr.data, tr.stats.sampling_rate)
+
+def spectrogram_image(Sxx, freqs, times, t0=0):
+    """Builds the pyqtgraph image of one (freq x time) spectrogram."""
     img = pg.ImageItem()
     hist = pg.HistogramLUTItem()
     hist.setImageItem(img)
     hist.setLevels(np.min(Sxx), np.max(Sxx))
     hist.gradient.restoreState(
             {'mode': 'rgb',
-                'ticks': [(0.5, (33, 145, 140, 255)),
-                        (1.0, (250, 230, 0, 255)),
-                        (0.0, (0, 0, 0, 255))]})
+                'ticks': SPECTROGRAM_TICKS})
                         # (0.0, (69, 4, 87, 255))]})
     img.setImage(Sxx.T)
-    img.setRect(times[0],freqs[0],times[-1]-times[0],freqs[-1]-freqs[0])
+    img.setRect(t0 + times[0],freqs[0],times[-1]-times[0],freqs[-1]-freqs[0])
     return img
+
+def plot_spectrogram( tr):
+    Sxx, freqs, times = compute_spectrogram(tr)
+    return spectrogram_image(Sxx, freqs, times)
@@ -0,0 +1,195 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+from obspy import Stream, Trace
+
+CACHE_GROUPS = 8  # groups whose stage outputs are kept in memory
+
+# Stage type -> (required parameters, defaults). A chain is a list of stages,
+# each a dict with "type" and its parameters, for example
+# [{"type": "demean"}, {"type": "taper", "max_percentage": 0.05},
+#  {"type": "bandpass", "freqmin": 1, "freqmax": 10}]
+STAGE_TYPES = {
+    "demean": ((), {}),
+    "detrend": ((), {"method": "linear"}),
+    "taper": ((), {"max_percentage": 0.05, "taper_type": "hann"}),
+    "resample": (("sampling_rate",), {}),
+    "bandpass": (("freqmin", "freqmax"), {"corners": 4, "zerophase": False}),
+    "highpass": (("freq",), {"corners": 4, "zerophase": False}),
+    "lowpass": (("freq",), {"corners": 4, "zerophase": False}),
+    "multiband": (("bands",), {"corners": 4, "zerophase": False}),
+    "scale": (("factor",), {}),
+}
+# Stages that change the sampling rate, left out where the rate must stay
+RATE_STAGES = ("resample",)
+
+
+def chain_stages(filter_params):
+    """Stages of a filter configuration; the single-filter form is a one-stage chain."""
+    if "stages" in filter_params:
+        return filter_params["stages"]
+    filter_type = filter_params["type"]
+    if filter_type == "bandpass":
+        return [{"type": "bandpass", "freqmin": filter_params["min_freq"], "freqmax": filter_params["max_freq"]}]
+    if filter_type == "highpass":
+        return [{"type": "highpass", "freq": filter_params["min_freq"]}]
+    if filter_type == "lowpass":
+        return [{"type": "lowpass", "freq": filter_params["max_freq"]}]
+    return []
+
+
+def validate_chain(filter_params):
+    """Checks a chain configuration, raising ValueError naming the bad stage. Returns it unchanged."""
+    stages = filter_params.get("stages")
+    if not isinstance(stages, list):
+        raise ValueError("A preprocessing chain needs a list of stages")
+    for number, stage in enumerate(stages, start=1):
+        if not isinstance(stage, dict) or stage.get("type") not in STAGE_TYPES:
+            raise ValueError(f"Stage {number}: unknown type, choose from {', '.join(STAGE_TYPES)}")
+        required, defaults = STAGE_TYPES[stage["type"]]
+        missing = [name for name in required if name not in stage]
+        unknown = sorted(set(stage) - set(required) - set(defaults) - {"type"})
+        if missing:
+            raise ValueError(f"Stage {number} ({stage['type']}): missing {', '.join(missing)}")
+        if unknown:
+            raise ValueError(f"Stage {number} ({stage['type']}): unknown parameters {', '.join(unknown)}")
+        if stage["type"] == "multiband":
+            bands = stage["bands"]
+            if not isinstance(bands, list) or not bands or not all(
+                isinstance(band, list) and len(band) == 2 for band in bands
+            ):
+                raise ValueError(f"Stage {number} (multiband): bands must be [freqmin, freqmax] pairs")
+        for name, value in stage.items():
+            if name in ("type", "method", "taper_type", "zerophase"):
+                continue
+            values = [v for band in value for v in band] if name == "bands" else [value]
+            if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                raise ValueError(f"Stage {number} ({stage['type']}): {name} must be numeric")
+    float(filter_params.get("offset", 0))
+    return filter_params
+
+
+def load_chain(path):
+    """Reads a chain configuration ({"type": "chain", "stages": [...], "offset": s}) from JSON."""
+    with open(path) as f:
+        filter_params = json.load(f)
+    filter_params.setdefault("type", "chain")
+    filter_params.setdefault("offset", 0)
+    return validate_chain(filter_params)
+
+
+def save_chain(path, filter_params):
+    with open(path, "w") as f:
+        json.dump(filter_params, f, indent=2)
+
+
+def stage_keys(stages):
+    """Hash of every stage together with all stages before it, one per stage."""
+    digest = hashlib.sha1()
+    keys = []
+    for stage in stages:
+        digest.update(json.dumps(stage, sort_keys=True).encode())
+        keys.append(digest.hexdigest())
+    return keys
+
+
+def apply_stage(st, stage):
+    """Returns a processed copy of a stream, the input is left untouched."""
+    required, defaults = STAGE_TYPES[stage["type"]]
+    params = {**defaults, **{key: value for key, value in stage.items() if key != "type"}}
+    stage_type = stage["type"]
+    out = st.copy()
+    if stage_type == "demean":
+        out.detrend("demean")
+    elif stage_type == "detrend":
+        out.detrend(params["method"])
+    elif stage_type == "taper":
+        out.taper(max_percentage=params["max_percentage"], type=params["taper_type"])
+    elif stage_type == "resample":
+        out.resample(params["sampling_rate"])
+    elif stage_type == "multiband":
+        # Sum of the band-passed copies, one per band
+        for tr in out:
+            bands = []
+            for freqmin, freqmax in params["bands"]:
+                band = tr.copy()
+                band.filter("bandpass", freqmin=freqmin, freqmax=freqmax,
+                            corners=params["corners"], zerophase=params["zerophase"])
+                bands.append(band.data)
+            tr.data = np.sum(bands, axis=0)
+    elif stage_type == "scale":
+        for tr in out:
+            tr.data = tr.data * params["factor"]
+    else:
+        out.filter(stage_type, **params)
+    return out
+
+
+def run_stages(st, stages, keep_rate=False):
+    for stage in stages:
+        if keep_rate and stage["type"] in RATE_STAGES:
+            continue
+        st = apply_stage(st, stage)
+    return st
+
+
+def run_stack_stages(data, sampling_rate, stages):
+    """Chain over the rows of a stacked array; resampling is skipped so the rows stay aligned."""
+    st = Stream([Trace(np.array(row, dtype=np.float64), header={"sampling_rate": sampling_rate}) for row in data])
+    return np.vstack([tr.data for tr in run_stages(st, stages, keep_rate=True)])
+
+
+class StageCache:
+    """
+    Output of each stage of the chain for the last few groups, keyed by the
+    hash of that stage and all stages before it. After an edit to stage k
+    the outputs of stages 1..k-1 are still found, so only k..n run again.
+    """
+
+    def __init__(self, max_groups=CACHE_GROUPS):
+        self.max_groups = max_groups
+        self.groups = OrderedDict()  # group_key -> (source stream, {stage key: output})
+
+    def run(self, group_key, st, stages):
+        keys = stage_keys(stages)
+        source, outputs = self.groups.pop(group_key, (None, {}))
+        if source is not st:
+            # The group was reloaded or its display copy rebuilt
+            outputs = {}
+        start, result = 0, st
+        for k in range(len(keys), 0, -1):
+            if keys[k - 1] in outputs:
+                start, result = k, outputs[keys[k - 1]]
+                break
+        for k in range(start, len(stages)):
+            result = apply_stage(result, stages[k])
+            outputs[keys[k]] = result
+        # Outputs of stages no longer in the chain are dropped
+        self.groups[group_key] = (st, {key: outputs[key] for key in keys if key in outputs})
+        while len(self.groups) > self.max_groups:
+            self.groups.popitem(last=False)
+        return result
+
+    def discard(self, group_key):
+        self.groups.pop(group_key, None)
+
+    def clear(self):
+        self.groups.clear()
+
+
+def process_stream(st, filter_params, cache=None, group_key=None):
+    """
+    Runs the filter configuration on a stream and drops the offset from the
+    start. With a cache, unchanged leading stages of group_key are reused.
+    """
+    stages = chain_stages(filter_params)
+    if cache is not None:
+        processed = cache.run(group_key, st, stages)
+    else:
+        processed = run_stages(st, stages)
+    if processed is st:
+        processed = st.copy()
+    # Slices are views, so the cached stage outputs stay as they are
+    return Stream([tr.slice(starttime=tr.stats.starttime + filter_params["offset"]) for tr in processed])
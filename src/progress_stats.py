@@ -0,0 +1,84 @@
+import csv
+import json
+import time
+
+import numpy as np
+
+IDLE_GAP = 600.0  # seconds between actions beyond which the labeller is taken as away
+STATS_COLUMNS = ("event", "total", "picked", "tagged", "discarded", "remaining")
+
+
+class ProgressStats:
+    """
+    Labelling progress and throughput. Counts come from the EventCounts of
+    the group tree, which is kept up to date on every change, so nothing is
+    recounted here. Throughput comes from the timestamps of this session's
+    pick, tag and discard actions.
+    """
+
+    def __init__(self, counts):
+        self.counts = counts  # EventCounts
+        self.actions = []  # (timestamp, action, number of groups)
+
+    def record(self, action, groups=1, timestamp=None):
+        self.actions.append((time.time() if timestamp is None else timestamp, action, groups))
+
+    def trace_seconds(self):
+        """Seconds spent on each trace: gaps between single-trace actions, idle gaps left out."""
+        times = np.array([timestamp for timestamp, _, groups in self.actions if groups == 1])
+        gaps = np.diff(times)
+        return gaps[gaps <= IDLE_GAP]
+
+    def active_hours(self):
+        times = np.array([timestamp for timestamp, _, _ in self.actions])
+        gaps = np.diff(times)
+        return gaps[gaps <= IDLE_GAP].sum() / 3600
+
+    def picks_per_hour(self):
+        picks = sum(groups for _, action, groups in self.actions if action == "pick")
+        hours = self.active_hours()
+        return float(picks / hours) if hours > 0 else None
+
+    def summary(self):
+        total, picked, tagged, discarded, remaining = (int(value) for value in self.counts.overall)
+        seconds = self.trace_seconds()
+        median = float(np.median(seconds)) if len(seconds) else None
+        picks_per_hour = self.picks_per_hour()
+        return {
+            "total": total,
+            "picked": picked,
+            "tagged": tagged,
+            "discarded": discarded,
+            "remaining": remaining,
+            "session_picks": sum(groups for _, action, groups in self.actions if action == "pick"),
+            "session_actions": len(self.actions),
+            "picks_per_hour": picks_per_hour,
+            "median_seconds_per_trace": median,
+            # Remaining groups at the median pace, None until it is known
+            "hours_left": remaining * median / 3600 if median else None,
+        }
+
+    def event_rows(self):
+        rows = []
+        for event, counts in self.counts.counts.items():
+            total, picked, tagged, discarded = (int(value) for value in counts)
+            rows.append((event, total, picked, tagged, discarded, int(self.counts.remaining.get(event, 0))))
+        return rows
+
+    def export(self, path):
+        """Writes the per-event counts as CSV, or everything as JSON for a .json path."""
+        if path.lower().endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({
+                    "summary": self.summary(),
+                    "events": [dict(zip(STATS_COLUMNS, row)) for row in self.event_rows()],
+                    "actions": [{"time": timestamp, "action": action, "groups": groups}
+                                for timestamp, action, groups in self.actions],
+                }, f, indent=2)
+            return
+        summary = self.summary()
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(STATS_COLUMNS)
+            writer.writerows(self.event_rows())
+            writer.writerow(["ALL"] + [summary[column] for column in STATS_COLUMNS[1:]])
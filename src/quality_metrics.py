@@ -0,0 +1,184 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import QObject, pyqtSignal
+from obspy.signal.trigger import classic_sta_lta, trigger_onset
+
+from src.jobs import bounded_results
+from src.utils import read_trace_files
+
+QUALITY_FILE = "quality.csv"
+QUALITY_COLUMNS = [
+    "snr",
+    "peak_amplitude",
+    "clipping_fraction",
+    "gaps",
+    "sampling_rate_mismatch",
+    "files_mtime",
+]
+
+# STA/LTA used to locate the onset for the SNR when no trigger is configured
+DEFAULT_STA = 1.0
+DEFAULT_LTA = 10.0
+DEFAULT_THRESHOLD = 3.0
+NOISE_WINDOW = 5.0  # seconds before the onset
+SIGNAL_WINDOW = 3.0  # seconds after the onset
+CLIP_TOLERANCE = 1e-3  # relative distance to the extreme counted as clipped
+BAD_CLIPPING_FRACTION = 0.001
+
+
+def files_mtime(files):
+    """Latest modification time of a group's files, used to invalidate cached metrics."""
+    return max(os.path.getmtime(file) for file in files)
+
+
+def compute_trace_metrics(st, sta=DEFAULT_STA, lta=DEFAULT_LTA, threshold=DEFAULT_THRESHOLD):
+    """Computes quality metrics of a group stream, based on its Z component."""
+    z = st.select(channel="*Z")
+    tr = z[0] if len(z) else st[0]
+    data = tr.data.astype(np.float64)
+    data = data - data.mean()
+    fs = tr.stats.sampling_rate
+
+    nsta, nlta = int(sta * fs), int(lta * fs)
+    onset = None
+    if 0 < nsta < nlta < len(data):
+        cft = classic_sta_lta(data, nsta, nlta)
+        on_off = trigger_onset(cft, threshold, threshold)
+        onset = on_off[0][0] if len(on_off) else int(np.argmax(cft))
+
+    snr = np.nan
+    if onset is not None:
+        noise = data[max(onset - int(NOISE_WINDOW * fs), 0):onset]
+        signal = data[onset:onset + int(SIGNAL_WINDOW * fs)]
+        if len(noise) and len(signal):
+            noise_rms = np.sqrt(np.mean(noise ** 2))
+            if noise_rms > 0:
+                snr = float(np.sqrt(np.mean(signal ** 2)) / noise_rms)
+
+    raw = np.abs(tr.data.astype(np.float64))
+    peak = float(raw.max()) if len(raw) else 0.0
+    clipped = np.count_nonzero(raw >= peak * (1 - CLIP_TOLERANCE)) if peak > 0 else 0
+    # A single sample at the peak is just the peak, not clipping
+    clipping_fraction = clipped / len(raw) if clipped > 1 else 0.0
+
+    return {
+        "snr": snr,
+        "peak_amplitude": peak,
+        "clipping_fraction": float(clipping_fraction),
+        "gaps": len(st.get_gaps()),
+        "sampling_rate_mismatch": len({t.stats.sampling_rate for t in st}) > 1,
+    }
+
+
+def compute_group_metrics(group_key, files, sta=DEFAULT_STA, lta=DEFAULT_LTA, threshold=DEFAULT_THRESHOLD):
+    """Process pool entry point: reads one group and returns (group_key, metrics)."""
+    metrics = compute_trace_metrics(read_trace_files(files), sta, lta, threshold)
+    metrics["files_mtime"] = files_mtime(files)
+    return group_key, metrics
+
+
+class QualityIndex:
+    """Per-group quality metrics cached in quality.csv next to data.csv."""
+
+    def __init__(self):
+        self.quality_file = None
+        self.df = pd.DataFrame(columns=QUALITY_COLUMNS)
+
+    def load(self, folder):
+        self.quality_file = os.path.join(folder, QUALITY_FILE)
+        if os.path.exists(self.quality_file):
+            self.df = pd.read_csv(self.quality_file, index_col="trace_path")
+        else:
+            self.df = pd.DataFrame(columns=QUALITY_COLUMNS)
+            self.df.index.name = "trace_path"
+        return self.df
+
+    def save(self):
+        if self.quality_file:
+            self.df.to_csv(self.quality_file)
+
+    def update(self, results):
+        """Stores a dict of group_key -> metrics in one step."""
+        if not results:
+            return
+        new_df = pd.DataFrame.from_dict(results, orient="index", columns=QUALITY_COLUMNS)
+        new_df.index.name = "trace_path"
+        kept = self.df.drop(index=new_df.index, errors="ignore")
+        self.df = new_df if kept.empty else pd.concat([kept, new_df])
+
+    def missing(self, file_groups):
+        """Group keys without metrics, or whose files changed since they were computed."""
+        missing = []
+        for group_key, files in file_groups.items():
+            if group_key not in self.df.index:
+                missing.append(group_key)
+                continue
+            try:
+                if files_mtime(files) > self.df.loc[group_key, "files_mtime"]:
+                    missing.append(group_key)
+            except OSError:
+                pass
+        return missing
+
+    def bad_mask(self, group_keys):
+        """Boolean Series: whether each group has clipping, gaps or mixed sampling rates."""
+        df = self.df.reindex(group_keys)
+        clipping = pd.to_numeric(df["clipping_fraction"], errors="coerce")
+        gaps = pd.to_numeric(df["gaps"], errors="coerce")
+        return (
+            (clipping > BAD_CLIPPING_FRACTION)
+            | (gaps > 0)
+            | df["sampling_rate_mismatch"].eq(True)
+        )
+
+
+class QualityJob(QObject):
+    """
+    Computes quality metrics for a list of groups in a process pool. Meant to
+    be moved to a QThread; results are reported back through signals.
+    """
+
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, file_groups, group_keys, sta=DEFAULT_STA, lta=DEFAULT_LTA,
+                 threshold=DEFAULT_THRESHOLD, workers=None):
+        super().__init__()
+        self.jobs = [(group_key, list(file_groups[group_key])) for group_key in group_keys]
+        self.sta = sta
+        self.lta = lta
+        self.threshold = threshold
+        self.workers = workers
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        results = {}
+        total = len(self.jobs)
+        # spawn keeps the Qt state of the GUI process out of the workers
+        context = multiprocessing.get_context("spawn")
+        workers = self.workers or os.cpu_count()
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        finished = bounded_results(
+            pool,
+            lambda pool, job: pool.submit(compute_group_metrics, job[0], job[1], self.sta, self.lta, self.threshold),
+            self.jobs, lambda: self.cancelled, 2 * workers,
+        )
+        try:
+            for done, (_, future) in enumerate(finished, start=1):
+                try:
+                    group_key, metrics = future.result()
+                    results[group_key] = metrics
+                except Exception as e:
+                    print(f"Quality metrics failed: {e}")
+                self.progress.emit(done, total)
+        finally:
+            # A cancelled run leaves the running groups behind instead of waiting
+            pool.shutdown(wait=not self.cancelled, cancel_futures=True)
+        self.finished.emit(results)
@@ -0,0 +1,91 @@
+import numpy as np
+from obspy import Stream
+from obspy.io.sac import SACTrace
+
+SAC_HEADER_SIZE = 632  # bytes of fixed header before the samples
+DEFAULT_CHUNK_SIZE = 2 ** 20  # samples
+OVERVIEW_BLOCK = 64  # contiguous samples read per overview bucket
+LONG_RECORD_NPTS = 2_000_000  # records longer than this are read in windows
+DEFAULT_WINDOW = 600.0  # seconds loaded at full rate for long records
+MAX_WINDOW = 3600.0  # wider zooms only show the overview
+WINDOW_MARGIN = 0.5  # extra fraction of the visible span loaded on each side
+OVERVIEW_POINTS = 4000
+
+
+def read_sac_header(path):
+    """Reads only the fixed SAC header of a file."""
+    return SACTrace.read(path, headonly=True)
+
+
+def sac_dtype(header):
+    """Sample dtype of a SAC file (always 4-byte floats, in the file's byte order)."""
+    return np.dtype("<f4" if header.byteorder == "little" else ">f4")
+
+
+def iter_sac_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields the samples of an evenly sampled SAC file in chunks of at most
+    chunk_size samples, so memory use does not grow with the record length.
+    """
+    header = read_sac_header(path)
+    dtype = sac_dtype(header)
+    remaining = header.npts
+    with open(path, "rb") as f:
+        f.seek(SAC_HEADER_SIZE)
+        while remaining > 0:
+            chunk = np.fromfile(f, dtype=dtype, count=min(chunk_size, remaining))
+            if len(chunk) == 0:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def sac_samples(path, header=None):
+    """Memory-maps the samples of a SAC file; nothing is read until sliced."""
+    header = header or read_sac_header(path)
+    return np.memmap(path, dtype=sac_dtype(header), mode="r",
+                     offset=SAC_HEADER_SIZE, shape=(header.npts,))
+
+
+def read_sac_window(path, starttime, endtime):
+    """
+    Reads only the samples of a SAC file between two UTCDateTimes (clipped to
+    the record), seeking past the fixed header instead of reading everything.
+
+    Returns an obspy Trace whose starttime is that of the first sample read.
+    """
+    header = read_sac_header(path)
+    tr = header.to_obspy_trace()
+    file_start = tr.stats.starttime
+    sampling_rate = tr.stats.sampling_rate
+    first = min(max(int(np.floor((starttime - file_start) * sampling_rate)), 0), header.npts)
+    last = min(max(int(np.ceil((endtime - file_start) * sampling_rate)) + 1, first), header.npts)
+    tr.data = np.array(sac_samples(path, header)[first:last])
+    tr.stats.starttime = file_start + first / sampling_rate
+    return tr
+
+
+def read_stream_window(files, starttime, endtime):
+    """Windowed counterpart of read_trace_files: one trace per component file."""
+    return Stream([read_sac_window(file, starttime, endtime) for file in files])
+
+
+def read_sac_overview(path, points):
+    """
+    Cheap overview of a whole SAC record for display: the min and max of a
+    short block at each of points // 2 evenly spaced positions. Only those
+    blocks are paged in, so the cost does not depend on the record length.
+
+    Returns (times, values) with times in seconds from the first sample.
+    """
+    header = read_sac_header(path)
+    samples = sac_samples(path, header)
+    buckets = max(points // 2, 1)
+    block = min(OVERVIEW_BLOCK, max(header.npts // buckets, 1))
+    starts = np.linspace(0, header.npts - block, buckets).astype(np.int64)
+    blocks = samples[starts[:, None] + np.arange(block)]
+    imin = starts + blocks.argmin(axis=1)
+    imax = starts + blocks.argmax(axis=1)
+    indices = np.sort(np.stack([imin, imax], axis=1), axis=1).ravel()
+    delta = header.to_obspy_trace().stats.delta
+    return indices * delta, np.asarray(samples[indices], dtype=np.float64)
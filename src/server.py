@@ -0,0 +1,355 @@
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+import numpy as np
+import pandas as pd
+from matplotlib.colors import LinearSegmentedColormap
+from matplotlib import image as mpimg
+
+from src.csv_operations import CSVHandler
+from src.plotting import compute_spectrogram, SPECTROGRAM_TICKS
+from src.utils import group_sac_files, read_trace_files, filter_stream
+from src.preprocessing import validate_chain
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_POINTS = 2000
+
+
+class LRUCache:
+    """Small thread-safe LRU cache."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                return self.items[key]
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+
+def decimate_minmax(data, points):
+    """
+    Reduces a waveform to at most `points` samples by keeping the min and max
+    of each bucket, which preserves peaks for display unlike plain striding.
+
+    Returns (indices, values) with indices into the original array.
+    """
+    npts = len(data)
+    buckets = max(points // 2, 1)
+    if npts <= points:
+        return np.arange(npts), np.asarray(data)
+    size = npts // buckets
+    usable = size * buckets
+    blocks = np.asarray(data[:usable]).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    imin = blocks.argmin(axis=1) + offsets
+    imax = blocks.argmax(axis=1) + offsets
+    # Keep each bucket's pair in time order
+    indices = np.sort(np.stack([imin, imax], axis=1), axis=1).ravel()
+    if usable < npts:
+        indices = np.append(indices, npts - 1)
+    return indices, np.asarray(data)[indices]
+
+
+def spectrogram_png(tr):
+    """Renders the trace spectrogram with the GUI colour map as PNG bytes."""
+    Sxx, freqs, times = compute_spectrogram(tr)
+    ticks = sorted(SPECTROGRAM_TICKS)
+    cmap = LinearSegmentedColormap.from_list(
+        "spectrogram", [(pos, np.array(color) / 255.0) for pos, color in ticks]
+    )
+    buffer = io.BytesIO()
+    # Row 0 is the lowest frequency, so flip to draw it at the bottom
+    mpimg.imsave(buffer, Sxx[::-1], cmap=cmap, vmin=Sxx.min(), vmax=Sxx.max(), format="png")
+    return buffer.getvalue()
+
+
+def parse_filter_params(query):
+    """Builds filter_params from query arguments, or None if no filter was asked for."""
+    if "chain" in query:
+        # Preprocessing chain as the JSON list of its stages
+        try:
+            stages = json.loads(query["chain"][0])
+        except json.JSONDecodeError as e:
+            raise ValueError(f"chain is not valid JSON: {e}")
+        offset = float(query["offset"][0]) if "offset" in query else 0
+        return validate_chain({"type": "chain", "stages": stages, "offset": offset})
+    if "type" not in query:
+        return None
+    def value(name):
+        if name not in query:
+            return None
+        try:
+            return float(query[name][0])
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+    filter_type = query["type"][0].lower()
+    needed = {"bandpass": ("min_freq", "max_freq"), "highpass": ("min_freq",), "lowpass": ("max_freq",)}
+    if filter_type not in needed:
+        raise ValueError(f"type must be one of {', '.join(needed)}")
+    filter_params = {
+        "type": filter_type,
+        "min_freq": value("min_freq"),
+        "max_freq": value("max_freq"),
+        "offset": value("offset") or 0,
+    }
+    missing = [name for name in needed[filter_type] if filter_params[name] is None]
+    if missing:
+        raise ValueError(f"{filter_type} needs {', '.join(missing)}")
+    if any(filter_params[name] <= 0 for name in needed[filter_type]):
+        raise ValueError("Filter frequencies must be positive")
+    if filter_type == "bandpass" and filter_params["min_freq"] >= filter_params["max_freq"]:
+        raise ValueError("min_freq must be less than max_freq")
+    return filter_params
+
+
+class TraceService:
+    """
+    Headless access to a dataset folder: streams, decimated waveforms,
+    spectrograms and picks, with caches shared across all clients.
+
+    Expensive work runs in a worker pool; concurrent requests for the same
+    result wait on a single computation instead of repeating it.
+    """
+
+    def __init__(self, folder, workers=4, cache_size=64):
+        self.folder = folder
+        self.file_groups = group_sac_files(folder)
+        self.csv_handler = CSVHandler()
+        self.csv_handler.set_data_file(folder)
+        self.csv_handler.add_groups(list(self.file_groups.keys()))
+        self.csv_lock = threading.Lock()
+
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.streams = LRUCache(cache_size)
+        self.results = LRUCache(cache_size * 4)
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _cached(self, cache, key, compute, in_pool=True):
+        """
+        Returns a cached value or computes it once. Results run in the worker
+        pool; stream loads run inline since they are requested from workers.
+        """
+        value = cache.get(key)
+        if value is not None:
+            return value
+        owner = False
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            if future is None:
+                if in_pool:
+                    future = self.pool.submit(compute)
+                else:
+                    future = Future()
+                    owner = True
+                self.inflight[key] = future
+        if owner:
+            try:
+                future.set_result(compute())
+            except Exception as e:
+                future.set_exception(e)
+        try:
+            value = future.result()
+            cache.put(key, value)
+            return value
+        finally:
+            with self.inflight_lock:
+                if self.inflight.get(key) is future:
+                    del self.inflight[key]
+
+    def get_stream(self, group_key, filter_params=None):
+        if group_key not in self.file_groups:
+            raise KeyError(group_key)
+        raw = self._cached(
+            self.streams, ("raw", group_key),
+            lambda: read_trace_files(self.file_groups[group_key]),
+            in_pool=False,
+        )
+        if filter_params is None:
+            return raw
+        key = ("filtered", group_key, json.dumps(filter_params, sort_keys=True))
+        return self._cached(
+            self.streams, key, lambda: filter_stream(raw, filter_params), in_pool=False
+        )
+
+    def get_trace(self, group_key, channel="Z", filter_params=None):
+        st = self.get_stream(group_key, filter_params)
+        selected = st.select(channel=f"*{channel}")
+        if len(selected) == 0:
+            raise KeyError(f"{group_key} has no {channel} channel")
+        return selected[0]
+
+    def waveform(self, group_key, channel="Z", points=DEFAULT_POINTS, filter_params=None):
+        key = ("waveform", group_key, channel, points, json.dumps(filter_params, sort_keys=True))
+        def compute():
+            tr = self.get_trace(group_key, channel, filter_params)
+            indices, values = decimate_minmax(tr.data, points)
+            return {
+                "group": group_key,
+                "id": tr.id,
+                "starttime": str(tr.stats.starttime),
+                "sampling_rate": tr.stats.sampling_rate,
+                "npts": tr.stats.npts,
+                "times": (indices / tr.stats.sampling_rate).tolist(),
+                "data": values.astype(float).tolist(),
+            }
+        return self._cached(self.results, key, compute)
+
+    def spectrogram(self, group_key, channel="Z", filter_params=None):
+        key = ("spectrogram", group_key, channel, json.dumps(filter_params, sort_keys=True))
+        return self._cached(
+            self.results, key,
+            lambda: spectrogram_png(self.get_trace(group_key, channel, filter_params)),
+        )
+
+    def groups(self):
+        with self.csv_lock:
+            df = self.csv_handler.data_df
+            return [
+                {
+                    "group": group_key,
+                    "picked": bool(pd.notna(df.loc[group_key, "p_wave_frame"])),
+                    "needs_review": bool(df.loc[group_key, "needs_review"]),
+                    "deleted": bool(df.loc[group_key, "deleted"]),
+                }
+                for group_key in self.file_groups
+            ]
+
+    def get_picks(self, group_key):
+        if group_key not in self.file_groups:
+            raise KeyError(group_key)
+        with self.csv_lock:
+            p_wave_frame = self.csv_handler.data_df.loc[group_key, "p_wave_frame"]
+        return {
+            "group": group_key,
+            "p_wave_frame": json.loads(p_wave_frame) if pd.notna(p_wave_frame) else [],
+        }
+
+    def set_picks(self, group_key, p_wave_times):
+        if group_key not in self.file_groups:
+            raise KeyError(group_key)
+        if not isinstance(p_wave_times, list):
+            raise ValueError("p_wave_frame must be a list of UTC time strings")
+        with self.csv_lock:
+            self.csv_handler.update_p_wave_time(group_key, [str(t) for t in p_wave_times])
+        return self.get_picks(group_key)
+
+
+class TraceRequestHandler(BaseHTTPRequestHandler):
+    """
+    Routes:
+        GET  /groups
+        GET  /waveform/<event>/<station>?channel=Z&points=2000[&type=...&min_freq=...]
+        GET  /spectrogram/<event>/<station>.png?channel=Z[&type=...]
+        GET  /picks/<event>/<station>
+        PUT  /picks/<event>/<station>   body: {"p_wave_frame": ["<UTC>", ...]}
+    """
+
+    service = None  # Set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        if content_type == "application/json":
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = unquote(url.path).strip("/").split("/", 1)
+        resource = parts[0]
+        group_key = parts[1] if len(parts) > 1 else None
+        return resource, group_key, parse_qs(url.query)
+
+    def do_GET(self):
+        resource, group_key, query = self._route()
+        try:
+            channel = query.get("channel", ["Z"])[0]
+            filter_params = parse_filter_params(query)
+            if resource == "groups":
+                self._send(200, self.service.groups())
+            elif resource == "waveform" and group_key:
+                points = int(query.get("points", [DEFAULT_POINTS])[0])
+                self._send(200, self.service.waveform(group_key, channel, points, filter_params))
+            elif resource == "spectrogram" and group_key:
+                group_key = group_key.removesuffix(".png")
+                png = self.service.spectrogram(group_key, channel, filter_params)
+                self._send(200, png, "image/png")
+            elif resource == "picks" and group_key:
+                self._send(200, self.service.get_picks(group_key))
+            else:
+                self._send(404, {"error": f"Unknown route {self.path}"})
+        except KeyError as e:
+            self._send(404, {"error": f"Not found: {e}"})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+
+    def do_PUT(self):
+        resource, group_key, _ = self._route()
+        try:
+            if resource != "picks" or not group_key:
+                self._send(404, {"error": f"Unknown route {self.path}"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError('The body must be a JSON object like {"p_wave_frame": [...]}')
+            self._send(200, self.service.set_picks(group_key, payload.get("p_wave_frame")))
+        except KeyError as e:
+            self._send(404, {"error": f"Not found: {e}"})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+
+    do_POST = do_PUT
+
+
+def make_server(folder, port=DEFAULT_PORT, workers=4):
+    """Creates a server bound to localhost only. Use port 0 for a free port."""
+    service = TraceService(folder, workers=workers)
+    handler = type("BoundTraceRequestHandler", (TraceRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((DEFAULT_HOST, port), handler)
+    server.service = service
+    return server
+
+
+def serve(folder, port=DEFAULT_PORT, workers=4):
+    server = make_server(folder, port, workers)
+    host, port = server.server_address[:2]
+    print(f"Serving {folder} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
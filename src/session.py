@@ -0,0 +1,49 @@
+import json
+import os
+
+SESSION_DIR = os.path.join(os.path.expanduser("~"), ".seismic_picker")
+SESSION_FILE = os.path.join(SESSION_DIR, "session.json")
+GROUP_INDEX_FILE = "groups.json"  # Serialized file_groups, next to data.csv
+
+
+def _write_json(path, data):
+    # Write to a temporary file first so a crash never leaves half a snapshot
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {path}: {e}")
+        return None
+
+
+def save_session(state):
+    """Stores the session snapshot (folder, parameters, list state, position)."""
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    _write_json(SESSION_FILE, state)
+
+
+def load_session():
+    """Returns the last session snapshot, or None."""
+    if not os.path.exists(SESSION_FILE):
+        return None
+    return _read_json(SESSION_FILE)
+
+
+def save_group_index(folder, file_groups):
+    """Stores file_groups so the folder does not need to be rescanned on resume."""
+    _write_json(os.path.join(folder, GROUP_INDEX_FILE), file_groups)
+
+
+def load_group_index(folder):
+    """Returns the stored file_groups of a folder, or None."""
+    path = os.path.join(folder, GROUP_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    return _read_json(path)
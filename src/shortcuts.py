@@ -20,6 +20,12 @@ def setup_shortcuts(window):
         (QKeySequence(Qt.Key_Space), window.save_p_wave_time),
         (QKeySequence(Qt.Key_D), window.toggle_deleted_trace),
         (QKeySequence(Qt.Key_X), window.delete_selected_p_marker),
+        (QKeySequence(Qt.Key_A), window.toggle_pick_refinement),
+        (QKeySequence(Qt.Key_C), window.toggle_three_component),
+        (QKeySequence(Qt.Key_G), window.toggle_pick_propagation),
+        (QKeySequence(Qt.Key_M), window.toggle_ml_prepick),
+        (QKeySequence(Qt.SHIFT + Qt.Key_T), window.tag_selected),
+        (QKeySequence(Qt.SHIFT + Qt.Key_D), window.discard_selected),
     ]
     
     return [QShortcut(key, window, activated=callback) for key, callback in shortcuts] 
\ No newline at end of file
@@ -0,0 +1,204 @@
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import QRectF, QThread
+from PyQt5.QtWidgets import (
+    QMainWindow,
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QLabel,
+    QLineEdit,
+    QPushButton,
+    QComboBox,
+    QCheckBox,
+    QDoubleSpinBox,
+)
+
+from src.stacking import STACK_PRE, STACK_POST, StackJob, picked_groups
+
+ORDER_OPTIONS = ["Folder order", "Correlation with stack (low first)"]
+# Blue-white-red for traces normalised to [-1, 1]
+STACK_COLORMAP = pg.ColorMap([0.0, 0.5, 1.0], [(0, 0, 200), (255, 255, 255), (200, 0, 0)])
+
+
+class StackWindow(QMainWindow):
+    """
+    Record section of the picked groups aligned on their P pick, one row per
+    group, with the mean stack below. Clicking a row opens that group.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent = parent
+        self.setWindowTitle("Pick Stack")
+        self.setGeometry(150, 150, 1000, 800)
+        self.job = None
+        self.thread = None
+        self.result = None
+        self.order = np.arange(0)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout()
+        central_widget.setLayout(layout)
+
+        controls = QHBoxLayout()
+        self.event_input = QLineEdit()
+        self.event_input.setPlaceholderText("Event contains")
+        self.station_input = QLineEdit()
+        self.station_input.setPlaceholderText("Station contains")
+        self.pre_input = QDoubleSpinBox()
+        self.pre_input.setRange(0.1, 60)
+        self.pre_input.setValue(STACK_PRE)
+        self.post_input = QDoubleSpinBox()
+        self.post_input.setRange(0.1, 300)
+        self.post_input.setValue(STACK_POST)
+        self.order_combo = QComboBox()
+        self.order_combo.addItems(ORDER_OPTIONS)
+        self.order_combo.currentIndexChanged.connect(self.show_result)
+        self.use_filter = QCheckBox("Filter")
+        self.use_filter.setChecked(bool(parent and parent.filter))
+        self.build_btn = QPushButton("Build Stack")
+        self.build_btn.clicked.connect(self.toggle_build)
+        for widget in (self.event_input, self.station_input):
+            widget.returnPressed.connect(self.build)
+            controls.addWidget(widget)
+        controls.addWidget(QLabel("Before (s)"))
+        controls.addWidget(self.pre_input)
+        controls.addWidget(QLabel("After (s)"))
+        controls.addWidget(self.post_input)
+        controls.addWidget(self.order_combo)
+        controls.addWidget(self.use_filter)
+        controls.addWidget(self.build_btn)
+        layout.addLayout(controls)
+
+        self.status_label = QLabel("Stack: -")
+        layout.addWidget(self.status_label)
+
+        graphics = pg.GraphicsLayoutWidget()
+        graphics.setBackground("w")
+        layout.addWidget(graphics)
+        self.section_plot = graphics.addPlot(row=0, col=0)
+        self.section_plot.invertY(True)
+        self.section_plot.setLabel("left", "Group")
+        self.image = pg.ImageItem(axisOrder="row-major")
+        self.image.setColorMap(STACK_COLORMAP)
+        self.image.setAutoDownsample(True)
+        self.section_plot.addItem(self.image)
+        self.section_plot.addItem(pg.InfiniteLine(pos=0, angle=90, pen=pg.mkPen((0, 0, 0), width=1)))
+        self.stack_plot = graphics.addPlot(row=1, col=0)
+        self.stack_plot.setXLink(self.section_plot)
+        self.stack_plot.setLabel("bottom", "Time from P (s)")
+        self.stack_plot.setLabel("left", "Mean stack")
+        self.stack_plot.addItem(pg.InfiniteLine(pos=0, angle=90, pen=pg.mkPen((200, 0, 0), width=1)))
+        self.stack_curve = self.stack_plot.plot(pen=pg.mkPen((0, 0, 0), width=1.5))
+        graphics.ci.layout.setRowStretchFactor(0, 4)
+        graphics.ci.layout.setRowStretchFactor(1, 1)
+        self.section_plot.scene().sigMouseMoved.connect(self.on_mouse_moved)
+        self.section_plot.scene().sigMouseClicked.connect(self.on_mouse_clicked)
+
+    def toggle_build(self):
+        if self.job is not None:
+            self.cancel_build()
+            self.status_label.setText("Stack: cancelled")
+        else:
+            self.build()
+
+    def build(self):
+        window = self.parent
+        if window is None or self.job is not None:
+            return
+        frames = picked_groups(
+            window.data_df, window.file_groups.keys(), self.event_input.text().strip(), self.station_input.text().strip()
+        )
+        cached = {}
+        for group_key, st in window.traces.items():
+            if group_key in frames.index and st:
+                z = st.select(channel="*Z")
+                tr = z[0] if len(z) else st[0]
+                cached[group_key] = (tr.data, tr.stats.sampling_rate, tr.stats.starttime.timestamp)
+        filter_params = window.filter_params if self.use_filter.isChecked() else None
+        self.job = StackJob(
+            window.file_groups, frames, window.stack_headers, cached,
+            self.pre_input.value(), self.post_input.value(), filter_params,
+        )
+        self.thread = QThread(self)
+        self.job.moveToThread(self.thread)
+        self.thread.started.connect(self.job.run)
+        self.job.progress.connect(self.on_progress)
+        self.job.finished.connect(self.on_finished)
+        self.build_btn.setText("Cancel")
+        self.status_label.setText(f"Stack: reading {len(frames)} picked groups")
+        self.thread.start()
+
+    def finish_build(self):
+        self.thread.quit()
+        self.thread.wait()
+        self.job = None
+        self.thread = None
+        self.build_btn.setText("Build Stack")
+
+    def cancel_build(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job.finished.disconnect(self.on_finished)
+            self.finish_build()
+
+    def on_progress(self, done, total):
+        self.status_label.setText(f"Stack: {done}/{total}")
+
+    def on_finished(self, result):
+        self.finish_build()
+        window = self.parent
+        window.stack_headers.merge(result["headers"], result["files"], window.file_groups)
+        if not result["group_keys"]:
+            self.result = None
+            self.image.clear()
+            self.stack_curve.setData([], [])
+            self.status_label.setText("Stack: no picked groups match")
+            return
+        self.result = result
+        self.show_result()
+
+    def show_result(self):
+        result = self.result
+        if result is None:
+            return
+        if self.order_combo.currentText() == ORDER_OPTIONS[1]:
+            self.order = np.argsort(result["correlation"], kind="stable")
+        else:
+            self.order = np.arange(len(result["group_keys"]))
+        times = result["times"]
+        rows = len(self.order)
+        self.image.setImage(result["matrix"][self.order], levels=(-1, 1))
+        self.image.setRect(QRectF(times[0], 0, times[-1] - times[0], rows))
+        self.stack_curve.setData(times, result["stack"])
+        self.section_plot.setRange(xRange=(times[0], times[-1]), yRange=(0, rows), padding=0)
+        skipped = f", {result['skipped']} skipped (other sampling rate or unreadable)" if result["skipped"] else ""
+        self.status_label.setText(
+            f"Stack: {rows} groups at {result['sampling_rate']:g} Hz, "
+            f"median correlation {np.median(result['correlation']):.2f}{skipped}"
+        )
+
+    def row_at(self, scene_pos):
+        if self.result is None or not self.section_plot.sceneBoundingRect().contains(scene_pos):
+            return None
+        row = int(np.floor(self.section_plot.vb.mapSceneToView(scene_pos).y()))
+        return row if 0 <= row < len(self.order) else None
+
+    def on_mouse_moved(self, scene_pos):
+        row = self.row_at(scene_pos)
+        if row is not None:
+            index = self.order[row]
+            self.section_plot.setTitle(
+                f"{self.result['group_keys'][index]}  (correlation {self.result['correlation'][index]:.2f})"
+            )
+
+    def on_mouse_clicked(self, event):
+        row = self.row_at(event.scenePos())
+        if row is not None and self.parent is not None:
+            self.parent.jump_to_group(self.result["group_keys"][self.order[row]])
+
+    def closeEvent(self, event):
+        self.cancel_build()
+        super().closeEvent(event)
@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from src.exporter import parse_pick_lists
+from src.sac_reader import SAC_HEADER_SIZE
+from src.three_component import filter_stack
+
+STACK_PRE = 2.0  # seconds shown before the pick
+STACK_POST = 8.0  # seconds shown after the pick
+FILTER_PAD = 5.0  # seconds read before the window so the filter settles
+PROGRESS_EVERY = 500  # rows between progress signals
+
+
+def read_z_header(path):
+    """
+    (dtype, sampling_rate, npts, start epoch seconds, channel) from the raw
+    fixed header of a SAC file, without building an obspy trace.
+    """
+    raw = np.fromfile(path, dtype=np.uint8, count=SAC_HEADER_SIZE)
+    order = "<" if np.frombuffer(raw[304:308], dtype="<i4")[0] == 6 else ">"  # nvhdr is 6
+    floats = np.frombuffer(raw[:280], dtype=f"{order}f4")
+    ints = np.frombuffer(raw[280:440], dtype=f"{order}i4")
+    year, jday, hour, minute, second, msec = (int(value) for value in ints[:6])
+    reference = (
+        np.datetime64(f"{year:04d}-01-01") + np.timedelta64(jday - 1, "D")
+    ).astype("datetime64[s]").astype(np.int64)
+    start = reference + hour * 3600 + minute * 60 + second + msec / 1000 + float(floats[5])
+    channel = raw[600:608].tobytes().decode("ascii", "replace").strip()
+    # delta is float32, round the rate back to what was meant
+    return np.dtype(f"{order}f4"), round(1 / float(floats[0]), 4), int(ints[9]), start, channel
+
+
+class ZHeaderCache:
+    """
+    Raw Z header of each group, read once. The Z file is guessed from the
+    file name first, so usually only one header per group is read.
+    """
+
+    def __init__(self):
+        self.headers = {}  # group_key -> (path, dtype, sampling_rate, npts, start)
+
+    def get(self, group_key, files):
+        if group_key not in self.headers:
+            guesses = sorted(files, key=lambda path: not path.rsplit(".", 1)[0].upper().endswith("Z"))
+            header = None
+            for path in guesses:
+                dtype, sampling_rate, npts, start, channel = read_z_header(path)
+                header = header or (path, dtype, sampling_rate, npts, start)
+                if channel.upper().endswith("Z"):
+                    header = (path, dtype, sampling_rate, npts, start)
+                    break
+            self.headers[group_key] = header
+        return self.headers[group_key]
+
+    def copy(self):
+        cache = ZHeaderCache()
+        cache.headers = dict(self.headers)
+        return cache
+
+    def merge(self, headers, files, file_groups):
+        """Adds headers read elsewhere from `files`, for the groups whose files are still the same."""
+        for group_key, header in headers.items():
+            if file_groups.get(group_key) == files.get(group_key):
+                self.headers.setdefault(group_key, header)
+
+
+def first_pick_epochs(p_wave_frames):
+    """Epoch seconds of the first pick of each p_wave_frame JSON list (NaN if empty)."""
+    firsts = [times[0] if times else None for times in parse_pick_lists(p_wave_frames.to_numpy())]
+    times = pd.to_datetime(pd.Series(firsts, index=p_wave_frames.index), utc=True, format="ISO8601")
+    return (times - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)
+
+
+def picked_groups(data_df, group_keys, event_filter="", station_filter=""):
+    """Picked, non-discarded groups among group_keys whose event/station contain the filters."""
+    df = data_df.reindex(list(group_keys))
+    keep = df["p_wave_frame"].notna() & ~df["deleted"].eq(True)
+    parts = df.index.to_series().str.partition("/")
+    if event_filter:
+        keep &= parts[0].str.contains(event_filter, case=False, regex=False)
+    if station_filter:
+        keep &= parts[2].str.contains(station_filter, case=False, regex=False)
+    return df.loc[keep, "p_wave_frame"]
+
+
+class StackJob(QObject):
+    """
+    Aligns the Z traces of picked groups on their P time into one
+    preallocated (groups, samples) matrix. Only the window around each pick
+    is read from the SAC files; groups already loaded in the window come from
+    memory. Meant to be moved to a QThread.
+
+    The job works on copies of the file lists and of the header cache, as
+    the folder watcher changes both on the GUI thread; the headers it reads
+    are returned in the result ("headers", with the "files" they came from)
+    for the GUI thread to merge.
+    """
+
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, file_groups, p_wave_frames, headers, cached=None, pre=STACK_PRE,
+                 post=STACK_POST, filter_params=None):
+        super().__init__()
+        self.file_groups = {
+            key: list(file_groups[key]) for key in p_wave_frames.index if key in file_groups
+        }
+        self.p_wave_frames = p_wave_frames
+        self.headers = headers.copy()
+        self.known_headers = set(self.headers.headers)
+        self.cached = cached or {}  # group_key -> (samples, sampling_rate, start epoch)
+        self.pre = pre
+        self.post = post
+        self.filter_params = filter_params
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        picks = first_pick_epochs(self.p_wave_frames).dropna()
+        sources = {}  # group_key -> (samples in memory or None, path, dtype, sampling_rate, npts, start)
+        for group_key in picks.index:
+            if group_key in self.cached:
+                samples, sampling_rate, start = self.cached[group_key]
+                sources[group_key] = (samples, None, None, sampling_rate, len(samples), start)
+            elif group_key in self.file_groups:
+                try:
+                    sources[group_key] = (None,) + self.headers.get(group_key, self.file_groups[group_key])
+                except (OSError, ValueError) as e:
+                    print(f"Stack skips {group_key}: {e}")
+        rates = pd.Series({key: source[3] for key, source in sources.items()}, dtype=np.float64)
+        if rates.empty:
+            self.finished.emit({"group_keys": [], "skipped": len(picks), **self.read_headers()})
+            return
+        # One sampling rate per matrix; groups at other rates are left out
+        sampling_rate = float(rates.mode().iloc[0])
+        group_keys = list(rates.index[rates == sampling_rate])
+
+        pad = int(round(FILTER_PAD * sampling_rate)) if self.filter_params else 0
+        before = int(round(self.pre * sampling_rate)) + pad
+        width = before + int(round(self.post * sampling_rate)) + 1
+        matrix = np.zeros((len(group_keys), width), dtype=np.float32)
+        for row, group_key in enumerate(group_keys):
+            if self.cancelled:
+                return
+            samples, path, dtype, _, npts, start = sources[group_key]
+            first = int(round((picks[group_key] - start) * sampling_rate)) - before
+            lo, hi = max(first, 0), min(first + width, npts)
+            if hi > lo:
+                if samples is not None:
+                    matrix[row, lo - first:hi - first] = samples[lo:hi]
+                else:
+                    matrix[row, lo - first:hi - first] = np.fromfile(
+                        path, dtype=dtype, count=hi - lo, offset=SAC_HEADER_SIZE + lo * 4
+                    )
+            if row % PROGRESS_EVERY == 0:
+                self.progress.emit(row, len(group_keys))
+
+        if self.filter_params:
+            filtered, _ = filter_stack(matrix, sampling_rate, {**self.filter_params, "offset": 0})
+            matrix = np.ascontiguousarray(filtered[:, pad:], dtype=np.float32)
+        self.finished.emit({
+            **stack_result(matrix, group_keys, sampling_rate, self.pre, len(picks) - len(group_keys)),
+            **self.read_headers(),
+        })
+
+    def read_headers(self):
+        headers = {key: header for key, header in self.headers.headers.items() if key not in self.known_headers}
+        return {"headers": headers, "files": self.file_groups}
+
+
+def stack_result(matrix, group_keys, sampling_rate, pre, skipped=0):
+    """
+    Normalises each row to its peak, stacks them and scores every row by its
+    correlation with the mean stack, low scores being the likely mispicks.
+    """
+    matrix -= matrix.mean(axis=1, keepdims=True)
+    peaks = np.abs(matrix).max(axis=1, keepdims=True)
+    matrix /= np.where(peaks > 0, peaks, 1)
+    stack = matrix.mean(axis=0)
+    norms = np.linalg.norm(matrix, axis=1) * max(np.linalg.norm(stack), 1e-12)
+    correlation = np.divide(matrix @ stack, norms, out=np.zeros(len(matrix), dtype=np.float32), where=norms > 0)
+    return {
+        "matrix": matrix,
+        "group_keys": group_keys,
+        "stack": stack,
+        "correlation": correlation,
+        "times": np.arange(matrix.shape[1]) / sampling_rate - pre,
+        "sampling_rate": sampling_rate,
+        "skipped": skipped,
+    }
@@ -0,0 +1,84 @@
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (
+    QMainWindow,
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QFileDialog,
+    QMessageBox,
+)
+
+from src.progress_stats import STATS_COLUMNS
+
+
+def format_summary(summary):
+    picks_per_hour = f"{summary['picks_per_hour']:.0f}" if summary["picks_per_hour"] is not None else "-"
+    median = (
+        f"{summary['median_seconds_per_trace']:.1f} s" if summary["median_seconds_per_trace"] is not None else "-"
+    )
+    hours_left = f"{summary['hours_left']:.1f} h" if summary["hours_left"] is not None else "-"
+    return (
+        f"{summary['picked']}/{summary['total']} picked, {summary['tagged']} tagged, "
+        f"{summary['discarded']} discarded, {summary['remaining']} remaining\n"
+        f"Session: {summary['session_picks']} picks, {picks_per_hour} picks/h, "
+        f"median {median} per trace, about {hours_left} left"
+    )
+
+
+class StatsWindow(QMainWindow):
+    """Per-event progress table with the overall counts and throughput above."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent = parent
+        self.setWindowTitle("Labelling Statistics")
+        self.setGeometry(200, 200, 700, 600)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout()
+        central_widget.setLayout(layout)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        self.table = QTableWidget(0, len(STATS_COLUMNS))
+        self.table.setHorizontalHeaderLabels([column.capitalize() for column in STATS_COLUMNS])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSortingEnabled(True)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        export_btn = QPushButton("Export...")
+        export_btn.clicked.connect(self.export)
+        buttons.addWidget(export_btn)
+        layout.addLayout(buttons)
+        self.refresh()
+
+    def refresh(self):
+        stats = self.parent.progress_stats
+        self.summary_label.setText(format_summary(stats.summary()))
+        rows = stats.event_rows()
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                item = QTableWidgetItem()
+                # Numbers sort as numbers
+                item.setData(Qt.DisplayRole, value)
+                self.table.setItem(row, column, item)
+        self.table.setSortingEnabled(True)
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Statistics", "statistics.csv", "CSV files (*.csv);;JSON files (*.json)"
+        )
+        if not path:
+            return
+        try:
+            self.parent.progress_stats.export(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to export statistics.\nError: {str(e)}")
@@ -0,0 +1,318 @@
+import json
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from obspy import UTCDateTime
+from PyQt5.QtCore import QObject, pyqtSignal
+from scipy import fft
+
+from src.jobs import bounded_results
+from src.utils import read_trace_files, filter_stream
+
+CANDIDATES_FILE = "candidates.csv"
+TEMPLATE_PRE = 0.5  # seconds kept before the pick
+TEMPLATE_POST = 2.0  # seconds kept after the pick
+DEFAULT_CC_THRESHOLD = 0.7
+TEMPLATE_BATCH = 64  # templates correlated per FFT batch
+BLOCK_LENGTHS = 8  # overlap-save block size, in template lengths
+MAX_DETECTIONS = 5  # per group, strongest first
+
+# Sampling rate -> TemplateBank of the current pool, set once per worker by _init_worker
+_worker_templates = None
+
+
+def confirmed_picks(data_df):
+    """group_key -> first pick (UTC string) of picked rows not tagged or discarded."""
+    picked = (
+        data_df["p_wave_frame"].notna()
+        & ~data_df["needs_review"].astype(bool)
+        & ~data_df["deleted"].astype(bool)
+    )
+    picks = {}
+    for group_key, p_wave_frame in data_df.loc[picked, "p_wave_frame"].items():
+        times = json.loads(p_wave_frame)
+        if times:
+            picks[group_key] = times[0]
+    return picks
+
+
+def read_z_trace(files, filter_params=None):
+    st = read_trace_files(files)
+    if filter_params:
+        st = filter_stream(st, filter_params)
+    z = st.select(channel="*Z")
+    return z[0] if len(z) else st[0]
+
+
+def extract_template(group_key, files, pick, filter_params=None):
+    """
+    Process pool entry point: cuts the window around a pick from a group's Z
+    trace. Returns (group_key, sampling_rate, samples) or None if the window
+    does not fit in the trace.
+    """
+    tr = read_z_trace(files, filter_params)
+    fs = tr.stats.sampling_rate
+    start = int(round((UTCDateTime(pick) - tr.stats.starttime - TEMPLATE_PRE) * fs))
+    length = int(round((TEMPLATE_PRE + TEMPLATE_POST) * fs))
+    if start < 0 or start + length > tr.stats.npts:
+        return None
+    return group_key, fs, tr.data[start:start + length].astype(np.float64)
+
+
+def normalize_templates(templates):
+    """Removes the mean and scales each row to unit norm."""
+    templates = templates - templates.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(templates, axis=1, keepdims=True)
+    return np.divide(templates, norms, out=np.zeros_like(templates), where=norms > 0)
+
+
+def window_norms(data, length):
+    """Norm of the demeaned data in every window of `length` samples, from cumulative sums."""
+    s1 = np.concatenate(([0.0], np.cumsum(data)))
+    s2 = np.concatenate(([0.0], np.cumsum(data * data)))
+    w1 = s1[length:] - s1[:-length]
+    w2 = s2[length:] - s2[:-length]
+    return np.sqrt(np.maximum(w2 - w1 * w1 / length, 0.0))
+
+
+class TemplateBank:
+    """
+    Normalised templates of one sampling rate. Traces are correlated in
+    overlap-save blocks of one FFT size per bank, so the template spectra are
+    transformed once and a batch never holds more than
+    TEMPLATE_BATCH x nfft coefficients, however long the trace.
+
+    The FFTs run in float32, which is plenty for coefficients in [-1, 1] and
+    almost twice as fast; the running window energy is summed in float64.
+    """
+
+    def __init__(self, keys, templates, batch=TEMPLATE_BATCH):
+        self.keys = list(keys)
+        self.templates = normalize_templates(np.asarray(templates, dtype=np.float64))
+        self.length = self.templates.shape[1]
+        self.batch = batch
+        self.nfft = fft.next_fast_len(BLOCK_LENGTHS * self.length, real=True)
+        self.spectra = None
+
+    def batch_spectra(self):
+        if self.spectra is None:
+            self.spectra = [
+                fft.rfft(self.templates[start:start + self.batch].astype(np.float32), self.nfft, axis=1).conj()
+                for start in range(0, len(self.templates), self.batch)
+            ]
+        return self.spectra
+
+    def correlate(self, data, exclude=None):
+        """
+        Normalised cross-correlation of every template against the data, block
+        by block and batch by batch, with one FFT of each block shared by all
+        batches.
+
+        Returns, per lag, the highest coefficient over the templates (except
+        those whose key is `exclude`) and the index of the template that gave it.
+        """
+        data = np.asarray(data, dtype=np.float64)
+        valid = len(data) - self.length + 1
+        # Lags of a block that do not wrap around
+        step = self.nfft - self.length + 1
+        # Templates are zero-mean, so removing the data mean changes nothing but rounding
+        centred = (data - data.mean()).astype(np.float32)
+        norms = window_norms(data, self.length)
+        # Quiet windows (e.g. zero padding) would divide rounding noise by ~0
+        quiet = norms <= max(norms.max(), 1e-300) * 1e-4
+        norms = np.where(quiet, np.inf, norms).astype(np.float32)
+        excluded = [row for row, key in enumerate(self.keys) if key == exclude]
+
+        best = np.full(valid, -np.inf, dtype=np.float32)
+        best_template = np.zeros(valid, dtype=np.int64)
+        for start in range(0, valid, step):
+            lags = min(step, valid - start)
+            # The last block is zero padded by the FFT
+            spectrum = fft.rfft(centred[start:start + self.nfft], self.nfft)
+            block_norms = norms[start:start + lags]
+            block_best = best[start:start + lags]
+            block_template = best_template[start:start + lags]
+            for number, spectra in enumerate(self.batch_spectra()):
+                offset = number * self.batch
+                # Correlation is convolution with the conjugate spectrum
+                cc = fft.irfft(spectra * spectrum[None, :], self.nfft, axis=1)[:, :lags] / block_norms[None, :]
+                for row in excluded:
+                    if offset <= row < offset + len(spectra):
+                        cc[row - offset] = -np.inf
+                index = cc.argmax(axis=0)
+                value = cc[index, np.arange(lags)]
+                better = value > block_best
+                block_best[better] = value[better]
+                block_template[better] = index[better] + offset
+        return best, best_template
+
+
+def find_peaks(cc, threshold, separation, limit=MAX_DETECTIONS):
+    """Indices of the strongest coefficients above threshold, at least `separation` apart."""
+    above = np.flatnonzero(cc >= threshold)
+    peaks = []
+    for index in above[np.argsort(cc[above])[::-1]]:
+        if all(abs(index - peak) >= separation for peak in peaks):
+            peaks.append(int(index))
+            if len(peaks) == limit:
+                break
+    return peaks
+
+
+def _init_worker(templates):
+    global _worker_templates
+    _worker_templates = templates
+
+
+def match_group(group_key, files, threshold=DEFAULT_CC_THRESHOLD, filter_params=None):
+    """
+    Process pool entry point: scans one group with the template banks of the
+    worker, skipping the group's own template. Returns (group_key, detections),
+    each detection being (pick UTC string, coefficient, template group key),
+    strongest first.
+    """
+    tr = read_z_trace(files, filter_params)
+    fs = tr.stats.sampling_rate
+    bank = _worker_templates.get(fs)
+    if bank is None or tr.stats.npts < bank.length:
+        return group_key, []
+
+    cc, template_index = bank.correlate(tr.data, exclude=group_key)
+    detections = []
+    for peak in find_peaks(cc, threshold, bank.length):
+        pick = tr.stats.starttime + peak / fs + TEMPLATE_PRE
+        detections.append((str(pick), float(cc[peak]), bank.keys[template_index[peak]]))
+    return group_key, detections
+
+
+def save_candidates(folder, results):
+    """Writes all detections to candidates.csv. Returns the DataFrame written."""
+    rows = [
+        (group_key, pick, cc, template)
+        for group_key, detections in results.items()
+        for pick, cc, template in detections
+    ]
+    df = pd.DataFrame(rows, columns=["trace_path", "candidate_time", "cc", "template"])
+    df.to_csv(os.path.join(folder, CANDIDATES_FILE), index=False)
+    return df
+
+
+def load_candidates(folder):
+    """group_key -> [(pick UTC string, coefficient, template group key)] from candidates.csv, strongest first."""
+    path = os.path.join(folder, CANDIDATES_FILE) if folder else None
+    if not path or not os.path.exists(path):
+        return {}
+    candidates = {}
+    for row in pd.read_csv(path).itertuples(index=False):
+        candidates.setdefault(row.trace_path, []).append((row.candidate_time, float(row.cc), row.template))
+    return candidates
+
+
+class TemplateMatchJob(QObject):
+    """
+    Builds templates from the confirmed picks and scans every other group
+    with them, in a process pool. Meant to be moved to a QThread.
+    """
+
+    progress = pyqtSignal(str, int, int)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, file_groups, picks, group_keys, threshold=DEFAULT_CC_THRESHOLD,
+                 filter_params=None, workers=None):
+        super().__init__()
+        self.file_groups = {key: list(files) for key, files in file_groups.items()}
+        self.picks = dict(picks)
+        self.group_keys = list(group_keys)
+        self.threshold = threshold
+        self.filter_params = filter_params
+        self.workers = workers
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _run_pool(self, stage, tasks, submit, results, **pool_args):
+        context = multiprocessing.get_context("spawn")
+        workers = self.workers or os.cpu_count()
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, **pool_args)
+        try:
+            finished = bounded_results(pool, submit, tasks, lambda: self.cancelled, 2 * workers)
+            for done, (_, future) in enumerate(finished, start=1):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"Template matching failed: {e}")
+                self.progress.emit(stage, done, len(tasks))
+        finally:
+            # A cancelled run leaves the running groups behind instead of waiting
+            pool.shutdown(wait=not self.cancelled, cancel_futures=True)
+        return not self.cancelled
+
+    def run(self):
+        extracted = []
+        completed = self._run_pool(
+            "templates", list(self.picks.items()),
+            lambda pool, item: pool.submit(
+                extract_template, item[0], self.file_groups[item[0]], item[1], self.filter_params
+            ),
+            extracted,
+        )
+        templates = {}
+        for result in extracted if completed else []:
+            if result is None:
+                continue
+            group_key, fs, samples = result
+            templates.setdefault(fs, []).append((group_key, samples))
+        templates = {
+            fs: TemplateBank([key for key, _ in rows], np.stack([s for _, s in rows]))
+            for fs, rows in templates.items()
+        }
+
+        matched = []
+        if templates:
+            self._run_pool(
+                "groups", self.group_keys,
+                lambda pool, group_key: pool.submit(
+                    match_group, group_key, self.file_groups[group_key], self.threshold, self.filter_params
+                ),
+                matched,
+                initializer=_init_worker,
+                initargs=(templates,),
+            )
+        self.finished.emit(dict(matched))
+
+
+def benchmark(n_templates=200, n_traces=50, npts=6000, sampling_rate=100.0, seed=0):
+    """
+    Times the batched FFT correlation against a per-template direct
+    correlation on synthetic data. Returns a dict of timings in seconds.
+    """
+    rng = np.random.default_rng(seed)
+    length = int(round((TEMPLATE_PRE + TEMPLATE_POST) * sampling_rate))
+    bank = TemplateBank(range(n_templates), rng.normal(size=(n_templates, length)))
+    traces = rng.normal(size=(n_traces, npts))
+
+    start = time.perf_counter()
+    for data in traces:
+        bank.correlate(data)
+    fft_time = time.perf_counter() - start
+
+    # The direct method is slow, time one trace and scale
+    start = time.perf_counter()
+    norms = window_norms(traces[0], length)
+    for template in bank.templates:
+        np.correlate(traces[0], template, mode="valid") / norms
+    direct_time = (time.perf_counter() - start) * n_traces
+
+    return {
+        "templates": n_templates,
+        "traces": n_traces,
+        "npts": npts,
+        "fft_seconds": fft_time,
+        "direct_seconds": direct_time,
+        "correlations_per_second": n_templates * n_traces / fft_time,
+    }
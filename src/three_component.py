@@ -0,0 +1,111 @@
+import numpy as np
+from obspy.signal.filter import bandpass, highpass, lowpass
+
+from src.preprocessing import run_stack_stages
+
+COMPONENTS = ("Z", "N", "E")
+# Channel code endings accepted for each component, in order of preference
+COMPONENT_CODES = {"Z": ("Z",), "N": ("N", "1"), "E": ("E", "2")}
+POLARIZATION_WINDOW = 0.5  # seconds for the sliding covariance
+
+
+def stack_components(st):
+    """
+    Stacks the Z/N/E components of a group into one (3, npts) float64 array,
+    trimmed to the window they all cover.
+
+    Returns (data, sampling_rate, channel_ids, t0) where t0 is the start of the
+    stack in seconds relative to the Z trace start. Raises ValueError if a
+    component is missing or the sampling rates differ.
+    """
+    traces = []
+    for component in COMPONENTS:
+        selected = None
+        for code in COMPONENT_CODES[component]:
+            matches = st.select(channel=f"*{code}")
+            if len(matches):
+                selected = matches[0]
+                break
+        if selected is None:
+            raise ValueError(f"Missing {component} component")
+        traces.append(selected)
+
+    sampling_rate = traces[0].stats.sampling_rate
+    if any(tr.stats.sampling_rate != sampling_rate for tr in traces):
+        raise ValueError("Components have different sampling rates")
+
+    start = max(tr.stats.starttime for tr in traces)
+    offsets = [int(round((start - tr.stats.starttime) * sampling_rate)) for tr in traces]
+    npts = min(tr.stats.npts - offset for tr, offset in zip(traces, offsets))
+    if npts <= 0:
+        raise ValueError("Components do not overlap in time")
+
+    data = np.empty((3, npts), dtype=np.float64)
+    for row, (tr, offset) in enumerate(zip(traces, offsets)):
+        data[row] = tr.data[offset:offset + npts]
+    t0 = offsets[0] / sampling_rate
+    return data, sampling_rate, [tr.id for tr in traces], t0
+
+
+def filter_stack(data, sampling_rate, filter_params):
+    """
+    Applies the configured filter to all rows of a stacked array in one pass,
+    then drops the offset. Matches Stream.filter followed by the offset trim.
+
+    Returns (filtered, dropped_seconds).
+    """
+    filter_type = filter_params["type"]
+    if "stages" in filter_params:
+        data = run_stack_stages(data, sampling_rate, filter_params["stages"])
+    elif filter_type == "bandpass":
+        data = bandpass(data, filter_params["min_freq"], filter_params["max_freq"], df=sampling_rate)
+    elif filter_type == "highpass":
+        data = highpass(data, filter_params["min_freq"], df=sampling_rate)
+    elif filter_type == "lowpass":
+        data = lowpass(data, filter_params["max_freq"], df=sampling_rate)
+
+    dropped = int(round(filter_params["offset"] * sampling_rate))
+    return data[..., dropped:], dropped / sampling_rate
+
+
+def vector_norm(data):
+    """Instantaneous amplitude of the three components."""
+    return np.sqrt(np.sum(data * data, axis=0))
+
+
+def rectilinearity(data, window):
+    """
+    Rectilinearity 1 - (l2 + l3) / (2 l1) of the 3x3 covariance over a sliding
+    window ending at each sample, from cumulative sums of the six products and
+    one batched eigenvalue solve. The first window - 1 samples are 0.
+    """
+    n = data.shape[1]
+    result = np.zeros(n)
+    if window < 2 or n < window:
+        return result
+    data = data - data.mean(axis=1, keepdims=True)
+    pairs = [(0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 2)]
+    sums = np.zeros((len(pairs), n + 1))
+    for k, (i, j) in enumerate(pairs):
+        np.cumsum(data[i] * data[j], out=sums[k, 1:])
+    means = np.zeros((3, n + 1))
+    np.cumsum(data, axis=1, out=means[:, 1:])
+    window_means = (means[:, window:] - means[:, :-window]) / window
+
+    cov = np.empty((n - window + 1, 3, 3))
+    for k, (i, j) in enumerate(pairs):
+        value = (sums[k, window:] - sums[k, :-window]) / window - window_means[i] * window_means[j]
+        cov[:, i, j] = value
+        cov[:, j, i] = value
+    eigenvalues = np.linalg.eigvalsh(cov)  # ascending
+    l1 = eigenvalues[:, 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rect = np.where(l1 > 0, 1 - (eigenvalues[:, 0] + eigenvalues[:, 1]) / (2 * l1), 0.0)
+    result[window - 1:] = rect
+    return result
+
+
+def polarization_trace(data, sampling_rate, window=POLARIZATION_WINDOW):
+    """Vector norm weighted by rectilinearity, emphasising linearly polarised (P) arrivals."""
+    return vector_norm(data) * rectilinearity(data, max(int(window * sampling_rate), 2))
+
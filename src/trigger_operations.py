@@ -1,5 +1,8 @@
+import numpy as np
 from obspy.signal.trigger import classic_sta_lta, trigger_onset
 
+from src.sac_reader import read_sac_header, iter_sac_chunks, DEFAULT_CHUNK_SIZE
+
 def calculate_triggers(trace, sta, lta, threshold):
     """
     Calculate STA/LTA triggers for a single trace.
@@ -10,18 +13,37 @@ def calculate_triggers(trace, sta, lta, threshold):
         lta: Long-term average window (in seconds)
         threshold: Trigger threshold value
         
+    Returns:
+        tuple: (trigger_times, first_trigger_time)
+    """
+    return calculate_array_triggers(
+        trace.data, trace.stats.sampling_rate, sta, lta, threshold
+    )
+
+def calculate_array_triggers(data, sampling_rate, sta, lta, threshold):
+    """
+    Calculate STA/LTA triggers on a plain array, e.g. a vector norm or
+    polarisation trace built from several components.
+
+    Args:
+        data: 1-D numpy array
+        sampling_rate: Samples per second
+        sta: Short-term average window (in seconds)
+        lta: Long-term average window (in seconds)
+        threshold: Trigger threshold value
+
     Returns:
         tuple: (trigger_times, first_trigger_time)
     """
     cft = classic_sta_lta(
-        trace.data,
-        int(sta * trace.stats.sampling_rate),
-        int(lta * trace.stats.sampling_rate),
+        data,
+        int(sta * sampling_rate),
+        int(lta * sampling_rate),
     )
     on_off = trigger_onset(cft, threshold, threshold)
     
     if len(on_off) > 0:
-        first_trigger = on_off[0][0] / trace.stats.sampling_rate
+        first_trigger = on_off[0][0] / sampling_rate
         return on_off, first_trigger
     
     return on_off, None
@@ -50,4 +72,144 @@ def calculate_stream_triggers(stream, sta, lta, threshold):
             if first_trigger_time is None or trigger_time < first_trigger_time:
                 first_trigger_time = trigger_time
                 
-    return triggers, first_trigger_time 
\ No newline at end of file
+    return triggers, first_trigger_time 
+
+class StreamingStaLta:
+    """
+    Classic STA/LTA computed chunk by chunk, giving the same characteristic
+    function as classic_sta_lta on the whole record.
+
+    Only the squared amplitudes of the last nlta samples are carried between
+    chunks, so memory stays flat regardless of the record length. Window sums
+    come from a cumulative sum local to each chunk, which keeps round-off from
+    accumulating over day-long records.
+    """
+
+    def __init__(self, nsta, nlta):
+        self.nsta = nsta
+        self.nlta = nlta
+        self.tail = np.zeros(nlta)  # energy of the previous nlta samples
+        self.samples_seen = 0
+
+    def process(self, chunk):
+        """Returns the characteristic function of the samples in chunk."""
+        energy = np.asarray(chunk, dtype=np.float64) ** 2
+        n = len(energy)
+        extended = np.concatenate((self.tail, energy))
+        csum = np.concatenate(([0.0], np.cumsum(extended)))
+        end = csum[self.nlta + 1:]
+        sta = end - csum[self.nlta + 1 - self.nsta:len(csum) - self.nsta]
+        lta = end - csum[1:n + 1]
+        cft = np.zeros(n)
+        np.divide(sta * self.nlta, lta * self.nsta, out=cft, where=lta > 0)
+
+        # classic_sta_lta leaves the LTA warm-up at zero
+        warmup = self.nlta - 1 - self.samples_seen
+        if warmup > 0:
+            cft[:warmup] = 0.0
+        self.tail = extended[-self.nlta:]
+        self.samples_seen += n
+        return cft
+
+
+class StreamingTrigger:
+    """
+    Trigger on/off state carried across chunks of a characteristic function,
+    with the same semantics as trigger_onset: "on" is the first sample at or
+    above thres_on, "off" the last sample at or above thres_off after it.
+    """
+
+    def __init__(self, thres_on, thres_off):
+        self.thres_on = thres_on
+        self.thres_off = thres_off
+        self.on = None  # sample index of the open trigger, if any
+        self.samples_seen = 0
+
+    def process(self, cft):
+        """Returns the triggers closed within this chunk as [on, off] pairs."""
+        closed = []
+        i = 0
+        n = len(cft)
+        while i < n:
+            if self.on is None:
+                above = np.flatnonzero(cft[i:] >= self.thres_on)
+                if len(above) == 0:
+                    break
+                i += above[0]
+                self.on = self.samples_seen + i
+            below = np.flatnonzero(cft[i:] < self.thres_off)
+            if len(below) == 0:
+                break
+            i += below[0]
+            closed.append([self.on, self.samples_seen + i - 1])
+            self.on = None
+        self.samples_seen += n
+        return closed
+
+    def finish(self):
+        """Closes a trigger still open at the end of the record."""
+        if self.on is None:
+            return []
+        closed = [[self.on, self.samples_seen - 1]]
+        self.on = None
+        return closed
+
+
+def stream_triggers(chunks, sampling_rate, sta, lta, threshold):
+    """
+    Streaming counterpart of calculate_triggers for records read in chunks.
+
+    Args:
+        chunks: Iterable of 1-D numpy arrays, consecutive pieces of the record
+        sampling_rate: Samples per second
+        sta: Short-term average window (in seconds)
+        lta: Long-term average window (in seconds)
+        threshold: Trigger threshold value
+
+    Yields:
+        [on, off] sample indices of each trigger as soon as it closes, the
+        same pairs calculate_triggers returns for the whole record
+    """
+    sta_lta = StreamingStaLta(int(sta * sampling_rate), int(lta * sampling_rate))
+    trigger = StreamingTrigger(threshold, threshold)
+    for chunk in chunks:
+        yield from trigger.process(sta_lta.process(chunk))
+    yield from trigger.finish()
+
+
+def stream_file_triggers(path, sta, lta, threshold, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams STA/LTA triggers of a SAC file without loading it whole.
+
+    Yields:
+        Trigger onset times in seconds from the first sample
+    """
+    header = read_sac_header(path)
+    sampling_rate = 1.0 / header.delta
+    for on, _ in stream_triggers(
+        iter_sac_chunks(path, chunk_size), sampling_rate, sta, lta, threshold
+    ):
+        yield on / sampling_rate
+
+
+
+def check_stream_triggers(chunk_sizes=(1, 7, 250, 1000, 4096, 100000), npts=60000, sampling_rate=100.0,
+                          sta=1.0, lta=10.0, threshold=3.0, seed=0):
+    """
+    Runs stream_triggers over a synthetic record with events in noise, in
+    several chunk sizes, and compares the trigger pairs with the one-shot
+    calculate_array_triggers. Returns {chunk_size: matches} and the number of
+    triggers of the one-shot run.
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=npts)
+    for onset in rng.integers(int(lta * sampling_rate), npts - 1000, size=8):
+        data[onset:onset + 500] += rng.normal(scale=8.0, size=500) * np.exp(-np.arange(500) / 150)
+    expected, _ = calculate_array_triggers(data, sampling_rate, sta, lta, threshold)
+    expected = np.asarray(expected, dtype=np.int64).reshape(-1, 2)
+    matches = {}
+    for chunk_size in chunk_sizes:
+        chunks = (data[start:start + chunk_size] for start in range(0, npts, chunk_size))
+        streamed = np.asarray(list(stream_triggers(chunks, sampling_rate, sta, lta, threshold)), dtype=np.int64)
+        matches[chunk_size] = np.array_equal(streamed.reshape(-1, 2), expected)
+    return matches, len(expected)
@@ -6,9 +6,17 @@ from PyQt5.QtWidgets import (
     QLabel,
     QLineEdit,
     QPushButton,
+    QComboBox,
     QMessageBox
 )
 
+# Label -> trigger source understood by SeismicPlotter
+TRIGGER_SOURCES = {
+    "Z component": "Z",
+    "Vector norm (Z/N/E)": "norm",
+    "Polarisation (Z/N/E)": "polarization",
+}
+
 class TriggerConfigWindow(QMainWindow):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -38,6 +46,13 @@ class TriggerConfigWindow(QMainWindow):
         trigger_layout.addWidget(self.threshold_input)
         layout.addLayout(trigger_layout)
 
+        source_layout = QHBoxLayout()
+        source_layout.addWidget(QLabel("Trigger on:"))
+        self.source_combo = QComboBox()
+        self.source_combo.addItems(list(TRIGGER_SOURCES.keys()))
+        source_layout.addWidget(self.source_combo)
+        layout.addLayout(source_layout)
+
         apply_trigger_btn = QPushButton("Apply Trigger")
         apply_trigger_btn.clicked.connect(self.apply_trigger)
         layout.addWidget(apply_trigger_btn)
@@ -55,6 +70,7 @@ class TriggerConfigWindow(QMainWindow):
                 "sta": sta,
                 "lta": lta,
                 "threshold": threshold,
+                "source": TRIGGER_SOURCES[self.source_combo.currentText()],
             }
 
             if self.parent:
@@ -1,12 +1,24 @@
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, 
-    QListWidget, QToolBar, QAction, QCheckBox
+    QListWidget, QToolBar, QAction, QCheckBox, QComboBox, QDoubleSpinBox, QProgressBar,
+    QLineEdit, QTreeView, QAbstractItemView
 )
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon
 import pyqtgraph as pg
 from pyqtgraph import LabelItem
 
+from src.template_matching import DEFAULT_CC_THRESHOLD
+from src.group_tree import GroupTreeModel
+
+# Sort option label -> (quality column, ascending), None keeps folder order
+SORT_OPTIONS = {
+    "Folder order": None,
+    "SNR (high first)": ("snr", False),
+    "Peak amplitude (high first)": ("peak_amplitude", False),
+    "Clipping (low first)": ("clipping_fraction", True),
+}
+
 def setup_ui(window):
     # Central widget
     central_widget = QWidget()
@@ -25,8 +37,17 @@ def setup_ui(window):
     # PyQtGraph PlotWidget
     window.spectrogram_widget = pg.PlotWidget()
     main_layout.addWidget(window.spectrogram_widget)  # type: ignore
+    # Extra N/E spectrograms and waveforms, only shown in 3-component mode
+    window.component_spectrogram_widgets = {}
+    window.component_plot_widgets = {}
+    for component in ("N", "E"):
+        window.component_spectrogram_widgets[component] = pg.PlotWidget()
+        main_layout.addWidget(window.component_spectrogram_widgets[component])  # type: ignore
     window.plot_widget = pg.PlotWidget()
     main_layout.addWidget(window.plot_widget)  # type: ignore
+    for component in ("N", "E"):
+        window.component_plot_widgets[component] = pg.PlotWidget()
+        main_layout.addWidget(window.component_plot_widgets[component])  # type: ignore
 
     # Set up zoom selection variables
     window.zoom_select_mode = False
@@ -68,11 +89,35 @@ def setup_toolbar(window, main_layout):
     window.zoom_select_action.setCheckable(True)
     window.toolbar.addAction(window.zoom_select_action)
 
+    # Add 3-component view toggle
+    window.three_component_action = QAction("3-component view [C]", window)
+    window.three_component_action.setCheckable(True)
+    window.three_component_action.triggered.connect(window.toggle_three_component)
+    window.toolbar.addAction(window.three_component_action)
+
     # Add button to manually mark P
     window.mark_manual_p = QAction("Add P mark [P]", window)
     window.mark_manual_p.triggered.connect(window.manually_mark_p)
     window.toolbar.addAction(window.mark_manual_p)
 
+    window.refine_picks_action = QAction("Auto-refine P [A]", window)
+    window.refine_picks_action.setCheckable(True)
+    window.refine_picks_action.setChecked(window.refine_picks)
+    window.refine_picks_action.triggered.connect(window.toggle_pick_refinement)
+    window.toolbar.addAction(window.refine_picks_action)
+
+    window.propagate_picks_action = QAction("Propagate picks [G]", window)
+    window.propagate_picks_action.setCheckable(True)
+    window.propagate_picks_action.setChecked(window.propagate_picks)
+    window.propagate_picks_action.triggered.connect(window.toggle_pick_propagation)
+    window.toolbar.addAction(window.propagate_picks_action)
+
+    window.ml_prepick_action = QAction("Model pre-pick [M]", window)
+    window.ml_prepick_action.setCheckable(True)
+    window.ml_prepick_action.setChecked(window.ml_prepick)
+    window.ml_prepick_action.triggered.connect(window.toggle_ml_prepick)
+    window.toolbar.addAction(window.ml_prepick_action)
+
     window.delete_p = QAction("Delete selected P [X]", window)
     window.delete_p.triggered.connect(window.delete_selected_p_marker)
     window.toolbar.addAction(window.delete_p)
@@ -95,44 +140,106 @@ def setup_toolbar(window, main_layout):
 
 def setup_plots(window):
     # Configure main plot widget
-    window.plot_widget.setBackground("w")
     window.plot_item = window.plot_widget.getPlotItem()  # Get plot item for main plot
-    window.plot_item.setLabel("bottom", "Time (s)")
-    window.plot_item.setLabel("left", "Amplitude")
-    window.plot_item.showGrid(x=True, y=True)
-    window.plot_item.getAxis("bottom").setPen(pg.mkPen(color=(0, 0, 0), width=1))
-    window.plot_item.getAxis("left").setPen(pg.mkPen(color=(0, 0, 0), width=1))
-    window.plot_item.getAxis("bottom").setTextPen(pg.mkPen(color=(0, 0, 0)))
-    window.plot_item.getAxis("left").setTextPen(pg.mkPen(color=(0, 0, 0)))
+    configure_plot_widget(window.plot_widget)
 
     # Configure spectrogram widget
     window.spectrogram_item = window.spectrogram_widget.getPlotItem()
-    window.spectrogram_item.setLabel("bottom", "Time (s)")
-    window.spectrogram_item.setLabel("left", "Frequency (Hz)")  # Changed to frequency for spectrogram
-    window.spectrogram_item.showGrid(x=True, y=True)
+    configure_spectrogram_widget(window.spectrogram_widget)
+
+    # N/E plots of the 3-component mode follow the Z plot
+    window.component_plot_items = {}
+    window.component_spectrogram_items = {}
+    for component, widget in window.component_plot_widgets.items():
+        configure_plot_widget(widget)
+        window.component_plot_items[component] = widget.getPlotItem()
+        window.component_plot_items[component].setXLink(window.plot_item)
+        widget.hide()
+    for component, widget in window.component_spectrogram_widgets.items():
+        configure_spectrogram_widget(widget)
+        window.component_spectrogram_items[component] = widget.getPlotItem()
+        window.component_spectrogram_items[component].setXLink(window.plot_item)
+        widget.hide()
 
     # Initialize zoom state
     window.zoom_mode = False
     window.zoom_start = None
-    window.plot_widget.setMouseEnabled(x=False, y=False)
-    window.plot_widget.setMenuEnabled(False)
-    window.spectrogram_widget.setMouseEnabled(x=False, y=False)
-    window.spectrogram_widget.setMenuEnabled(False)
 
     # Set up PyQtGraph global config
     pg.setConfigOptions(antialias=True)
 
+def configure_plot_widget(widget):
+    widget.setBackground("w")
+    plot_item = widget.getPlotItem()
+    plot_item.setLabel("bottom", "Time (s)")
+    plot_item.setLabel("left", "Amplitude")
+    plot_item.showGrid(x=True, y=True)
+    plot_item.getAxis("bottom").setPen(pg.mkPen(color=(0, 0, 0), width=1))
+    plot_item.getAxis("left").setPen(pg.mkPen(color=(0, 0, 0), width=1))
+    plot_item.getAxis("bottom").setTextPen(pg.mkPen(color=(0, 0, 0)))
+    plot_item.getAxis("left").setTextPen(pg.mkPen(color=(0, 0, 0)))
+    widget.setMouseEnabled(x=False, y=False)
+    widget.setMenuEnabled(False)
+
+def configure_spectrogram_widget(widget):
+    spectrogram_item = widget.getPlotItem()
+    spectrogram_item.setLabel("bottom", "Time (s)")
+    spectrogram_item.setLabel("left", "Frequency (Hz)")  # Changed to frequency for spectrogram
+    spectrogram_item.showGrid(x=True, y=True)
+    widget.setMouseEnabled(x=False, y=False)
+    widget.setMenuEnabled(False)
+
 def setup_controls(window, sidebar, list_container):
     # Load Data Button
     load_btn = QPushButton("Load Seismic Data")
     load_btn.clicked.connect(window.save_ref_data)
     list_container.addWidget(load_btn)
 
+    # Progress of the background folder scan
+    load_progress_layout = QHBoxLayout()
+    window.load_progress = QProgressBar()
+    window.load_progress.hide()
+    load_progress_layout.addWidget(window.load_progress)
+    window.cancel_load_btn = QPushButton("Cancel")
+    window.cancel_load_btn.clicked.connect(window.cancel_load_job)
+    window.cancel_load_btn.hide()
+    load_progress_layout.addWidget(window.cancel_load_btn)
+    list_container.addLayout(load_progress_layout)
+
+    # Event -> station browser with search, independent of the list filters
+    window.group_search = QLineEdit()
+    window.group_search.setPlaceholderText("Search event or station...")
+    window.group_search.textChanged.connect(window.search_groups)
+    list_container.addWidget(window.group_search)
+    window.group_tree_model = GroupTreeModel(window)
+    window.group_tree = QTreeView()
+    window.group_tree.setHeaderHidden(True)
+    window.group_tree.setUniformRowHeights(True)
+    window.group_tree.setModel(window.group_tree_model)
+    window.group_tree.clicked.connect(window.select_group_from_tree)
+    list_container.addWidget(window.group_tree)
+
     # List of loaded traces
     window.traces_label = QLabel("Loaded Traces:")
     list_container.addWidget(window.traces_label)
     window.trace_list = QListWidget()
+    # Fixed row heights keep scrolling fast with very many groups
+    window.trace_list.setUniformItemSizes(True)
     window.trace_list.itemClicked.connect(window.plot_selected_trace)
+    # Shift/Ctrl-click selects several groups for the bulk actions of the context menu
+    window.trace_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+    window.trace_list.setContextMenuPolicy(Qt.ActionsContextMenu)
+    for label, callback in (
+        ("Tag selected for review [Shift+T]", window.tag_selected),
+        ("Untag selected", window.untag_selected),
+        ("Discard selected [Shift+D]", window.discard_selected),
+        ("Restore selected", window.restore_selected),
+        ("Discard all stations of this event", window.discard_event),
+        ("Tag all stations of this event without picks", window.tag_event_unpicked),
+    ):
+        action = QAction(label, window.trace_list)
+        action.triggered.connect(callback)
+        window.trace_list.addAction(action)
     list_container.addWidget(window.trace_list)
 
     # # P Wave Marker Controls
@@ -152,6 +259,18 @@ def setup_controls(window, sidebar, list_container):
     open_trigger_config_btn.clicked.connect(window.open_trigger_config)
     sidebar.addWidget(open_trigger_config_btn)
 
+    # Decimated working copy for display, spectrogram and triggers
+    display_rate_layout = QHBoxLayout()
+    display_rate_layout.addWidget(QLabel("Display rate (Hz)"))
+    window.display_rate_input = QDoubleSpinBox()
+    window.display_rate_input.setRange(0, 1000)
+    window.display_rate_input.setSingleStep(10)
+    window.display_rate_input.setSpecialValueText("Full rate")
+    window.display_rate_input.setValue(window.display_rate)
+    window.display_rate_input.valueChanged.connect(window.set_display_rate)
+    display_rate_layout.addWidget(window.display_rate_input)
+    sidebar.addLayout(display_rate_layout)
+
     # Filter options
     sidebar.addWidget(QLabel("Filter Options:"))
     window.filter_tagged = QCheckBox("Filter tagged for review events")
@@ -170,5 +289,74 @@ def setup_controls(window, sidebar, list_container):
     window.filter_with_p.stateChanged.connect(window.apply_filters)
     window.filter_discarded.stateChanged.connect(window.apply_filters)
 
+    # Quality metrics: ordering and filtering of the queue
+    sidebar.addWidget(QLabel("Quality:"))
+    sort_layout = QHBoxLayout()
+    sort_layout.addWidget(QLabel("Sort by"))
+    window.sort_combo = QComboBox()
+    window.sort_combo.addItems(list(SORT_OPTIONS.keys()))
+    sort_layout.addWidget(window.sort_combo)
+    sidebar.addLayout(sort_layout)
+
+    snr_layout = QHBoxLayout()
+    snr_layout.addWidget(QLabel("Min SNR"))
+    window.min_snr_input = QDoubleSpinBox()
+    window.min_snr_input.setRange(0, 1000)
+    window.min_snr_input.setSingleStep(0.5)
+    snr_layout.addWidget(window.min_snr_input)
+    sidebar.addLayout(snr_layout)
+
+    window.filter_bad_data = QCheckBox("Hide clipped/gapped traces")
+    sidebar.addWidget(window.filter_bad_data)
+
+    compute_quality_btn = QPushButton("Recompute Quality Metrics")
+    compute_quality_btn.clicked.connect(window.recompute_quality_metrics)
+    sidebar.addWidget(compute_quality_btn)
+    window.quality_label = QLabel("Quality metrics: -")
+    sidebar.addWidget(window.quality_label)
+
+    window.progress_label = QLabel("Progress: -")
+    window.progress_label.setWordWrap(True)
+    sidebar.addWidget(window.progress_label)
+    open_stats_btn = QPushButton("Statistics...")
+    open_stats_btn.clicked.connect(window.open_stats_window)
+    sidebar.addWidget(open_stats_btn)
+
+    open_stack_btn = QPushButton("Pick Stack View")
+    open_stack_btn.clicked.connect(window.open_stack_window)
+    sidebar.addWidget(open_stack_btn)
+
+    # Template matching: candidate picks from the confirmed ones
+    sidebar.addWidget(QLabel("Template matching:"))
+    cc_layout = QHBoxLayout()
+    cc_layout.addWidget(QLabel("Min correlation"))
+    window.cc_threshold_input = QDoubleSpinBox()
+    window.cc_threshold_input.setRange(0.1, 1.0)
+    window.cc_threshold_input.setSingleStep(0.05)
+    window.cc_threshold_input.setValue(DEFAULT_CC_THRESHOLD)
+    cc_layout.addWidget(window.cc_threshold_input)
+    sidebar.addLayout(cc_layout)
+    window.template_btn = QPushButton("Find Candidate Picks")
+    window.template_btn.clicked.connect(window.toggle_template_job)
+    sidebar.addWidget(window.template_btn)
+    window.template_label = QLabel("Candidates: -")
+    sidebar.addWidget(window.template_label)
+
+    # Picker plugin: onset probabilities from a model in worker processes
+    window.picker_label = QLabel(f"Picker: {window.picker_name()}")
+    sidebar.addWidget(window.picker_label)
+    choose_picker_btn = QPushButton("Choose Picker Model...")
+    choose_picker_btn.clicked.connect(window.choose_picker_model)
+    sidebar.addWidget(choose_picker_btn)
+    window.picker_btn = QPushButton("Pre-pick Dataset")
+    window.picker_btn.clicked.connect(window.toggle_picker_job)
+    sidebar.addWidget(window.picker_btn)
+    window.picker_status_label = QLabel("Pre-picks: -")
+    sidebar.addWidget(window.picker_status_label)
+
+    window.sort_combo.currentIndexChanged.connect(window.apply_filters)
+    window.min_snr_input.valueChanged.connect(window.apply_filters)
+    window.filter_bad_data.stateChanged.connect(window.apply_filters)
+
     # Spacer
     sidebar.addStretch() 
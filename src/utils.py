@@ -1,34 +1,62 @@
 from PyQt5.QtWidgets import QMessageBox
 from obspy import read
+from src.sac_reader import read_stream_window
+from src.preprocessing import process_stream
 import pandas as pd
 import os
 
-def group_sac_files(folder):
-    """Groups SAC files by event/station."""
+def is_sac_file(file):
+    """Checks whether a file name looks like a SAC file."""
+    return file.endswith((".sac", ".SAC"))
+
+def get_group_key(folder, root):
+    """Returns the event/station group key of a directory, or None."""
+    path_parts = os.path.relpath(root, folder).split(os.path.sep)
+    if len(path_parts) >= 2:
+        event = path_parts[0]
+        station = path_parts[-1]
+        return f"{event}/{station}"
+    return None
+
+def group_sac_files(folder, progress=None, is_cancelled=None):
+    """
+    Groups SAC files by event/station.
+
+    progress(done, total) is called after each top-level event folder, and the
+    scan stops early (returning None) once is_cancelled() is true.
+    """
     file_groups = {}
-    for root, dirs, files in os.walk(folder):
-        for file in files:
-            if file.endswith((".sac", ".SAC")):
-                path_parts = os.path.relpath(root, folder).split(os.path.sep)
-                if len(path_parts) >= 2:
-                    event = path_parts[0]
-                    station = path_parts[-1]
-                    group_key = f"{event}/{station}"
-                    if group_key not in file_groups:
-                        file_groups[group_key] = []
-                    file_groups[group_key].append(os.path.join(root, file))
+    try:
+        top_level = sorted(entry.path for entry in os.scandir(folder) if entry.is_dir())
+    except OSError:
+        top_level = []
+    for done, event_folder in enumerate(top_level, start=1):
+        if is_cancelled and is_cancelled():
+            return None
+        for root, dirs, files in os.walk(event_folder):
+            dirs.sort()
+            for file in files:
+                if is_sac_file(file):
+                    group_key = get_group_key(folder, root)
+                    if group_key is not None:
+                        if group_key not in file_groups:
+                            file_groups[group_key] = []
+                        file_groups[group_key].append(os.path.join(root, file))
+        if progress:
+            progress(done, len(top_level))
     return file_groups
 
+def read_trace_files(files):
+    """Reads all component files of a group into one stream. Raises on failure."""
+    st = read(files[0])  # Read the first file
+    for file in files[1:]:
+        st += read(file)  # Add other components
+    return st
+
 def load_trace_data(files, group_key):
     """Loads seismic trace data from files."""
     try:
-        st = read(files[0])  # Read the first file
-        print(f"Loaded first file: {files[0]}")
-        print(f"Number of traces: {len(st)}")
-        print(f"First trace data length: {len(st[0].data)}")
-        for file in files[1:]:
-            st += read(file)  # Add other components
-            print(f"Added file: {file}")
+        st = read_trace_files(files)
         print(f"Total number of traces for {group_key}: {len(st)}")
         print(f"Trace IDs: {[tr.id for tr in st]}")
         return st
@@ -38,9 +66,25 @@ def load_trace_data(files, group_key):
         )
         return None
 
+def load_trace_window(files, group_key, starttime, endtime):
+    """Loads only a time window of a group's files, for long records."""
+    try:
+        st = read_stream_window(files, starttime, endtime)
+        print(f"Loaded {group_key} window {starttime} - {endtime}: {[tr.stats.npts for tr in st]} samples")
+        return st
+    except Exception as e:
+        QMessageBox.critical(
+            None, "Error", f"Failed to load {group_key}.\nError: {str(e)}"
+        )
+        return None
+
+def filter_stream(st, filter_params):
+    """Returns a filtered copy of a stream, trimmed by the configured offset."""
+    return process_stream(st, filter_params)
+
 def calculate_wave_frame(p_wave_time, sampling_rate, filter_params=None):
     """Calculates wave frame from time considering filter offset."""
     wave_offset = 0
     if filter_params:
         wave_offset = int(filter_params["offset"] * sampling_rate)
-    return int(p_wave_time * sampling_rate) + wave_offset 
\ No newline at end of file
+    return int(p_wave_time * sampling_rate) + wave_offset 